@@ -7,6 +7,9 @@ from .products import router as product_router
 # from .returns import router as return_router
 from .stores import router as store_router
 from .kpi import router as kpi_router
+from .admin import router as admin_router
+from .dashboard import router as dashboard_router
+from .metrics import router as metrics_router
 
 __all__ = [
     "customer_router",
@@ -16,4 +19,7 @@ __all__ = [
     "order_item_router",
     "return_router",
     "kpi_router",
+    "admin_router",
+    "dashboard_router",
+    "metrics_router",
 ]
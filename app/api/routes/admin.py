@@ -0,0 +1,63 @@
+from fastapi import APIRouter
+from helpers.response_cache import response_cache
+from helpers.dimension_resolver import dimension_resolver
+from crud.v2.cube import analytics_cube
+from db.replicas import read_router
+from db.session import pool_stats
+from db.slow_queries import slow_query_log
+
+router = APIRouter()
+
+
+@router.get("/cache")
+def get_cache_stats():
+    """
+    Hit/miss counters and current data_version of the response cache.
+    """
+    return response_cache.stats()
+
+
+@router.get("/cube")
+def get_cube_stats():
+    """
+    Load state, size and data_version of the in-memory analytics cube.
+    """
+    return analytics_cube.stats()
+
+
+@router.get("/pool")
+def get_pool_stats():
+    """
+    Occupancy and checkout wait times of the database connection pools, and
+    how reads were routed between the primary and its replicas.
+    """
+    return {**pool_stats(), "routing": read_router.stats()}
+
+
+@router.get("/slow-queries")
+def get_slow_queries():
+    """
+    Statements that ran over the slow-query threshold, newest first, with
+    their parameters, route and EXPLAIN (ANALYZE, BUFFERS) plan.
+    """
+    return {**slow_query_log.stats(), "queries": slow_query_log.entries()}
+
+
+@router.post("/slow-queries/clear")
+def clear_slow_queries():
+    """
+    Forget the captured slow statements.
+    """
+    slow_query_log.clear()
+    return {"detail": "Slow queries cleared"}
+
+
+@router.post("/cache/clear")
+def clear_cache():
+    """
+    Drop every cached response and dimension label; the analytics cube
+    reloads on its next use.
+    """
+    response_cache.clear()
+    dimension_resolver.invalidate()
+    return {"detail": "Cache cleared"}
@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from crud.v2.dashboard import run_batch
+from db.replicas import get_async_read_db
+from helpers.response_cache import response_cache
+from helpers.serialization import EncodedJSONResponse, encoded
+from schemas.DashboardSchema import DashboardBatchRequest
+
+router = APIRouter()
+
+
+@router.post("/batch")
+async def dashboard_batch(
+    request: DashboardBatchRequest, db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Evaluate a list of dashboard widgets (kpi, insight, top_stores,
+    top_products, store_table, product_table) against one database snapshot
+    and return their results in request order.
+    """
+    try:
+        results = await response_cache.get_or_compute_async(
+            db,
+            "dashboard/batch",
+            {
+                "request": request.model_dump_json(),
+                # Widgets without an end date run up to today
+                "today": datetime.now(timezone.utc).date(),
+            },
+            encoded(lambda: db.run_sync(run_batch, request)),
+        )
+        return EncodedJSONResponse(results)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
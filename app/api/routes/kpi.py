@@ -1,25 +1,42 @@
 from datetime import datetime, timezone
-from typing import Optional, List
+from typing import Literal, Optional, List
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session  # Import query_params from fastapi_utils
+from sqlalchemy.ext.asyncio import AsyncSession
 from helpers import parse_date
 from crud.v2.kpi import KPICrud
-from crud.kpi.insights import fetch_insights
-from db.session import get_db
+from crud.kpi.insights import fetch_insights_async
+from db.replicas import get_async_read_db
+from db.query_budget import query_budget
+from helpers.response_cache import response_cache
+from helpers.serialization import EncodedJSONResponse, dumps, encoded
 from fastapi.logger import logger
 
 router = APIRouter()
 kpi_crud = KPICrud()
 
 
-@router.get("/")
-def get_all_kpi(
-    db: Session = Depends(get_db),
+@router.get("/", dependencies=[query_budget(3)])
+async def get_all_kpi(
+    db: AsyncSession = Depends(get_async_read_db),
     start_date: str = Query(..., description="Start date in YYYY-MM-DD format"),
     end_date: Optional[str] = Query(None, description="End date in YYYY-MM-DD format"),
+    granularity: Optional[Literal["day", "week", "month", "quarter"]] = Query(
+        None,
+        description="Trend bucket size; defaults to day up to 31 days, else month",
+    ),
 ):
     """
     Get all KPIs for the given date range.
+
+    - **Total Sales**: sum of item price × quantity.
+    - **Total Profit**: sum of (item price − product cost) × quantity, i.e.
+      priced at what each item sold for.
+    - **Total Orders**: number of distinct orders with at least one item.
+    - **Total Returns**: number of returns, by return date.
+
+    Changed: Total Profit used to be priced at the product's current list
+    price, and Total Orders counted every order, including orders without
+    items. Both now match the store and product tables.
     """
     # Parse dates with timezone awareness
     start_date = parse_date.parse_date_safe(start_date).replace(tzinfo=timezone.utc)
@@ -35,16 +52,34 @@ def get_all_kpi(
             status_code=400, detail="End date cannot be before start date"
         )
     try:
-        kpi_data = kpi_crud.get_all_kpi(db=db, start_date=start_date, end_date=end_date)
+        kpi_data = await response_cache.get_or_compute_async(
+            db,
+            "kpi",
+            {
+                "start_date": start_date,
+                "end_date": end_date,
+                "granularity": granularity,
+            },
+            encoded(
+                lambda: kpi_crud.get_all_kpi_async(
+                    db=db,
+                    start_date=start_date,
+                    end_date=end_date,
+                    granularity=granularity,
+                )
+            ),
+        )
         if kpi_data is None:
             raise HTTPException(status_code=404, detail="No KPI data found")
-        return kpi_data
+        return EncodedJSONResponse(kpi_data)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/insight")
-def get_insight(
+@router.get("/insight", dependencies=[query_budget(3)])
+async def get_insight(
     comparison_level: str = Query("Region", description="Level of comparison"),
     metric: str = Query("Total Sales", description="Metric to compare"),
     selected_regions: List[str] = Query([]),
@@ -53,7 +88,7 @@ def get_insight(
     selected_products: List[str] = Query([]),
     start_date: str = Query(..., description="Start date in YYYY-MM-DD format"),
     end_date: str = Query(None, description="End date in YYYY-MM-DD format"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     region_list = selected_regions or []
     store_list = selected_stores or []
@@ -75,38 +110,58 @@ def get_insight(
             )
 
         comparison_level = comparison_level.lower()
-        data = fetch_insights(
-            db=db,
-            comparison_level=comparison_level,
-            metric=metric,
-            selected_regions=region_list,
-            selected_stores=store_list,
-            selected_brands=brand_list,
-            selected_products=product_list,
-            start_date=start_date,
-            end_date=end_date,
+
+        async def compute():
+            data = await fetch_insights_async(
+                db=db,
+                comparison_level=comparison_level,
+                metric=metric,
+                selected_regions=region_list,
+                selected_stores=store_list,
+                selected_brands=brand_list,
+                selected_products=product_list,
+                start_date=start_date,
+                end_date=end_date,
+            )
+            return data or None
+
+        data = await response_cache.get_or_compute_async(
+            db,
+            "kpi/insight",
+            {
+                "comparison_level": comparison_level,
+                "metric": metric,
+                "selected_regions": region_list,
+                "selected_stores": store_list,
+                "selected_brands": brand_list,
+                "selected_products": product_list,
+                "start_date": start_date,
+                "end_date": end_date,
+            },
+            encoded(compute),
         )
 
-        if not data:
+        if data is None:
             raise HTTPException(
                 status_code=404, detail="No data found for the selected filters"
             )
 
-        return {
-            "data": data,
-            "meta": {
-                "comparison_level": comparison_level,
-                "metric": metric,
-                "start_date": start_date.isoformat(),
-                "end_date": end_date.isoformat(),
-                "filter_counts": {
-                    "regions": len(selected_regions),
-                    "stores": len(selected_stores),
-                    "brands": len(selected_brands),
-                    "products": len(selected_products),
-                },
+        # The cached data is already encoded: splice it into the envelope
+        meta = {
+            "comparison_level": comparison_level,
+            "metric": metric,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "filter_counts": {
+                "regions": len(selected_regions),
+                "stores": len(selected_stores),
+                "brands": len(selected_brands),
+                "products": len(selected_products),
             },
         }
+        return EncodedJSONResponse(
+            b'{"data":' + data + b',"meta":' + dumps(meta) + b"}"
+        )
     except ValueError as e:
         logger.error(f"ValueError in get_insight: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,10 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from schemas.ProductSchema import Product, ProductCreate, ProductUpdate
+from crud.v2 import metrics
 from crud.v2.product import ProductCrud
 from db.session import get_db
+from db.replicas import get_async_read_db
+from db.query_budget import query_budget
 from typing import List, Optional
 from helpers.parse_date import parse_date_safe
+from helpers.response_cache import response_cache
+from helpers.serialization import EncodedJSONResponse, FastJSONResponse, encoded
 
 router = APIRouter()
 product_crud = ProductCrud()
@@ -13,30 +19,58 @@ product_crud = ProductCrud()
 
 @router.post("/", response_model=Product)
 def create_product(product: ProductCreate, db: Session = Depends(get_db)):
-    return product_crud.create_product(db=db, product=product)
+    db_product = product_crud.create_product(db=db, product=product)
+    response_cache.clear()
+    return db_product
 
 
-@router.get("/table")
-def fetch_aggregated_table_data(
+@router.get("/table", dependencies=[query_budget(1)])
+async def fetch_aggregated_table_data(
     group_by: str = Query("product", enum=["product", "brand"]),
-    metric: str = Query("Total Sales"),
+    metric: metrics.MetricName = Query("Total Sales"),
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     limit: Optional[int] = None,
     sort: Optional[str] = Query("desc", enum=["asc", "desc"]),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     start = parse_date_safe(start_date)
     end = parse_date_safe(end_date)
 
-    if group_by == "brand":
-        return product_crud.get_brand_table_data(
-            db, start_date=start, end_date=end, metric=metric, limit=limit, sort=sort
-        )
-    else:
-        return product_crud.get_product_table_data(
-            db, start_date=start, end_date=end, metric=metric, limit=limit, sort=sort
-        )
+    async def compute():
+        if group_by == "brand":
+            return await product_crud.get_brand_table_data_async(
+                db,
+                start_date=start,
+                end_date=end,
+                metric=metric,
+                limit=limit,
+                sort=sort,
+            )
+        else:
+            return await product_crud.get_product_table_data_async(
+                db,
+                start_date=start,
+                end_date=end,
+                metric=metric,
+                limit=limit,
+                sort=sort,
+            )
+
+    table = await response_cache.get_or_compute_async(
+        db,
+        "products/table",
+        {
+            "group_by": group_by,
+            "metric": metric,
+            "start_date": start,
+            "end_date": end,
+            "limit": limit,
+            "sort": sort,
+        },
+        encoded(compute),
+    )
+    return EncodedJSONResponse(table)
 
 
 @router.get("/", response_model=List[Product])
@@ -44,22 +78,23 @@ def get_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db))
     return product_crud.get_products(db=db, skip=skip, limit=limit)
 
 
-@router.get("/top")
-def get_top_n_products(
+@router.get("/top", dependencies=[query_budget(1)])
+async def get_top_n_products(
     n: int = 10,
-    db: Session = Depends(get_db),
-    metric: str = "Total Sales",
+    db: AsyncSession = Depends(get_async_read_db),
+    metric: metrics.MetricName = "Total Sales",
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
 ):
     start = parse_date_safe(start_date)
     end = parse_date_safe(end_date)
-    return product_crud.get_top_products_by_metric(
+    top = await product_crud.get_top_products_by_metric_async(
         db=db, metric=metric, start_date=start, end_date=end, n=n
     )
+    return FastJSONResponse(top)
 
 
-@router.get("/filters/products")
+@router.get("/filters/products", dependencies=[query_budget(1)])
 def fetch_product_names(
     db: Session = Depends(get_db),
     selected_brands: Optional[List[str]] = Query(None),
@@ -67,7 +102,7 @@ def fetch_product_names(
     return product_crud.get_unique_product_names(db, selected_brands=selected_brands)
 
 
-@router.get("/filters/brands")
+@router.get("/filters/brands", dependencies=[query_budget(1)])
 def fetch_brand_names(db: Session = Depends(get_db)):
     return product_crud.get_unique_brand_names(db)
 
@@ -89,6 +124,7 @@ def update_product(
     )
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    response_cache.clear()
     return db_product
 
 
@@ -97,4 +133,5 @@ def delete_product(product_id: str, db: Session = Depends(get_db)):
     success = product_crud.delete_product(db=db, product_id=product_id)
     if not success:
         raise HTTPException(status_code=404, detail="Product not found")
+    response_cache.clear()
     return {"detail": "Product deleted"}
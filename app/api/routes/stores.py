@@ -1,11 +1,17 @@
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from schemas.StoreSchema import Store, StoreCreate, StoreUpdate
+from crud.v2 import metrics
 from crud.v2.stores import StoreCrud
 from schemas.StoreSchema import Store as StoreResponse
 from db.session import get_db
+from db.replicas import get_async_read_db
+from db.query_budget import query_budget
 from helpers.parse_date import parse_date_safe
+from helpers.response_cache import response_cache
+from helpers.serialization import EncodedJSONResponse, FastJSONResponse, encoded
 
 router = APIRouter()
 store_crud = StoreCrud()
@@ -21,12 +27,14 @@ def read_stores(db: Session = Depends(get_db)):
 @router.post("/", response_model=Store)
 def add_store(store: StoreCreate, db: Session = Depends(get_db)):
     """Add a new store."""
-    return store_crud.create_store(db=db, store=store)
+    db_store = store_crud.create_store(db=db, store=store)
+    response_cache.clear()
+    return db_store
 
 
-@router.get("/table", response_model=List[dict])
-def fetch_table_data(
-    db: Session = Depends(get_db),
+@router.get("/table", response_model=List[dict], dependencies=[query_budget(1)])
+async def fetch_table_data(
+    db: AsyncSession = Depends(get_async_read_db),
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     group_by: str = Query("store", enum=["store", "region"]),
@@ -35,29 +43,39 @@ def fetch_table_data(
     start_date = parse_date_safe(start_date)
     end_date = parse_date_safe(end_date) if end_date else None
 
-    if group_by == "region":
-        return store_crud.get_region_table_data(
+    async def compute():
+        if group_by == "region":
+            return await store_crud.get_region_table_data_async(
+                db=db, start_date=start_date, end_date=end_date
+            )
+        return await store_crud.get_store_table_data_async(
             db=db, start_date=start_date, end_date=end_date
         )
-    return store_crud.get_store_table_data(
-        db=db, start_date=start_date, end_date=end_date
+
+    table = await response_cache.get_or_compute_async(
+        db,
+        "stores/table",
+        {"start_date": start_date, "end_date": end_date, "group_by": group_by},
+        encoded(compute),
     )
+    return EncodedJSONResponse(table)
 
 
-@router.get("/top", response_model=List[dict])
-def get_top_n_stores(
+@router.get("/top", response_model=List[dict], dependencies=[query_budget(1)])
+async def get_top_n_stores(
     n: int = 10,
-    db: Session = Depends(get_db),
-    metric: str = "Total Sales",
+    db: AsyncSession = Depends(get_async_read_db),
+    metric: metrics.MetricName = "Total Sales",
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
 ):
     """Get top N stores by a specific metric."""
     start_date = parse_date_safe(start_date)
     end_date = parse_date_safe(end_date) if end_date else None
-    return store_crud.get_top_stores_by_metric(
+    top = await store_crud.get_top_stores_by_metric_async(
         db=db, metric=metric, start_date=start_date, end_date=end_date, n=n
     )
+    return FastJSONResponse(top)
 
 
 @router.get("/{store_id}", response_model=Store)
@@ -75,6 +93,7 @@ def update_store(store_id: str, store: StoreUpdate, db: Session = Depends(get_db
     db_store = store_crud.update_store(db=db, store_id=store_id, store=store)
     if db_store is None:
         raise HTTPException(status_code=404, detail="Store not found")
+    response_cache.clear()
     return db_store
 
 
@@ -84,6 +103,7 @@ def delete_store(store_id: str, db: Session = Depends(get_db)):
     success = store_crud.delete_store(db=db, store_id=store_id)
     if not success:
         raise HTTPException(status_code=404, detail="Store not found")
+    response_cache.clear()
     return {"detail": "Store deleted"}
 
 
@@ -96,13 +116,17 @@ def read_store_by_name(store_name: str, db: Session = Depends(get_db)):
     return db_store
 
 
-@router.get("/filters/regions", response_model=List[str])
+@router.get(
+    "/filters/regions", response_model=List[str], dependencies=[query_budget(1)]
+)
 def fetch_regions(db: Session = Depends(get_db)):
     """Fetch unique store regions."""
     return store_crud.get_unique_regions(db)
 
 
-@router.get("/filters/stores", response_model=List[dict])
+@router.get(
+    "/filters/stores", response_model=List[dict], dependencies=[query_budget(1)]
+)
 def fetch_stores(
     db: Session = Depends(get_db),
     regions: str = Query(None, alias="selected_regions"),
@@ -1,36 +1,33 @@
 from collections import defaultdict
 import json
 from sqlalchemy.orm import Session
-from sqlalchemy import func, distinct, select, case, and_, not_, exists
+from sqlalchemy import func, distinct, select, case, and_, not_, exists, literal_column
 from models.OrderModel import Order
 from models.OrderItemsModel import OrderItem
 from models.CustomersModel import Customer
 from models.ProductModel import Product
 from models.StoreModel import Store
-from models.ReturnsModel import Return as Returns
+from crud.v2 import first_purchase, metrics
+from crud.kpi import insights
+from helpers.dimension_resolver import dimension_resolver
 from datetime import datetime, timezone, timedelta
 from typing import Optional, List, Dict, Tuple, Union, Any
 from dateutil.relativedelta import relativedelta
 
 
-def get_total_sales(
-    db: Session, start_date: datetime, end_date: Optional[datetime] = None
+def _metric_card(
+    db: Session,
+    metric: str,
+    start_date: datetime,
+    end_date: Optional[datetime],
+    value_format: str,
+    previous_format: str,
 ):
+    """Total, change against the mirror range and trend of one registry metric."""
     end_date = end_date or datetime.now(timezone.utc)
 
-    # Calculate number of months in selected range
-    month_diff = (
-        (end_date.year - start_date.year) * 12 + (end_date.month - start_date.month) + 1
-    )
-    month_diff = min(month_diff, 3)  # cap at 3 months max
-
-    # Total sales in current range
-    total = (
-        db.query(func.sum(OrderItem.price * OrderItem.quantity))
-        .join(Order)
-        .filter(Order.order_date.between(start_date, end_date))
-        .scalar()
-    ) or 0.0
+    # Total in current range
+    total = metrics.total(db, metric, start_date, end_date) or 0
 
     # Calculate mirror date range
     range_length = (end_date - start_date).days + 1
@@ -38,98 +35,25 @@ def get_total_sales(
     prev_start = prev_end - timedelta(days=range_length - 1)
 
     # Previous period total
-    prev_total = (
-        db.query(func.sum(OrderItem.price * OrderItem.quantity))
-        .join(Order)
-        .filter(Order.order_date.between(prev_start, prev_end))
-        .scalar()
-    ) or 0.0
+    prev_total = metrics.total(db, metric, prev_start, prev_end) or 0
 
     # Calculate percentage change safely
-    if prev_total > 0:
-        percentage_change = (total - prev_total) / prev_total * 100
-    else:
-        percentage_change = 0.0
-
-    # Time series grouped by day (or change to month if range is long)
-    group_by = "day" if range_length <= 31 else "month"
-    date_trunc_unit = "day" if group_by == "day" else "month"
-
-    time_series = (
-        db.query(
-            func.date_trunc(date_trunc_unit, Order.order_date).label("bucket"),
-            func.sum(OrderItem.price * OrderItem.quantity).label("bucket_total"),
-        )
-        .join(Order)
-        .filter(Order.order_date.between(start_date, end_date))
-        .group_by("bucket")
-        .order_by("bucket")
-        .all()
-    )
-
-    trend_data = [
-        {
-            "date": row.bucket.strftime("%Y-%m-%d" if group_by == "day" else "%Y-%m"),
-            "value": row.bucket_total,
-        }
-        for row in time_series
-    ]
-
-    return {
-        "title": "Total Sales",
-        "value": f"${total:,.2f}" if total else "0",
-        "percentage_change": f"{percentage_change:.2f}%",
-        "trend_data": trend_data,
-        "previous_total": f"${prev_total:,.2f}" if prev_total else "0",
-        "current_date_range": f"{start_date.strftime('%b %d, %Y')} to {end_date.strftime('%b %d, %Y')}",
-        "previous_date_range": f"{prev_start.strftime('%b %d, %Y')} to {prev_end.strftime('%b %d, %Y')}",
-    }
-
-
-def get_total_orders(
-    db: Session, start_date: datetime, end_date: Optional[datetime] = None
-):
-    end_date = end_date or datetime.now(timezone.utc)
-
-    # How many months in selected range?
-    month_diff = (
-        (end_date.year - start_date.year) * 12 + (end_date.month - start_date.month) + 1
-    )
-    month_diff = min(month_diff, 3)
-
-    # Total orders in selected range
-    total = (
-        db.query(func.count(Order.order_id))
-        .filter(Order.order_date.between(start_date, end_date))
-        .scalar()
-    ) or 0
-
-    # Calculate mirror date range
-    range_length = (end_date - start_date).days + 1
-    prev_end = start_date - timedelta(days=1)
-    prev_start = prev_end - timedelta(days=range_length - 1)
-
-    prev_total = (
-        db.query(func.count(Order.order_id))
-        .filter(Order.order_date.between(prev_start, prev_end))
-        .scalar()
-    ) or 0
-
     percentage_change = (
         ((total - prev_total) / prev_total) * 100 if prev_total > 0 else 0.0
     )
 
+    # Time series grouped by day (or month if range is long)
     group_by = "day" if range_length <= 31 else "month"
-    date_trunc_unit = "day" if group_by == "day" else "month"
 
     time_series = (
-        db.query(
-            func.date_trunc(date_trunc_unit, Order.order_date).label("bucket"),
-            func.count(Order.order_id).label("bucket_total"),
+        metrics.aggregate_query(
+            db,
+            {"bucket_total": metric},
+            start_date=start_date,
+            end_date=end_date,
+            bucket=group_by,
         )
-        .filter(Order.order_date.between(start_date, end_date))
-        .group_by("bucket")
-        .order_by("bucket")
+        .order_by(literal_column("bucket"))
         .all()
     )
 
@@ -142,143 +66,43 @@ def get_total_orders(
     ]
 
     return {
-        "title": "Total Orders",
-        "value": f"{total:,.0f}" if total else "0",
+        "title": metric,
+        "value": value_format.format(total) if total else "0",
         "percentage_change": f"{percentage_change:.2f}%",
         "trend_data": trend_data,
-        "previous_total": f"${prev_total:,.0f}" if prev_total else "0",
+        "previous_total": previous_format.format(prev_total) if prev_total else "0",
         "current_date_range": f"{start_date.strftime('%b %d, %Y')} to {end_date.strftime('%b %d, %Y')}",
         "previous_date_range": f"{prev_start.strftime('%b %d, %Y')} to {prev_end.strftime('%b %d, %Y')}",
     }
 
 
-def get_total_profit(
+def get_total_sales(
     db: Session, start_date: datetime, end_date: Optional[datetime] = None
 ):
-    end_date = end_date or datetime.now(timezone.utc)
-
-    # Total profit in selected range
-    total = (
-        db.query(func.sum((Product.price - Product.cost) * OrderItem.quantity))
-        .select_from(OrderItem)
-        .join(Product)
-        .join(Order)
-        .filter(Order.order_date.between(start_date, end_date))
-        .scalar()
-    )
-
-    # Calculate mirror date range
-    range_length = (end_date - start_date).days + 1
-    prev_end = start_date - timedelta(days=1)
-    prev_start = prev_end - timedelta(days=range_length - 1)
+    return _metric_card(db, "Total Sales", start_date, end_date, "${:,.2f}", "${:,.2f}")
 
-    # Profit for previous range
-    prev_total = (
-        db.query(func.sum((Product.price - Product.cost) * OrderItem.quantity))
-        .select_from(OrderItem)
-        .join(Product)
-        .join(Order)
-        .filter(Order.order_date.between(prev_start, prev_end))
-        .scalar()
-    )
 
-    percentage_change = ((total - prev_total) / prev_total) * 100 if prev_total else 0.0
+def get_total_orders(
+    db: Session, start_date: datetime, end_date: Optional[datetime] = None
+):
+    return _metric_card(db, "Total Orders", start_date, end_date, "{:,.0f}", "${:,.0f}")
 
-    group_by = "day" if range_length <= 31 else "month"
-    date_trunc_unit = "day" if group_by == "day" else "month"
 
-    time_series = (
-        db.query(
-            func.date_trunc(date_trunc_unit, Order.order_date).label("bucket"),
-            func.sum((Product.price - Product.cost) * OrderItem.quantity).label(
-                "bucket_total"
-            ),
-        )
-        .select_from(OrderItem)
-        .join(Product)
-        .join(Order)
-        .filter(Order.order_date.between(start_date, end_date))
-        .group_by("bucket")
-        .order_by("bucket")
-        .all()
+def get_total_profit(
+    db: Session, start_date: datetime, end_date: Optional[datetime] = None
+):
+    return _metric_card(
+        db, "Total Profit", start_date, end_date, "${:,.2f}", "${:,.2f}"
     )
 
-    trend_data = [
-        {
-            "date": row.bucket.strftime("%Y-%m-%d" if group_by == "day" else "%Y-%m"),
-            "value": row.bucket_total,
-        }
-        for row in time_series
-    ]
-
-    return {
-        "title": "Total Profit",
-        "value": f"${total:,.2f}" if total else "0",
-        "percentage_change": f"{percentage_change:.2f}%",
-        "trend_data": trend_data,
-        "previous_total": f"${prev_total:,.2f}" if prev_total else "0",
-        "current_date_range": f"{start_date.strftime('%b %d, %Y')} to {end_date.strftime('%b %d, %Y')}",
-        "previous_date_range": f"{prev_start.strftime('%b %d, %Y')} to {prev_end.strftime('%b %d, %Y')}",
-    }
-
 
 def get_total_returns(
     db: Session, start_date: datetime, end_date: Optional[datetime] = None
 ):
-    end_date = end_date or datetime.now(timezone.utc)
-
-    total = (
-        db.query(func.count(Returns.return_id))
-        .filter(Returns.return_date.between(start_date, end_date))
-        .scalar()
-    )
-
-    # Calculate mirror date range
-    range_length = (end_date - start_date).days + 1
-    prev_end = start_date - timedelta(days=1)
-    prev_start = prev_end - timedelta(days=range_length - 1)
-
-    prev_total = (
-        db.query(func.count(Returns.return_id))
-        .filter(Returns.return_date.between(prev_start, prev_end))
-        .scalar()
+    return _metric_card(
+        db, "Total Returns", start_date, end_date, "{:,.0f}", "${:,.0f}"
     )
 
-    percentage_change = ((total - prev_total) / prev_total) * 100 if prev_total else 0.0
-
-    # Daily trend data for sparkline
-    group_by = "day" if range_length <= 31 else "month"
-    date_trunc_unit = "day" if group_by == "day" else "month"
-
-    time_series = (
-        db.query(
-            func.date_trunc(date_trunc_unit, Returns.return_date).label("bucket"),
-            func.count(Returns.return_id).label("bucket_total"),
-        )
-        .filter(Returns.return_date.between(start_date, end_date))
-        .group_by("bucket")
-        .order_by("bucket")
-        .all()
-    )
-
-    trend_data = [
-        {
-            "date": row.bucket.strftime("%Y-%m-%d" if group_by == "day" else "%Y-%m"),
-            "value": row.bucket_total,
-        }
-        for row in time_series
-    ]
-
-    return {
-        "title": "Total Returns",
-        "value": f"{total:,.0f}" if total else "0",
-        "percentage_change": f"{percentage_change:.2f}%",
-        "trend_data": trend_data,
-        "previous_total": f"${prev_total:,.0f}" if prev_total else "0",
-        "current_date_range": f"{start_date.strftime('%b %d, %Y')} to {end_date.strftime('%b %d, %Y')}",
-        "previous_date_range": f"{prev_start.strftime('%b %d, %Y')} to {prev_end.strftime('%b %d, %Y')}",
-    }
-
 
 def fetch_insights(
     db: Session,
@@ -295,31 +119,8 @@ def fetch_insights(
     Fetch insights data with flexible filtering and comparison capabilities.
     Returns dictionary with 'summary' and 'trend' keys.
     """
-    # Validate inputs
-    valid_comparison_levels = ["region", "store", "brand", "product"]
-    if comparison_level not in valid_comparison_levels:
-        raise ValueError(
-            f"Invalid comparison level. Must be one of: {valid_comparison_levels}"
-        )
-
-    valid_metrics = {
-        "Total Sales": func.sum(OrderItem.price * OrderItem.quantity),
-        "Total Orders": func.count(OrderItem.order_item_id),
-        "Total Returns": func.count(Returns.return_id),
-        "Total Profit": func.sum((OrderItem.price - Product.cost) * OrderItem.quantity),
-    }
-
-    if metric not in valid_metrics:
-        raise ValueError(
-            f"Invalid metric. Must be one of: {list(valid_metrics.keys())}"
-        )
-
-    # Set default end date to now if not provided
-    end_date = end_date or datetime.now(timezone.utc)
-
-    # Get current period results
-    current_results = _fetch_insights_data(
-        db=db,
+    return insights.fetch_insights(
+        db,
         comparison_level=comparison_level,
         metric=metric,
         selected_regions=selected_regions,
@@ -328,179 +129,8 @@ def fetch_insights(
         selected_products=selected_products,
         start_date=start_date,
         end_date=end_date,
-        metric_expression=valid_metrics[metric],
     )
 
-    # Calculate previous period results if dates are provided
-    if start_date and end_date:
-        prev_start = start_date - (end_date - start_date) - timedelta(days=1)
-        prev_end = start_date - timedelta(days=1)
-
-        prev_results = _fetch_insights_data(
-            db=db,
-            comparison_level=comparison_level,
-            metric=metric,
-            selected_regions=selected_regions,
-            selected_stores=selected_stores,
-            selected_brands=selected_brands,
-            selected_products=selected_products,
-            start_date=prev_start,
-            end_date=prev_end,
-            metric_expression=valid_metrics[metric],
-        )
-
-        # Create a lookup for previous results
-        prev_lookup = {
-            item["comparison_value"]: item for item in prev_results["summary"]
-        }
-
-        # Add percentage change to current results
-        for current in current_results["summary"]:
-            prev_value = prev_lookup.get(current["comparison_value"], {}).get(
-                "metric_value", 0
-            )
-            curr_value = current["metric_value"]
-
-            if prev_value > 0:
-                current["percentage_change"] = (
-                    (curr_value - prev_value) / prev_value
-                ) * 100
-            else:
-                current["percentage_change"] = 0.0 if curr_value == 0 else 100.0
-
-    return current_results
-
-
-def _fetch_insights_data(
-    db: Session,
-    comparison_level: str,
-    metric: str,
-    selected_regions: List[str],
-    selected_stores: List[str],
-    selected_brands: List[str],
-    selected_products: List[str],
-    start_date: Optional[datetime],
-    end_date: Optional[datetime],
-    metric_expression: Any,
-) -> Dict[str, List]:
-    """Helper function to fetch data for a specific time period."""
-    # Determine the date field based on metric
-    if metric == "Total Returns":
-        date_field = Returns.return_date
-    else:
-        date_field = Order.order_date
-
-    # Common query setup function
-    def build_base_query(query, include_date=False, date_trunc_unit="month"):
-        """Build the base query with common joins and filters"""
-        # Select fields based on comparison level
-        if comparison_level == "region":
-            query = query.add_columns(Store.region.label("comparison_value"))
-        elif comparison_level == "store":
-            query = query.add_columns(
-                Store.name.label("comparison_value"),
-            )
-        elif comparison_level == "brand":
-            query = query.add_columns(Product.brand.label("comparison_value"))
-        elif comparison_level == "product":
-            query = query.add_columns(Product.name.label("comparison_value"))
-
-        if include_date:
-            query = query.add_columns(
-                func.date_trunc(date_trunc_unit, date_field).label("date")
-            )
-
-        query = query.add_columns(metric_expression.label("metric_value"))
-
-        # Build joins based on metric
-        if metric in ["Total Sales", "Total Orders", "Total Profit", "Total Customers"]:
-            query = query.select_from(OrderItem)
-            query = query.join(Order, Order.order_id == OrderItem.order_id)
-            query = query.join(Product, Product.product_id == OrderItem.product_id)
-
-            if comparison_level in ["region", "store"]:
-                query = query.join(Store, Store.store_id == Order.store_id)
-
-        elif metric == "Total Returns":
-            query = query.select_from(Returns)
-            query = query.join(
-                OrderItem, OrderItem.order_item_id == Returns.order_item_id
-            )
-            query = query.join(Order, Order.order_id == OrderItem.order_id)
-            query = query.join(Product, Product.product_id == OrderItem.product_id)
-
-            if comparison_level in ["region", "store"]:
-                query = query.join(Store, Store.store_id == Order.store_id)
-
-        # Apply filters
-        if selected_regions:
-            query = query.filter(Store.region.in_(selected_regions))
-        if selected_stores:
-            query = query.filter(Store.store_id.in_(selected_stores))
-        if selected_brands:
-            query = query.filter(Product.brand.in_(selected_brands))
-        if selected_products:
-            query = query.filter(Product.name.in_(selected_products))
-        if start_date and end_date:
-            query = query.filter(date_field.between(start_date, end_date))
-
-        return query
-
-    # Build and execute summary query
-    summary_query = build_base_query(db.query())
-    group_by_fields = []
-    if comparison_level == "region":
-        group_by_fields.append(Store.region)
-    elif comparison_level == "store":
-        group_by_fields.extend([Store.store_id, Store.name])
-    elif comparison_level == "brand":
-        group_by_fields.append(Product.brand)
-    elif comparison_level == "product":
-        group_by_fields.append(Product.name)
-
-    summary_query = summary_query.group_by(*group_by_fields)
-    summary_results = summary_query.all()
-
-    # Format summary results
-    formatted_summary = []
-    for row in summary_results:
-        result = {
-            "comparison_value": row.comparison_value,
-            "metric_value": float(row.metric_value or 0),
-            "metric_name": metric,
-        }
-        if hasattr(row, "store_name"):
-            result["store_name"] = row.store_name
-        formatted_summary.append(result)
-
-    # Build and execute trend query
-    trend_data = []
-    if start_date and end_date:
-        trend_query = build_base_query(
-            db.query(),
-            include_date=True,
-            date_trunc_unit="month",  # Or 'month' depending on your needs
-        )
-
-        trend_group_by = group_by_fields.copy()
-        trend_group_by.append(
-            func.date_trunc("month", date_field)
-        )  # Must match the SELECT
-        trend_query = trend_query.group_by(*trend_group_by)
-
-        trend_results = trend_query.order_by("comparison_value").all()
-
-        for row in trend_results:
-            trend_data.append(
-                {
-                    "comparison_value": row.comparison_value,
-                    "date": row.date.isoformat(),
-                    "metric_value": float(row.metric_value or 0),
-                }
-            )
-
-    return {"summary": formatted_summary, "trend": trend_data}
-
 
 def get_all_kpi(db: Session, start_date: datetime, end_date: Optional[datetime] = None):
     if start_date.tzinfo is None:
@@ -1748,7 +1378,9 @@ def fetch_customer_metric_trend(
                 .group_by("period", "comparison_value")
             )
 
-        return general_results + _format_comparison_trend(comparison_query.all())
+        return general_results + _format_comparison_trend(
+            db, comparison_level, comparison_query.all()
+        )
 
     return general_results
 
@@ -1795,13 +1427,15 @@ def _format_trend_result(rows: List[Tuple[datetime, Any]]) -> List[Dict[str, Any
 
 
 def _format_comparison_trend(
+    db: Session,
+    comparison_level: str,
     rows: List[Tuple[datetime, str, Any]],
 ) -> List[Dict[str, Any]]:
     trend_map: Dict[str, List[Dict[str, Any]]] = {}
+    label = dimension_resolver.resolver(db, comparison_level)
 
     for period, comparison_value, value in rows:
-        # Strip enum prefix if present
-        name = str(comparison_value).split(".")[-1]
+        name = label(comparison_value)
 
         if name not in trend_map:
             trend_map[name] = []
@@ -2062,8 +1696,9 @@ def fetch_customer_info(
 
     def _format_comparison_trend(rows):
         trend_map = defaultdict(list)
+        label = dimension_resolver.resolver(db, comparison_level)
         for period, comparison_value, value in rows:
-            name = str(comparison_value).split(".")[-1]
+            name = label(comparison_value)
             trend_map[name].append(
                 {"period": period.strftime("%Y-%m-%d"), "value": float(value or 0)}
             )
@@ -2088,6 +1723,12 @@ def fetch_customer_info(
             "employment_status": Customer.employment_status.label("segment"),
         }[seg]
 
+    # First purchases are precomputed per single dimension; any dimension
+    # filter needs them recomputed from the filtered orders.
+    use_first_purchase_table = first_purchase.first_purchase_available(db) and not (
+        selected_regions or selected_stores or selected_brands or selected_products
+    )
+
     # ============================
     # TREND RETURN
     # ============================
@@ -2149,19 +1790,24 @@ def fetch_customer_info(
                 ).label("value"),
             ).group_by(subq.c.period)
         elif metric_name == "New Customers":
-            first_purchases = (
-                db.query(
-                    Order.customer_id,
-                    func.min(Order.order_date).label("first_purchase_date"),
+            if use_first_purchase_table:
+                first_purchases = first_purchase.first_purchases(db)
+            else:
+                first_purchases = (
+                    db.query(
+                        Order.customer_id,
+                        func.min(Order.order_date).label("first_purchase_date"),
+                    )
+                    .join(OrderItem)
+                    .join(Product)
+                    .join(Customer)
                 )
-                .join(OrderItem)
-                .join(Product)
-                .join(Customer)
-            )
-            if selected_regions or selected_stores:
-                first_purchases = first_purchases.join(Store)
-            first_purchases = apply_filters(first_purchases)
-            first_purchases = first_purchases.group_by(Order.customer_id).subquery()
+                if selected_regions or selected_stores:
+                    first_purchases = first_purchases.join(Store)
+                first_purchases = apply_filters(first_purchases)
+                first_purchases = first_purchases.group_by(
+                    Order.customer_id
+                ).subquery()
 
             general_query = (
                 db.query(
@@ -2275,24 +1921,32 @@ def fetch_customer_info(
                     customer_orders_subq.c.comparison_value,
                 )
             elif metric_name == "New Customers":
-                first_purchases = (
-                    db.query(
-                        Order.customer_id,
-                        func.min(Order.order_date).label("first_purchase_date"),
-                        comp_col.label("comparison_value"),
-                    )
-                    .join(OrderItem, OrderItem.order_id == Order.order_id)
-                    .join(Product, Product.product_id == OrderItem.product_id)
-                    .join(Customer, Customer.customer_id == Order.customer_id)
-                )
-                if comparison_level in ["region", "store"]:
-                    first_purchases = first_purchases.join(
-                        Store, Store.store_id == Order.store_id
+                if use_first_purchase_table:
+                    scoped = first_purchase.first_purchases(db, comparison_level)
+                    first_purchases = db.query(
+                        scoped.c.customer_id,
+                        scoped.c.first_purchase_date,
+                        scoped.c.scope_key.label("comparison_value"),
+                    ).subquery()
+                else:
+                    first_purchases = (
+                        db.query(
+                            Order.customer_id,
+                            func.min(Order.order_date).label("first_purchase_date"),
+                            comp_col.label("comparison_value"),
+                        )
+                        .join(OrderItem, OrderItem.order_id == Order.order_id)
+                        .join(Product, Product.product_id == OrderItem.product_id)
+                        .join(Customer, Customer.customer_id == Order.customer_id)
                     )
-                first_purchases = apply_filters(first_purchases)
-                first_purchases = first_purchases.group_by(
-                    Order.customer_id, "comparison_value"
-                ).subquery()
+                    if comparison_level in ["region", "store"]:
+                        first_purchases = first_purchases.join(
+                            Store, Store.store_id == Order.store_id
+                        )
+                    first_purchases = apply_filters(first_purchases)
+                    first_purchases = first_purchases.group_by(
+                        Order.customer_id, "comparison_value"
+                    ).subquery()
 
                 comparison_query = (
                     db.query(
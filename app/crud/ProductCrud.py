@@ -11,6 +11,7 @@ from sqlalchemy import func, desc, distinct
 from datetime import datetime
 from typing import Literal, Optional
 from sqlalchemy import literal
+from helpers.dimension_resolver import dimension_resolver
 
 # Create a new product
 
@@ -27,6 +28,7 @@ def create_product(db: Session, product: ProductCreate):
     )
     db.add(db_product)
     db.commit()
+    dimension_resolver.invalidate()
     db.refresh(db_product)
     return db_product
 
@@ -54,6 +56,7 @@ def update_product(db: Session, product_id: str, product: ProductUpdate):
         for key, value in product.dict(exclude_unset=True).items():
             setattr(db_product, key, value)
         db.commit()
+        dimension_resolver.invalidate()
         db.refresh(db_product)
     return db_product
 
@@ -66,6 +69,7 @@ def delete_product(db: Session, product_id: str):
     if db_product:
         db.delete(db_product)
         db.commit()
+        dimension_resolver.invalidate()
     return db_product
 
 
@@ -10,6 +10,7 @@ from models.StoreModel import Store
 from sqlalchemy import func, desc, literal, and_, distinct
 from models.ProductModel import Product
 import uuid
+from helpers.dimension_resolver import dimension_resolver
 
 
 def get_all_stores(db: Session):
@@ -26,6 +27,7 @@ def create_store(db: Session, store: StoreCreate):
     )
     db.add(db_store)
     db.commit()
+    dimension_resolver.invalidate()
     db.refresh(db_store)
     return db_store
 
@@ -46,6 +48,7 @@ def update_store(db: Session, store_id: str, store: StoreUpdate):
         if store.opening_date:
             db_store.opening_date = store.opening_date
         db.commit()
+        dimension_resolver.invalidate()
         db.refresh(db_store)
     return db_store
 
@@ -55,6 +58,7 @@ def delete_store(db: Session, store_id: str):
     if db_store:
         db.delete(db_store)
         db.commit()
+        dimension_resolver.invalidate()
         return True
     return False
 
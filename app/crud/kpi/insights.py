@@ -1,130 +1,16 @@
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, List, Optional, Union, Any, Callable, Tuple
 from datetime import datetime, timezone, timedelta
+from functools import partial
 from sqlalchemy.orm import Session
-from sqlalchemy import func, distinct, select, case, and_, not_, exists
-from models.OrderModel import Order
-from models.OrderItemsModel import OrderItem
-from models.CustomersModel import Customer
-from models.ProductModel import Product
-from models.StoreModel import Store
-from models.ReturnsModel import Return as Returns
+from sqlalchemy.ext.asyncio import AsyncSession
+from enum import Enum
+from crud.v2 import metrics
+from crud.v2.cube import CubeData, analytics_cube
+from db.fanout import run_concurrently, run_concurrently_async
 
 # Constants for validation
-VALID_COMPARISON_LEVELS = ["region", "store", "brand", "product"]
-VALID_METRICS = {
-    "Total Sales": {
-        "expression": func.sum(OrderItem.price * OrderItem.quantity),
-        "date_field": Order.order_date,
-        "base_model": OrderItem,
-    },
-    "Total Orders": {
-        "expression": func.count(OrderItem.order_item_id),
-        "date_field": Order.order_date,
-        "base_model": OrderItem,
-    },
-    "Total Returns": {
-        "expression": func.count(Returns.return_id),
-        "date_field": Returns.return_date,
-        "base_model": Returns,
-    },
-    "Total Profit": {
-        "expression": func.sum((OrderItem.price - Product.cost) * OrderItem.quantity),
-        "date_field": Order.order_date,
-        "base_model": OrderItem,
-    },
-}
-
-
-def _get_comparison_column(comparison_level: str):
-    """Get the appropriate column for the comparison level."""
-    if comparison_level == "region":
-        return Store.region.label("comparison_value")
-    elif comparison_level == "store":
-        return Store.name.label("comparison_value")
-    elif comparison_level == "brand":
-        return Product.brand.label("comparison_value")
-    elif comparison_level == "product":
-        return Product.name.label("comparison_value")
-    raise ValueError(f"Invalid comparison level: {comparison_level}")
-
-
-def _build_base_query(
-    db: Session,
-    comparison_level: str,
-    metric_info: Dict[str, Any],
-    selected_regions: List[str] = None,
-    selected_stores: List[str] = None,
-    selected_brands: List[str] = None,
-    selected_products: List[str] = None,
-    start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None,
-    include_date: bool = False,
-    date_trunc_unit: str = "month",
-):
-    """Build the base query with common joins and filters."""
-    query = db.query()
-
-    # Add comparison value column
-    query = query.add_columns(_get_comparison_column(comparison_level))
-
-    # Add date column if needed for trend data
-    if include_date:
-        query = query.add_columns(
-            func.date_trunc(date_trunc_unit, metric_info["date_field"]).label("date")
-        )
-
-    # Add metric value column
-    query = query.add_columns(metric_info["expression"].label("metric_value"))
-
-    # Start from the appropriate base model
-    query = query.select_from(metric_info["base_model"])
-
-    # Build joins based on metric
-    if metric_info["base_model"] == OrderItem:
-        query = query.join(Order, Order.order_id == OrderItem.order_id)
-        query = query.join(Product, Product.product_id == OrderItem.product_id)
-    elif metric_info["base_model"] == Returns:
-        query = query.join(OrderItem, OrderItem.order_item_id == Returns.order_item_id)
-        query = query.join(Order, Order.order_id == OrderItem.order_id)
-        query = query.join(Product, Product.product_id == OrderItem.product_id)
-
-    # Add store join if needed
-    if comparison_level in ["region", "store"]:
-        query = query.join(Store, Store.store_id == Order.store_id)
-
-    # Apply filters
-    if selected_regions:
-        query = query.filter(Store.region.in_(selected_regions))
-    if selected_stores:
-        query = query.filter(Store.store_id.in_(selected_stores))
-    if selected_brands:
-        query = query.filter(Product.brand.in_(selected_brands))
-    if selected_products:
-        query = query.filter(Product.product_id.in_(selected_products))
-    if start_date and end_date:
-        query = query.filter(metric_info["date_field"].between(start_date, end_date))
-
-    return query
-
-
-def _get_group_by_fields(comparison_level: str, include_date: bool = False):
-    """Get the appropriate group by fields based on comparison level."""
-    group_by = []
-    if comparison_level == "region":
-        group_by.append(Store.region)
-    elif comparison_level == "store":
-        group_by.extend([Store.store_id, Store.name])
-    elif comparison_level == "brand":
-        group_by.append(Product.brand)
-    elif comparison_level == "product":
-        group_by.extend([Product.product_id, Product.name])
-
-    if include_date:
-        group_by.append(
-            func.date_trunc("month", VALID_METRICS["Total Sales"]["date_field"])
-        )
-
-    return group_by
+VALID_COMPARISON_LEVELS = metrics.DIMENSIONS
+VALID_METRICS = metrics.METRICS
 
 
 def _format_insights_results(
@@ -145,11 +31,11 @@ def _format_insights_results(
             result["store_name"] = row.store_name
 
         # Only include date if it was requested and exists in results
-        if include_date and hasattr(row, "date"):
+        if include_date and hasattr(row, "bucket"):
             trend.append(
                 {
                     "comparison_value": row.comparison_value,
-                    "date": row.date.isoformat(),
+                    "date": row.bucket.isoformat(),
                     "metric_value": float(row.metric_value or 0),
                 }
             )
@@ -174,6 +60,61 @@ def fetch_insights(
     Fetch insights data with flexible filtering and comparison capabilities.
     Returns dictionary with 'summary' and 'trend' keys.
     """
+    tasks, finish = _plan_insights(
+        db,
+        comparison_level=comparison_level,
+        metric=metric,
+        selected_regions=selected_regions,
+        selected_stores=selected_stores,
+        selected_brands=selected_brands,
+        selected_products=selected_products,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    return finish(run_concurrently(db, tasks))
+
+
+async def fetch_insights_async(
+    db: AsyncSession,
+    comparison_level: str,
+    metric: str,
+    selected_regions: List[str] = None,
+    selected_stores: List[str] = None,
+    selected_brands: List[str] = None,
+    selected_products: List[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> Dict[str, Union[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    """Async variant of fetch_insights; the queries fan out on the event loop."""
+    tasks, finish = await db.run_sync(
+        _plan_insights,
+        comparison_level=comparison_level,
+        metric=metric,
+        selected_regions=selected_regions,
+        selected_stores=selected_stores,
+        selected_brands=selected_brands,
+        selected_products=selected_products,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    return finish(await run_concurrently_async(db, tasks))
+
+
+def _plan_insights(
+    db: Session,
+    comparison_level: str,
+    metric: str,
+    selected_regions: List[str] = None,
+    selected_stores: List[str] = None,
+    selected_brands: List[str] = None,
+    selected_products: List[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> Tuple[Dict[str, Callable[[Session], List]], Callable[[Dict], Dict]]:
+    """
+    Split an insights request into independent queries plus a function that
+    merges their rows into the response.
+    """
     # Validate inputs
     if comparison_level not in VALID_COMPARISON_LEVELS:
         raise ValueError(
@@ -187,106 +128,106 @@ def fetch_insights(
 
     # Set default end date to now if not provided
     end_date = end_date or datetime.now(timezone.utc)
-    metric_info = VALID_METRICS[metric]
 
-    # Get current period results
-    current_results = _fetch_insights_data(
-        db=db,
+    query_args = dict(
         comparison_level=comparison_level,
-        metric_info=metric_info,
-        selected_regions=selected_regions,
-        selected_stores=selected_stores,
-        selected_brands=selected_brands,
-        selected_products=selected_products,
-        start_date=start_date,
-        end_date=end_date,
         metric=metric,
+        filters={
+            "region": selected_regions,
+            "store": selected_stores,
+            "brand": selected_brands,
+            "product": selected_products,
+        },
     )
 
-    # Calculate previous period results if dates are provided
+    # Current summary, current trend and previous summary are independent
+    tasks = {
+        "summary": partial(
+            _fetch_insights_rows, start_date=start_date, end_date=end_date, **query_args
+        )
+    }
     if start_date and end_date:
         prev_start = start_date - (end_date - start_date) - timedelta(days=1)
         prev_end = start_date - timedelta(days=1)
-
-        prev_results = _fetch_insights_data(
-            db=db,
-            comparison_level=comparison_level,
-            metric_info=metric_info,
-            selected_regions=selected_regions,
-            selected_stores=selected_stores,
-            selected_brands=selected_brands,
-            selected_products=selected_products,
-            start_date=prev_start,
-            end_date=prev_end,
-            metric=metric,
+        tasks["trend"] = partial(
+            _fetch_insights_rows,
+            start_date=start_date,
+            end_date=end_date,
+            include_date=True,
+            **query_args,
+        )
+        tasks["previous"] = partial(
+            _fetch_insights_rows, start_date=prev_start, end_date=prev_end, **query_args
         )
 
-        # Add percentage change to current results
-        _add_percentage_change(current_results, prev_results)
+    answered = {}
+    cube = analytics_cube.serving(
+        db, [metric], [comparison_level], query_args["filters"]
+    )
+    if cube is not None:
+        # Answered from memory; nothing is left to run on the database
+        answered = {name: task(db, cube=cube) for name, task in tasks.items()}
+        tasks = {}
+
+    def finish(results: Dict[str, List]) -> Dict[str, List]:
+        results = {**answered, **results}
+        trend_results = results.get("trend", [])
+        current_results = _format_insights_results(
+            results["summary"] + trend_results,
+            metric,
+            include_date=bool(trend_results),
+        )
+        if "previous" in results:
+            prev_results = _format_insights_results(results["previous"], metric)
+            # Add percentage change to current results
+            _add_percentage_change(current_results, prev_results)
+        return current_results
 
-    return current_results
+    return tasks, finish
 
 
-def _fetch_insights_data(
+def _fetch_insights_rows(
     db: Session,
     comparison_level: str,
-    metric_info: Dict[str, Any],
-    selected_regions: List[str],
-    selected_stores: List[str],
-    selected_brands: List[str],
-    selected_products: List[str],
+    metric: str,
+    filters: Dict[str, List[str]],
     start_date: Optional[datetime],
     end_date: Optional[datetime],
-    metric: str,
-) -> Dict[str, List]:
-    """Helper function to fetch data for a specific time period."""
-    # Build and execute summary query
-    summary_query = _build_base_query(
-        db=db,
-        comparison_level=comparison_level,
-        metric_info=metric_info,
-        selected_regions=selected_regions,
-        selected_stores=selected_stores,
-        selected_brands=selected_brands,
-        selected_products=selected_products,
+    include_date: bool = False,
+    cube: Optional[CubeData] = None,
+) -> List:
+    """
+    Run the summary (or, with include_date, monthly trend) query for one period,
+    on the analytics cube when one is given.
+    """
+    query_args = dict(
+        dimensions={
+            # Group on the key so two stores sharing a name stay apart
+            "comparison_key": comparison_level,
+            "comparison_value": metrics.DIMENSION_LABELS[comparison_level],
+        },
+        filters=filters,
         start_date=start_date,
         end_date=end_date,
+        bucket="month" if include_date else None,
     )
+    if cube is not None:
+        rows = cube.aggregate({"metric_value": metric}, **query_args)
+        if include_date:
+            rows.sort(key=lambda row: _sort_key(row.comparison_value))
+        return rows
 
-    group_by_fields = _get_group_by_fields(comparison_level)
-    summary_query = summary_query.group_by(*group_by_fields)
-    summary_results = summary_query.all()
-
-    # Build and execute trend query if dates are provided
-    trend_results = []
-    if start_date and end_date:
-        trend_query = _build_base_query(
-            db=db,
-            comparison_level=comparison_level,
-            metric_info=metric_info,
-            selected_regions=selected_regions,
-            selected_stores=selected_stores,
-            selected_brands=selected_brands,
-            selected_products=selected_products,
-            start_date=start_date,
-            end_date=end_date,
-            include_date=True,
-        )
-
-        # Use the correct date field from metric_info for grouping
-        trend_group_by = _get_group_by_fields(comparison_level, include_date=True)
-        trend_group_by.append(
-            func.date_trunc("month", metric_info["date_field"])
-        )  # Use the metric's date field
-
-        trend_query = trend_query.group_by(*trend_group_by)
-        trend_query = trend_query.order_by("comparison_value")
+    query = metrics.aggregate_query(db, {"metric_value": metric}, **query_args)
+    if include_date:
+        query = query.order_by("comparison_value")
+    return query.all()
 
-        trend_results = trend_query.all()
 
-    return _format_insights_results(
-        summary_results + trend_results, metric, include_date=bool(trend_results)
-    )
+def _sort_key(value: Any) -> Tuple:
+    # Postgres sorts enums in declaration order, not by name
+    if isinstance(value, Enum):
+        return (list(type(value)).index(value), "")
+    return (0, value)
 
 
 def _add_percentage_change(current_results: Dict, prev_results: Dict):
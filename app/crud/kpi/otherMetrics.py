@@ -6,7 +6,8 @@ from collections import defaultdict
 from fastapi import Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case, distinct
-from crud.ProductCrud import get_product_by_id
+from helpers.dimension_resolver import dimension_resolver
+from crud.v2 import first_purchase
 from models.OrderModel import Order
 from models.OrderItemsModel import OrderItem
 from models.CustomersModel import Customer
@@ -144,14 +145,7 @@ def _get_metric_expression(db: Session, metric_name: str, start_date, end_date):
     if metric_name == "Total Customers":
         return func.count(distinct(Order.customer_id)).label("value")
     elif metric_name == "New Customers":
-        first_purchases = (
-            db.query(
-                Order.customer_id,
-                func.min(Order.order_date).label("first_purchase_date"),
-            )
-            .group_by(Order.customer_id)
-            .subquery()
-        )
+        first_purchases = first_purchase.first_purchases(db)
         return func.count(
             distinct(
                 case(
@@ -233,18 +227,8 @@ def fetch_segmented_customer_metric(
 
     # Handle metric-specific calculations with proper joins
     if metric_name == "New Customers":
-        # First purchases subquery with all necessary joins
-        first_purchases = (
-            db.query(
-                Order.customer_id,
-                func.min(Order.order_date).label("first_purchase_date"),
-            )
-            .join(OrderItem, OrderItem.order_id == Order.order_id)
-            .join(Product, Product.product_id == OrderItem.product_id)
-            .join(Customer, Customer.customer_id == Order.customer_id)
-            .group_by(Order.customer_id)
-            .subquery()
-        )
+        # Each customer's first purchase over the whole history
+        first_purchases = first_purchase.first_purchases(db)
 
         # Join subquery to main query and add metric calculation
         query = query.join(
@@ -316,19 +300,12 @@ def fetch_segmented_customer_metric(
         general_results = {}
         comparison_results = defaultdict(list)
 
+        label = dimension_resolver.resolver(db, comparison_level)
         for row in rows:
             segment = str(row.segment)
             value = float(row.value or 0)
 
-            # Initialize comparison_value
-            comparison_value = str(getattr(row, "comparison_value", ""))
-
-            # Special handling for product comparison level
-            if comparison_level == "product" and hasattr(row, "comparison_value"):
-                product = get_product_by_id(db, row.comparison_value)
-                comparison_value = (
-                    product.name if product else str(row.comparison_value)
-                )
+            comparison_value = label(getattr(row, "comparison_value", None))
 
             # Aggregate general results
             if segment in general_results:
@@ -521,16 +498,8 @@ def fetch_customer_metric_trend(
             ).label("value")
         )
     elif metric_name == "New Customers":
-        # First build the first_purchases subquery with proper joins
-        first_purchases = (
-            db.query(
-                Order.customer_id,
-                func.min(Order.order_date).label("first_purchase_date"),
-            )
-            .join(Customer, Customer.customer_id == Order.customer_id)  # Explicit join
-            .group_by(Order.customer_id)
-            .subquery()
-        )
+        # Each customer's first purchase over the whole history
+        first_purchases = first_purchase.first_purchases(db)
 
         # Then join this subquery properly in the main query
         query = query.join(
@@ -606,14 +575,10 @@ def fetch_customer_metric_trend(
         ]
 
     trend_data = defaultdict(lambda: defaultdict(float))
+    label = dimension_resolver.resolver(db, comparison_level)
     for row in rows:
         period = row.period.strftime("%Y-%m-%d" if interval == "day" else "%Y-%m")
-        comp_value = getattr(row, "comparison_value", None)
-        comp_value = (
-            get_product_by_id(db, comp_value).name
-            if comparison_level == "product"
-            else str(comp_value)
-        )
+        comp_value = label(getattr(row, "comparison_value", None))
         value = float(row.value or 0)
 
         if comp_value is not None:
@@ -714,492 +679,196 @@ def fetch_customer_metrics(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
 ) -> List[Dict[str, Any]]:
-    """Fetch all customer metrics with comparison capabilities."""
+    """
+    Fetch all customer metrics with comparison capabilities.
+
+    Every metric is computed for all comparison groups at once, so the number
+    of queries does not depend on the number of groups.
+    """
     if comparison_level not in VALID_COMPARISON_LEVELS:
         raise ValueError(
             f"Invalid comparison level. Must be one of: {VALID_COMPARISON_LEVELS}"
         )
 
-    # Get base data for all comparison groups
-    comparison_groups = _get_comparison_groups(
-        db=db,
-        comparison_level=comparison_level,
+    filters = dict(
         selected_regions=selected_regions,
         selected_stores=selected_stores,
         selected_brands=selected_brands,
         selected_products=selected_products,
-        start_date=start_date,
-        end_date=end_date,
     )
+    groups = _customer_stats_by_group(
+        db, comparison_level, start_date=start_date, end_date=end_date, **filters
+    )
+    new_customers = _new_customers_by_group(
+        db, comparison_level, start_date=start_date, end_date=end_date, **filters
+    )
+
+    # Groups are ordered by their label
+    label = dimension_resolver.resolver(db, comparison_level)
+    groups = sorted(groups, key=lambda group: label(group.group_key))
 
+    values = {metric_name: [] for metric_name in VALID_METRICS}
+    for group in groups:
+        customers = group.customers or 0
+        values["Total Customers"].append(customers)
+        values["New Customers"].append(
+            new_customers.get(first_purchase.scope_key(group.group_key), 0)
+        )
+        values["Average Revenue per Customer"].append(
+            (group.revenue or 0) / customers if customers > 0 else 0.0
+        )
+        values["Repeat Customer Rate"].append(
+            (group.repeat_customers / customers * 100) if customers > 0 else 0.0
+        )
+
+    names = [label(group.group_key) for group in groups]
     results = []
     for metric_name in VALID_METRICS:
-        metric_data = _calculate_metric(
-            db=db,
-            metric_name=metric_name,
-            comparison_level=comparison_level,
-            comparison_groups=comparison_groups,
-            selected_regions=selected_regions,
-            selected_stores=selected_stores,
-            selected_brands=selected_brands,
-            selected_products=selected_products,
-            start_date=start_date,
-            end_date=end_date,
+        metric_values = [Decimal(str(value)) for value in values[metric_name]]
+        results.append(
+            {
+                "metric_name": metric_name,
+                "total_value": sum(metric_values, Decimal("0.0")),
+                "comparisons": [
+                    {"name": name, "value": float(value)}
+                    for name, value in zip(names, metric_values)
+                ],
+            }
         )
-        results.append(metric_data)
 
     return results
 
 
-def _get_comparison_groups(
-    db: Session,
-    comparison_level: str,
-    selected_regions: List[str] = None,
-    selected_stores: List[str] = None,
-    selected_brands: List[str] = None,
-    selected_products: List[str] = None,
-    start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None,
-) -> List[str]:
-    """Get distinct comparison groups for the given filters."""
-    # Start with a clean query for the comparison column
-    query = db.query(distinct(_get_comparison_column(comparison_level)))
-
-    # Determine which tables we need to join
-    need_store_join = (
-        comparison_level in ["region", "store"] or selected_regions or selected_stores
-    )
-    need_order_join = start_date is not None or need_store_join
-
-    # Join tables only once and only if needed
-    if need_order_join:
-        query = query.select_from(Order)
-
-        if need_store_join:
-            query = query.join(Store, Store.store_id == Order.store_id)
-
-        # Join Product if needed for brand/product filters
-        if selected_brands or selected_products:
-            query = query.join(OrderItem, OrderItem.order_id == Order.order_id)
-            query = query.join(Product, Product.product_id == OrderItem.product_id)
-
-    # Apply filters
-    if selected_regions:
-        query = query.filter(Store.region.in_(selected_regions))
-    if selected_stores:
-        query = query.filter(Store.store_id.in_(selected_stores))
-    if selected_brands:
-        query = query.filter(Product.brand.in_(selected_brands))
-    if selected_products:
-        query = query.filter(Product.product_id.in_(selected_products))
-    if start_date and end_date:
-        query = query.filter(Order.order_date.between(start_date, end_date))
-
-    return [str(row[0]) for row in query.all()]
-
+def _comparison_key(level: str):
+    """Get the grouping key for a comparison level; stores are keyed by id."""
+    if level == "store":
+        return Store.store_id
+    return _get_comparison_column(level)
 
-def _calculate_metric(
-    db: Session,
-    metric_name: str,
-    comparison_level: str,
-    comparison_groups: List[str],
-    selected_regions: List[str] = None,
-    selected_stores: List[str] = None,
-    selected_brands: List[str] = None,
-    selected_products: List[str] = None,
-    start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None,
-) -> Dict[str, Any]:
-    """Calculate a specific metric with comparisons."""
-    comparisons = []
-    total_value = Decimal("0.0")
-
-    for group in comparison_groups:
-        print(group)
-        # Calculate metric value for each comparison group
-        if metric_name == "Total Customers":
-            value = Decimal(
-                str(
-                    _count_customers(
-                        db,
-                        comparison_level,
-                        group,
-                        selected_regions,
-                        selected_stores,
-                        selected_brands,
-                        selected_products,
-                        start_date,
-                        end_date,
-                    )
-                )
-            )
-        elif metric_name == "New Customers":
-            value = Decimal(
-                str(
-                    _count_new_customers(
-                        db,
-                        comparison_level,
-                        group,
-                        selected_regions,
-                        selected_stores,
-                        selected_brands,
-                        selected_products,
-                        start_date,
-                        end_date,
-                    )
-                )
-            )
-        elif metric_name == "Repeat Customer Rate":
-            value = Decimal(
-                str(
-                    _calculate_repeat_rate(
-                        db,
-                        comparison_level,
-                        group,
-                        selected_regions,
-                        selected_stores,
-                        selected_brands,
-                        selected_products,
-                        start_date,
-                        end_date,
-                    )
-                )
-            )
-        elif metric_name == "Average Revenue per Customer":
-            value = Decimal(
-                str(
-                    _calculate_avg_revenue(
-                        db,
-                        comparison_level,
-                        group,
-                        selected_regions,
-                        selected_stores,
-                        selected_brands,
-                        selected_products,
-                        start_date,
-                        end_date,
-                    )
-                )
-            )
-        else:
-            value = Decimal("0.0")
-        if comparison_level == "product":
-            group = get_product_by_id(db, group).name
-        comparisons.append({"name": group, "value": float(value)})
-        total_value += value
-
-    return {
-        "metric_name": metric_name,
-        "total_value": total_value,
-        "comparisons": comparisons,
-    }
 
-
-def _count_customers(
-    db: Session,
-    comparison_level: str,
-    comparison_value: str,
-    selected_regions: List[str] = None,
-    selected_stores: List[str] = None,
-    selected_brands: List[str] = None,
-    selected_products: List[str] = None,
-    start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None,
-) -> float:
-    """Count distinct customers for a specific comparison group."""
-    query = (
-        db.query(func.count(distinct(Order.customer_id)))
-        .join(Store, Store.store_id == Order.store_id)
+def _customer_orders_query(db: Session, *columns) -> Query:
+    """Query over order items joined to their order, product and store."""
+    return (
+        db.query(*columns)
+        .select_from(Order)
         .join(OrderItem, OrderItem.order_id == Order.order_id)
         .join(Product, Product.product_id == OrderItem.product_id)
+        .join(Store, Store.store_id == Order.store_id)
     )
-    query = _apply_comparison_filter(query, comparison_level, comparison_value)
-    query = _apply_query_filters(
-        query,
-        selected_regions,
-        selected_stores,
-        selected_brands,
-        selected_products,
-        start_date,
-        end_date,
-    )
-    return float(query.scalar() or 0)
 
 
-def _count_new_customers(
+def _customer_stats_by_group(
     db: Session,
     comparison_level: str,
-    comparison_value: str,
     selected_regions: List[str] = None,
     selected_stores: List[str] = None,
     selected_brands: List[str] = None,
     selected_products: List[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-) -> float:
-    """Count new customers for a specific comparison group."""
-
-    comparison_value = _handle_enum_column(
-        _get_comparison_column(comparison_level), comparison_value
-    )
-
-    # First build the base query with all needed joins
-    base_query = db.query(
-        Order.customer_id,
-        func.min(Order.order_date).label("first_purchase_date"),
-        _get_comparison_column(comparison_level).label("comp_value"),
-    ).join(Store, Store.store_id == Order.store_id)
-
-    # Apply filters to the base query before making it a subquery
-    base_query = _apply_query_filters(
-        base_query,
-        selected_regions,
-        selected_stores,
-        selected_brands,
-        selected_products,
-        start_date=None,  # We'll filter dates after grouping
-        end_date=None,
-        join_tables=False,
-    )
-
-    # Create the subquery after applying filters
-    first_purchases = (
-        base_query.group_by(Order.customer_id)
-        .group_by(_get_comparison_column((comparison_level)))
-        .subquery()
-    )
-
-    # Build the final counting query
-    query = db.query(func.count(distinct(first_purchases.c.customer_id)))
-    query = query.filter(first_purchases.c.comp_value == comparison_value)
-
-    # Apply date filter to first purchase date
-    if start_date and end_date:
-        query = query.filter(
-            first_purchases.c.first_purchase_date.between(start_date, end_date)
+) -> List[Tuple]:
+    """Customers, repeat customers and revenue of every comparison group."""
+    key = _comparison_key(comparison_level)
+
+    # One row per customer and group, with their order count and revenue
+    per_customer = (
+        _apply_query_filters(
+            _customer_orders_query(
+                db,
+                key.label("group_key"),
+                Order.customer_id,
+                func.count(distinct(Order.order_id)).label("order_count"),
+                func.sum(OrderItem.price * OrderItem.quantity).label("revenue"),
+            ),
+            selected_regions,
+            selected_stores,
+            selected_brands,
+            selected_products,
+            start_date,
+            end_date,
         )
-
-    return float(query.scalar() or 0)
-
-
-def _calculate_repeat_rate(
-    db: Session,
-    comparison_level: str,
-    comparison_value: str,
-    selected_regions: List[str] = None,
-    selected_stores: List[str] = None,
-    selected_brands: List[str] = None,
-    selected_products: List[str] = None,
-    start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None,
-) -> float:
-    """Calculate repeat customer rate for a specific comparison group."""
-
-    comparison_value = _handle_enum_column(
-        _get_comparison_column(comparison_level), comparison_value
-    )
-
-    # Build base query for all customers
-    all_customers_query = db.query(
-        Order.customer_id, _get_comparison_column(comparison_level).label("comp_value")
-    )
-
-    # Apply filters to the base query
-    all_customers_query = _apply_query_filters(
-        all_customers_query,
-        selected_regions,
-        selected_stores,
-        selected_brands,
-        selected_products,
-        start_date,
-        end_date,
-        join_tables=False,
-    )
-
-    # Create subquery after applying filters
-    all_customers = all_customers_query.group_by(
-        Order.customer_id, "comp_value"
-    ).subquery()
-
-    # Build query for repeat customers (same filters)
-    repeat_customers_query = db.query(
-        Order.customer_id, _get_comparison_column(comparison_level).label("comp_value")
-    )
-
-    repeat_customers_query = _apply_query_filters(
-        repeat_customers_query,
-        selected_regions,
-        selected_stores,
-        selected_brands,
-        selected_products,
-        start_date,
-        end_date,
-        join_tables=False,
-    )
-
-    repeat_customers = (
-        repeat_customers_query.group_by(Order.customer_id, "comp_value")
-        .having(func.count(Order.order_id) > 1)
+        .group_by(key, Order.customer_id)
         .subquery()
     )
 
-    # Count total and repeat customers
-    total_count = (
-        db.query(func.count(distinct(all_customers.c.customer_id)))
-        .filter(all_customers.c.comp_value == comparison_value)
-        .scalar()
-        or 0
-    )
-
-    repeat_count = (
-        db.query(func.count(distinct(repeat_customers.c.customer_id)))
-        .filter(repeat_customers.c.comp_value == comparison_value)
-        .scalar()
-        or 0
-    )
-
-    return (repeat_count / total_count * 100) if total_count > 0 else 0.0
-
-
-def _handle_enum_column(column, value: str):
-    """Handle enum column values by converting string to proper enum type."""
-    if hasattr(column, "type") and hasattr(column.type, "enum_class"):
-        enum_class = column.type.enum_class
-        # Strip enum class prefix if present (e.g., "RegionEnum.Region1" -> "Region1")
-        if isinstance(value, str) and "." in value:
-            value = value.split(".")[-1]
-        try:
-            return enum_class(value)
-        except ValueError:
-            raise ValueError(f"Invalid enum value: {value}")
-    return value
-
-
-def _calculate_revenue_query(
-    db: Session,
-    comparison_level: str,
-    comparison_value: str,
-    start_date: datetime,
-    end_date: datetime,
-    selected_regions: List[str] = None,
-    selected_stores: List[str] = None,
-    selected_brands: List[str] = None,
-    selected_products: List[str] = None,
-) -> Query:
-    """Build the revenue query with proper enum and GROUP BY handling."""
-    comparison_column = _get_comparison_column(comparison_level)
-    comparison_value = _handle_enum_column(comparison_column, comparison_value)
-
-    query = (
+    return (
         db.query(
-            func.sum(OrderItem.price * OrderItem.quantity).label("total_revenue"),
-            comparison_column.label("comparison_value"),
+            per_customer.c.group_key,
+            func.count(per_customer.c.customer_id).label("customers"),
+            func.count(case([(per_customer.c.order_count > 1, 1)])).label(
+                "repeat_customers"
+            ),
+            func.sum(per_customer.c.revenue).label("revenue"),
         )
-        .join(Order, OrderItem.order_id == Order.order_id)
-        .join(Store, Store.store_id == Order.store_id)
-        .join(Product, Product.product_id == OrderItem.product_id)
-        .filter(Order.order_date.between(start_date, end_date))
-        .filter(comparison_column == comparison_value)
-        .group_by(comparison_column)  # Required for SQL compliance
+        .group_by(per_customer.c.group_key)
+        .all()
     )
 
-    # Apply additional filters
-    return _apply_query_filters(
-        query,
-        selected_regions,
-        selected_stores,
-        selected_brands,
-        selected_products,
-        start_date,
-        end_date,
-    )
 
-
-def _calculate_avg_revenue(
+def _new_customers_by_group(
     db: Session,
     comparison_level: str,
-    comparison_value: str,
     selected_regions: List[str] = None,
     selected_stores: List[str] = None,
     selected_brands: List[str] = None,
     selected_products: List[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-) -> float:
-    """Calculate average revenue per customer with optimized queries."""
-    # Get properly formatted comparison value
-    comparison_column = _get_comparison_column(comparison_level)
-    comparison_value = _handle_enum_column(comparison_column, comparison_value)
-
-    # Build and execute revenue query
-    revenue_query = _calculate_revenue_query(
-        db=db,
-        comparison_level=comparison_level,
-        comparison_value=comparison_value,
-        start_date=start_date,
-        end_date=end_date,
-        selected_regions=selected_regions,
-        selected_stores=selected_stores,
-        selected_brands=selected_brands,
-        selected_products=selected_products,
-    )
-    revenue_query = revenue_query
-    total_revenue = revenue_query.scalar() or 0
+) -> Dict[str, int]:
+    """
+    Customers whose first purchase in each group falls in the date range,
+    keyed by first_purchase.scope_key of the group.
+    """
+    selections = {
+        "region": selected_regions,
+        "store": selected_stores,
+        "brand": selected_brands,
+        "product": selected_products,
+    }
+    other_selections = [
+        values for level, values in selections.items() if level != comparison_level
+    ]
 
-    # Build and execute customer count query
-    customer_query = (
-        db.query(
-            func.count(distinct(Order.customer_id)).label("customer_count"),
-            comparison_column,
+    # The table holds first purchases per single dimension, so it only answers
+    # when nothing outside the comparison dimension is filtered on.
+    if first_purchase.first_purchase_available(db) and not any(other_selections):
+        first_purchases = first_purchase.first_purchases(db, comparison_level)
+        selected = selections[comparison_level]
+        if selected:
+            selected_keys = [first_purchase.scope_key(value) for value in selected]
+            first_purchases = (
+                db.query(first_purchases)
+                .filter(first_purchases.c.scope_key.in_(selected_keys))
+                .subquery()
+            )
+    else:
+        key = _comparison_key(comparison_level)
+        first_purchases = (
+            _apply_query_filters(
+                _customer_orders_query(
+                    db,
+                    key.label("scope_key"),
+                    Order.customer_id,
+                    func.min(Order.order_date).label("first_purchase_date"),
+                ),
+                selected_regions,
+                selected_stores,
+                selected_brands,
+                selected_products,
+            )
+            .group_by(key, Order.customer_id)
+            .subquery()
         )
-        .filter(Order.order_date.between(start_date, end_date))
-        .join(OrderItem, OrderItem.order_id == Order.order_id)
-        .join(Store, Store.store_id == Order.store_id)
-        .join(Product, Product.product_id == OrderItem.product_id)
-        .filter(comparison_column == comparison_value)
-        .group_by(comparison_column)
-    )
-
-    # Apply same filters to customer query
-    customer_query = _apply_query_filters(
-        customer_query,
-        selected_regions,
-        selected_stores,
-        selected_brands,
-        selected_products,
-        start_date,
-        end_date,
-    )
-    customer_count = customer_query.scalar() or 0
-
-    return (total_revenue / customer_count) if customer_count > 0 else 0.0
 
+    query = db.query(
+        first_purchases.c.scope_key, func.count(first_purchases.c.customer_id)
+    ).group_by(first_purchases.c.scope_key)
+    if start_date and end_date:
+        query = query.filter(
+            first_purchases.c.first_purchase_date.between(start_date, end_date)
+        )
 
-def _apply_comparison_filter(
-    query: Query, comparison_level: str, comparison_value: str
-) -> Query:
-    """Apply filter for a specific comparison value."""
-    if not comparison_level:
-        return query
-
-    comparison_column = _get_comparison_column(comparison_level)
-
-    # Handle enum columns generically
-    if hasattr(comparison_column, "type") and hasattr(
-        comparison_column.type, "enum_class"
-    ):
-        enum_class = comparison_column.type.enum_class
-        # Strip enum class prefix if present (e.g., "RegionEnum.Region1" -> "Region1")
-        if "." in comparison_value:
-            comparison_value = comparison_value.split(".")[-1]
-        try:
-            enum_value = enum_class(comparison_value)
-            return query.filter(comparison_column == enum_value)
-        except ValueError:
-            raise ValueError(f"Invalid {comparison_level} value: {comparison_value}")
-
-    # Default case for non-enum comparisons
-    return query.filter(comparison_column == comparison_value)
+    return {first_purchase.scope_key(key): count for key, count in query.all()}
 
 
 def _apply_query_filters(
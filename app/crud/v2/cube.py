@@ -0,0 +1,722 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+from fastapi.logger import logger
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from models.DailySalesRollupModel import DailySalesRollup
+from models.ProductModel import Product
+from models.StoreModel import Store
+from crud.v2 import metrics, rollup
+from crud.v2.first_purchase import scope_key
+from helpers.dimension_resolver import dimension_resolver
+from helpers.response_cache import response_cache
+from db.replicas import read_router
+from db.session import use_role
+from db.instrumentation import off_budget
+
+ANALYTICS_CUBE_ENABLED = os.getenv("ANALYTICS_CUBE_ENABLED", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Refuse to build a cube with more day x store x product cells than this.
+ANALYTICS_CUBE_MAX_CELLS = int(os.getenv("ANALYTICS_CUBE_MAX_CELLS", "50000000"))
+
+# Rollup measures held in memory. Money is kept as integer cents so sums stay
+# exact; order_count only adds up across stores and is kept at day x store.
+CUBE_MEASURES = [
+    "sales",
+    "profit",
+    "order_count",
+    "product_order_count",
+    "item_count",
+    "return_count",
+]
+MONEY_MEASURES = {"sales", "profit"}
+STORE_GRAIN_MEASURES = {"order_count"}
+
+# Member attributes loaded with the facts; entity_table can attach them.
+STORE_ATTRIBUTES = [
+    Store.store_id,
+    Store.name,
+    Store.region,
+    Store.is_active,
+    Store.manager_name,
+]
+PRODUCT_ATTRIBUTES = [
+    Product.product_id,
+    Product.name,
+    Product.brand,
+    Product.category,
+    Product.price,
+    Product.cost,
+    Product.stock_quantity,
+]
+
+# Axis of the cube each dimension groups along
+DIMENSION_AXES = {
+    "region": "store",
+    "store": "store",
+    "brand": "product",
+    "product": "product",
+}
+
+BUCKET_UNITS = ["day", "week", "month", "quarter"]
+
+# Session.info key of a cube that `serving` hands out for that session only,
+# e.g. the rollup slice a dashboard batch loaded for its widgets.
+PINNED_CUBE = "analytics_cube"
+
+
+def _as_date(value: Union[date, datetime]) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def truncate(day: date, unit: str) -> date:
+    """First day of the `unit` bucket holding `day`, as date_trunc() computes it."""
+    if unit == "day":
+        return day
+    if unit == "week":
+        return day - timedelta(days=day.weekday())
+    if unit == "month":
+        return day.replace(day=1)
+    if unit == "quarter":
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    raise ValueError(f"Invalid bucket. Must be one of: {BUCKET_UNITS}")
+
+
+def bucket_series(
+    start_date: Union[date, datetime], end_date: Union[date, datetime], unit: str
+) -> List[datetime]:
+    """Bucket starts from start_date to end_date, as generate_series() yields them."""
+    current, last = truncate(_as_date(start_date), unit), truncate(
+        _as_date(end_date), unit
+    )
+    buckets = []
+    while current <= last:
+        buckets.append(datetime(current.year, current.month, current.day))
+        if unit == "day":
+            current += timedelta(days=1)
+        elif unit == "week":
+            current += timedelta(days=7)
+        else:
+            current = _add_months(current, 1 if unit == "month" else 3)
+    return buckets
+
+
+def _compact(values: np.ndarray) -> np.ndarray:
+    """`values` in the smallest integer dtype that holds all of them."""
+    low, high = (int(values.min()), int(values.max())) if values.size else (0, 0)
+    unsigned = [np.uint8, np.uint16, np.uint32] if low >= 0 else []
+    for dtype in [*unsigned, np.int8, np.int16, np.int32]:
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values
+
+
+def _group_axis(
+    values: np.ndarray, axis: int, codes: Optional[np.ndarray], groups: int
+) -> np.ndarray:
+    """Sum `values` along `axis` into `groups` by member code; code -1 drops a member."""
+    if codes is None:
+        return values.sum(axis=axis, keepdims=True, dtype=np.float64)
+    if groups == len(codes) and (codes == np.arange(len(codes))).all():
+        return values.astype(np.float64, copy=False)
+    kept = np.nonzero(codes >= 0)[0]
+    onehot = np.zeros((len(codes), groups))
+    onehot[kept, codes[kept]] = 1
+    grouped = np.tensordot(values.astype(np.float64, copy=False), onehot, ([axis], [0]))
+    return np.moveaxis(grouped, -1, axis)
+
+
+class CubeData:
+    """
+    One immutable load of the cube: rollup measures as dense day x store x
+    product arrays plus the store and product members they are indexed by.
+    The last product column holds rollup rows without a product.
+
+    Measures are stored as running totals along the day axis, so a date range
+    costs one subtraction of two store x product slices however long it is,
+    and a trend one subtraction per bucket.
+    """
+
+    def __init__(
+        self,
+        stores: List[Any],
+        products: List[Any],
+        facts: List[Any],
+        version: Optional[int] = None,
+        generation: int = 0,
+        max_cells: int = ANALYTICS_CUBE_MAX_CELLS,
+    ):
+        self.version = version
+        self.generation = generation
+        self.members = {
+            "store": {row.store_id: row for row in stores},
+            "product": {row.product_id: row for row in products},
+        }
+        self.stores, self.products = list(stores), list(products)
+
+        days = [row.day for row in facts]
+        self.first_day = min(days) if days else None
+        self.n_days = (max(days) - self.first_day).days + 1 if days else 0
+        self.shape = (self.n_days, len(self.stores), len(self.products) + 1)
+        if int(np.prod(self.shape, dtype=np.int64)) > max_cells:
+            raise ValueError(
+                f"Cube of {self.shape} cells exceeds ANALYTICS_CUBE_MAX_CELLS={max_cells}"
+            )
+
+        store_index = {row.store_id: i for i, row in enumerate(self.stores)}
+        product_index = {row.product_id: i for i, row in enumerate(self.products)}
+        no_product = len(self.products)
+        first = self.first_day.toordinal() if days else 0
+        day_at = np.array([day.toordinal() - first for day in days], dtype=np.int64)
+        store_at = np.array(
+            [store_index.get(row.store_id, -1) for row in facts], dtype=np.int64
+        )
+        product_at = np.array(
+            [product_index.get(row.product_id, no_product) for row in facts],
+            dtype=np.int64,
+        )
+        # Facts of stores that no longer exist drop out, as the Store join does
+        known = store_at >= 0
+        day_at, store_at, product_at = day_at[known], store_at[known], product_at[known]
+
+        self.measures, self.by_store, self.by_product = {}, {}, {}
+        for name in CUBE_MEASURES:
+            column = np.array([getattr(row, name) for row in facts], dtype=np.float64)
+            if name in MONEY_MEASURES:
+                column = np.round(column * 100)
+            column = column[known].astype(np.int64)
+            # Running totals over days with a leading zero day: the sum over
+            # days [first, last] is cumulative[last + 1] - cumulative[first].
+            if name in STORE_GRAIN_MEASURES:
+                dense = np.zeros((self.n_days + 1, *self.shape[1:2]), dtype=np.int64)
+                np.add.at(dense, (day_at + 1, store_at), column)
+            else:
+                dense = np.zeros((self.n_days + 1, *self.shape[1:]), dtype=np.int64)
+                np.add.at(dense, (day_at + 1, store_at, product_at), column)
+            self.measures[name] = _compact(np.cumsum(dense, axis=0, out=dense))
+            if name not in STORE_GRAIN_MEASURES:
+                # Per-store and per-product totals, for queries that sum out
+                # the other axis
+                self.by_store[name] = _compact(dense.sum(axis=2))[:, :, np.newaxis]
+                self.by_product[name] = _compact(dense.sum(axis=1))[:, np.newaxis, :]
+
+        # First day of each day's bucket, by unit, as ordinals
+        calendar = [date.fromordinal(first + offset) for offset in range(self.n_days)]
+        self.bucket_starts = {
+            unit: np.array(
+                [truncate(day, unit).toordinal() for day in calendar], dtype=np.int64
+            )
+            for unit in BUCKET_UNITS
+        }
+
+        # (dimension, "key" | "label") -> (axis, group code per member, group values)
+        self.groupings = {}
+        self.member_keys = {}
+        for dimension, axis in DIMENSION_AXES.items():
+            rows = self.stores if axis == "store" else self.products
+            key_field = {"region": "region", "brand": "brand"}.get(
+                dimension, f"{dimension}_id"
+            )
+            keys = [getattr(row, key_field) for row in rows]
+            labels = [
+                row.name if dimension in ("store", "product") else key
+                for row, key in zip(rows, keys)
+            ]
+            for kind, values in (("key", keys), ("label", labels)):
+                self.groupings[(dimension, kind)] = (axis, *self._codes(values, axis))
+            member_keys = [scope_key(key) for key in keys]
+            if axis == "product":
+                member_keys.append(None)
+            self.member_keys[dimension] = np.array(member_keys, dtype=object)
+
+    @staticmethod
+    def _codes(values: List[Any], axis: str) -> Tuple[np.ndarray, List[Any]]:
+        distinct = {}
+        codes = [distinct.setdefault(value, len(distinct)) for value in values]
+        if axis == "product":
+            codes.append(-1)
+        return np.array(codes, dtype=np.int64), list(distinct)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.measures, self.by_store, self.by_product]
+        return sum(values.nbytes for measures in arrays for values in measures.values())
+
+    @property
+    def last_day(self) -> Optional[date]:
+        if not self.n_days:
+            return None
+        return self.first_day + timedelta(days=self.n_days - 1)
+
+    # -- Reductions --#
+
+    def _day_range(
+        self, start_date: Optional[datetime], end_date: Optional[datetime]
+    ) -> Tuple[int, int]:
+        # Like the SQL paths, the range only applies when both ends are given
+        if not self.n_days or start_date is None or end_date is None:
+            return 0, self.n_days - 1
+        first = (_as_date(start_date) - self.first_day).days
+        if (
+            isinstance(start_date, datetime)
+            and start_date.time() != datetime.min.time()
+        ):
+            # BETWEEN compares the day's midnight, which is before the start
+            first += 1
+        last = (_as_date(end_date) - self.first_day).days
+        return max(first, 0), min(last, self.n_days - 1)
+
+    def _axis_groups(
+        self,
+        axis: str,
+        specs: Dict[str, Tuple[str, str]],
+        filters: Dict[str, Iterable[Any]],
+    ):
+        """Group code of every member of `axis` (-1 drops it) and the groups' value indices."""
+        size = self.shape[1] if axis == "store" else self.shape[2]
+        keep = np.ones(size, dtype=bool)
+        for dimension, keys in filters.items():
+            if DIMENSION_AXES[dimension] == axis:
+                wanted = {scope_key(key) for key in keys}
+                keep &= np.array(
+                    [key in wanted for key in self.member_keys[dimension]], dtype=bool
+                )
+
+        labels = [
+            label for label, spec in specs.items() if DIMENSION_AXES[spec[0]] == axis
+        ]
+        if not labels:
+            codes = None if keep.all() else np.where(keep, 0, -1)
+            return codes, np.zeros((1, 0), dtype=np.int64), labels
+        stacked = np.stack(
+            [self.groupings[specs[label]][1] for label in labels], axis=1
+        )
+        keep &= (stacked >= 0).all(axis=1)
+        groups, inverse = np.unique(stacked[keep], axis=0, return_inverse=True)
+        codes = np.full(size, -1, dtype=np.int64)
+        codes[keep] = inverse.ravel()
+        return codes, groups, labels
+
+    def _sum(self, measure, edges, store, product):
+        cumulative = self.measures[measure]
+        if measure in STORE_GRAIN_MEASURES:
+            cumulative = cumulative[:, :, np.newaxis]
+        elif product[0] is None:
+            cumulative = self.by_store[measure]
+        elif store[0] is None:
+            cumulative = self.by_product[measure]
+        # Totals of the day spans between consecutive edges
+        cumulative = cumulative[edges].astype(np.int64)
+        values = cumulative[1:] - cumulative[:-1]
+        values = _group_axis(values, 1, store[0], len(store[1]))
+        return _group_axis(values, 2, product[0], len(product[1]))
+
+    def _cells(
+        self,
+        measures: Iterable[str],
+        specs: Dict[str, Tuple[str, str]],
+        filters: Dict[str, Iterable[Any]],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        bucket: Optional[str],
+        present: Iterable[str],
+    ):
+        """
+        Sum `measures` over the date range, grouped by `specs` (and `bucket`),
+        keeping the groups where the `present` measures add up to more than 0.
+
+        Returns, per kept group, the index into each label's group values, the
+        group values themselves and the measure totals.
+        """
+        measures, present = list(measures), list(present)
+        first, last = self._day_range(start_date, end_date)
+        if first > last:
+            first, last = 0, -1
+
+        buckets = [None]
+        edges = [first, last + 1]
+        if bucket is not None:
+            if bucket not in BUCKET_UNITS:
+                raise ValueError(f"Invalid bucket. Must be one of: {BUCKET_UNITS}")
+            starts = self.bucket_starts[bucket][first : last + 1]
+            offsets = [0, *(np.nonzero(np.diff(starts))[0] + 1).tolist()]
+            offsets = offsets if len(starts) else []
+            buckets = [datetime.fromordinal(int(starts[offset])) for offset in offsets]
+            edges = [first + offset for offset in offsets] + [last + 1]
+        store = self._axis_groups("store", specs, filters)
+        product = self._axis_groups("product", specs, filters)
+
+        totals = {
+            name: self._sum(name, edges, store, product)
+            for name in set(measures) | set(present)
+        }
+        kept = sum(totals[name] for name in present) > 0
+        day_cell, store_cell, product_cell = np.nonzero(kept)
+
+        index = {}
+        for cells, (_, groups, labels) in (
+            (store_cell, store),
+            (product_cell, product),
+        ):
+            for position, label in enumerate(labels):
+                index[label] = groups[cells, position]
+        values = {label: self.groupings[spec][2] for label, spec in specs.items()}
+        if bucket is not None:
+            index["bucket"], values["bucket"] = day_cell, buckets
+        return index, values, {name: totals[name][kept] for name in measures}
+
+    @staticmethod
+    def _spec(dimension: Union[str, Any]) -> Tuple[str, str]:
+        if isinstance(dimension, str):
+            if dimension not in metrics.DIMENSION_LABELS:
+                raise ValueError(
+                    f"Invalid dimension. Must be one of: {metrics.DIMENSIONS}"
+                )
+            return dimension, "key"
+        for name, column in metrics.DIMENSION_LABELS.items():
+            if column is dimension:
+                return name, "label"
+        raise ValueError(f"The analytics cube cannot group by {dimension}")
+
+    @staticmethod
+    def _values(measure: str, totals: np.ndarray) -> List[Union[Decimal, int]]:
+        """Python values of measure totals: Decimal for money (as SQL gives), else int."""
+        totals = np.rint(totals).astype(np.int64).tolist()
+        if measure in MONEY_MEASURES:
+            return [Decimal(total).scaleb(-2) for total in totals]
+        return totals
+
+    @staticmethod
+    def _measure(
+        metric: str, group_by: Iterable[str], filter_by: Iterable[str] = ()
+    ) -> str:
+        measure = metrics._rollup_measure_for(metric, group_by, filter_by)
+        if measure is None:
+            raise ValueError(f"{metric} cannot be answered from the analytics cube")
+        return measure
+
+    # -- Queries --#
+
+    def aggregate(
+        self,
+        metric_labels: Dict[str, str],
+        dimensions: Optional[Dict[str, Union[str, Any]]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        bucket: Optional[str] = None,
+    ) -> List[Any]:
+        """
+        In-memory metrics.aggregate_query(...).all(): one row per group that
+        has rollup facts in the range, with the dimension labels, "bucket"
+        (when bucketed) and the metric labels as attributes.
+        """
+        dimensions = dimensions or {}
+        filters = metrics._active_filters(filters)
+        specs = {
+            label: self._spec(dimension) for label, dimension in dimensions.items()
+        }
+        group_by = [spec[0] for spec in specs.values()]
+        measures = {
+            label: self._measure(metric, group_by, filters)
+            for label, metric in metric_labels.items()
+        }
+
+        index, values, totals = self._cells(
+            measures.values(),
+            specs,
+            filters,
+            start_date,
+            end_date,
+            bucket,
+            present=["item_count", "return_count"],
+        )
+        row_type = namedtuple(
+            "CubeRow", [*dimensions, *(["bucket"] if bucket else []), *metric_labels]
+        )
+        columns = [
+            [values[label][position] for position in index[label]]
+            for label in [*dimensions, *(["bucket"] if bucket else [])]
+        ]
+        columns += [
+            self._values(measure, totals[measure]) for measure in measures.values()
+        ]
+        return [row_type(*row) for row in zip(*columns)]
+
+    def entity_table(
+        self,
+        metric_labels: Dict[str, str],
+        entity: Dict[str, str],
+        tops: Dict[str, str],
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        rank_by: str = "total_sales",
+        sort_by: Optional[str] = None,
+        descending: bool = True,
+        limit: Optional[int] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ) -> List[Any]:
+        """
+        In-memory metrics.entity_table(...).all(). `attributes` maps extra
+        output labels to columns of the (single) entity's model, e.g.
+        {"store_name": Store.name}, filled in from the loaded members.
+        """
+        for label in (rank_by, sort_by):
+            if label is not None and label not in metric_labels:
+                raise ValueError(
+                    f"Invalid sort metric. Must be one of: {list(metric_labels)}"
+                )
+        attributes = attributes or {}
+        specs = {label: self._spec(dimension) for label, dimension in entity.items()}
+        entity_dims = list(entity.values())
+        measures = {
+            label: self._measure(metric, entity_dims)
+            for label, metric in metric_labels.items()
+        }
+
+        index, values, totals = self._cells(
+            measures.values(), specs, {}, start_date, end_date, None, ["item_count"]
+        )
+        # Sort and cut first; only the rows kept are built
+        order = np.arange(len(totals[measures[rank_by]]))
+        if sort_by is not None:
+            sort_totals = totals[measures[sort_by]]
+            order = np.argsort(
+                -sort_totals if descending else sort_totals, kind="stable"
+            )
+        if limit is not None:
+            order = order[:limit]
+
+        columns = {
+            label: [values[label][position] for position in index[label][order]]
+            for label in entity
+        }
+        # One integer per entity, shared with the (entity, top) cells below
+        sizes = [len(values[label]) for label in entity]
+        entity_ids = np.ravel_multi_index(
+            [index[label][order] for label in entity], sizes
+        )
+        for label, dimension in tops.items():
+            top_index, top_values, top_totals = self._cells(
+                [measures[rank_by]],
+                {**specs, label: self._spec(dimension)},
+                {},
+                start_date,
+                end_date,
+                None,
+                ["item_count"],
+            )
+            owners = np.ravel_multi_index([top_index[name] for name in entity], sizes)
+            ranking = np.lexsort((-top_totals[measures[rank_by]], owners))
+            owners, best = np.unique(owners[ranking], return_index=True)
+            best_top = dict(
+                zip(owners.tolist(), top_index[label][ranking][best].tolist())
+            )
+            columns[label] = [
+                top_values[label][best_top[owner]] if owner in best_top else None
+                for owner in entity_ids.tolist()
+            ]
+        for label, measure in measures.items():
+            columns[label] = self._values(measure, totals[measure][order])
+        if attributes:
+            ((entity_label, dimension),) = entity.items()
+            members = self.members[dimension]
+            for label, column in attributes.items():
+                columns[label] = [
+                    getattr(members[key], column.key) for key in columns[entity_label]
+                ]
+        grand_total = self._values(
+            measures[rank_by], totals[measures[rank_by]].sum(keepdims=True)
+        )[0]
+
+        row_type = namedtuple("CubeRow", [*columns, "grand_total"])
+        return [row_type(*row, grand_total) for row in zip(*columns.values())]
+
+
+def load_cube(
+    db: Session,
+    first_day: Optional[date] = None,
+    last_day: Optional[date] = None,
+    version: Optional[int] = None,
+    generation: int = 0,
+    max_cells: int = ANALYTICS_CUBE_MAX_CELLS,
+) -> CubeData:
+    """Build a cube from the rollup, optionally only the days first_day..last_day."""
+    stores = db.query(*STORE_ATTRIBUTES).all()
+    products = db.query(*PRODUCT_ATTRIBUTES).all()
+    facts = db.query(
+        DailySalesRollup.day,
+        DailySalesRollup.store_id,
+        DailySalesRollup.product_id,
+        *(rollup.ROLLUP_MEASURES[name]["column"] for name in CUBE_MEASURES),
+    )
+    if first_day is not None and last_day is not None:
+        facts = facts.filter(DailySalesRollup.day.between(first_day, last_day))
+    return CubeData(stores, products, facts.all(), version, generation, max_cells)
+
+
+class AnalyticsCube:
+    """
+    Optional in-memory copy of the daily rollup that answers dashboard queries
+    with NumPy reductions instead of SQL.
+
+    Loaded at startup (see main.py) and reloaded in the background on first
+    use after the data_version watermark moves or a store/product is written;
+    until the reload finishes, requests are answered from SQL. Requests the
+    rollup cannot answer exactly (e.g. distinct orders per brand) get None
+    from `serving` and go to the database as before.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = ANALYTICS_CUBE_ENABLED,
+        max_cells: int = ANALYTICS_CUBE_MAX_CELLS,
+    ):
+        self.enabled = enabled
+        self.max_cells = max_cells
+        self._data: Optional[CubeData] = None
+        self._failed: Optional[Tuple[Optional[int], int]] = None
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="analytics-cube"
+        )
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.last_error: Optional[str] = None
+
+    def serving(
+        self,
+        db: Session,
+        metric_names: Iterable[str],
+        group_by: Iterable[str] = (),
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Optional[CubeData]:
+        """The current cube if it answers every metric at this grain exactly, else None."""
+        pinned = db.info.get(PINNED_CUBE)
+        if pinned is None and not self.enabled:
+            return None
+        group_by = list(group_by)
+        filters = metrics._active_filters(filters)
+        # Subquery filters only exist in SQL
+        if any(not isinstance(keys, (list, tuple, set)) for keys in filters.values()):
+            return None
+        for metric in metric_names:
+            if metric not in metrics.METRICS or not metrics._rollup_measure_for(
+                metric, group_by, filters
+            ):
+                return None
+        return pinned if pinned is not None else self.current(db)
+
+    def current(self, db: Session) -> Optional[CubeData]:
+        """
+        The loaded cube if it matches the current watermark. Otherwise None,
+        so the caller queries the database, and a reload is started in the
+        background: async routes get here through run_sync on the event loop
+        thread, which must never wait for a load.
+        """
+        if not self.enabled or not rollup.rollup_available(db):
+            return None
+        version = response_cache.data_version(db)
+        if version is None:
+            # Without a watermark the cube could never notice new data
+            return None
+        stamp = (version, dimension_resolver.generation)
+        data = self._data
+        if data is not None and (data.version, data.generation) == stamp:
+            return data
+
+        # The lock only guards these flags and is never held across a load
+        with self._lock:
+            if self._reloading or self._failed == stamp:
+                return None
+            self._reloading = True
+        self._executor.submit(self._reload)
+        return None
+
+    def _reload(self):
+        db = use_role(read_router.open_session(), "background")
+        try:
+            self._load_current(db)
+        finally:
+            db.close()
+            with self._lock:
+                self._reloading = False
+
+    def _load_current(self, db: Session) -> Optional[CubeData]:
+        version = response_cache.data_version(db)
+        if version is None:
+            return None
+        # Read before loading: a write during the load leaves the new cube
+        # stale, and the next request starts another reload.
+        stamp = (version, dimension_resolver.generation)
+        started = time.perf_counter()
+        try:
+            with off_budget():
+                data = self._load(db, *stamp)
+        except (SQLAlchemyError, ValueError, MemoryError) as error:
+            if isinstance(error, SQLAlchemyError):
+                db.rollback()
+            logger.warning("Analytics cube not loaded: %s", error)
+            with self._lock:
+                self._failed, self.last_error = stamp, str(error)
+            return None
+        with self._lock:
+            self._data, self._failed, self.last_error = data, None, None
+            self.loads += 1
+            self.load_seconds = time.perf_counter() - started
+        return data
+
+    def _load(self, db: Session, version: Optional[int], generation: int) -> CubeData:
+        return load_cube(
+            db, version=version, generation=generation, max_cells=self.max_cells
+        )
+
+    def warm(self):
+        """Load the cube on a session of its own; used at application startup."""
+        if not self.enabled:
+            return
+        db = use_role(read_router.open_session(), "background")
+        try:
+            if rollup.rollup_available(db):
+                self._load_current(db)
+        finally:
+            db.close()
+
+    def clear(self):
+        with self._lock:
+            self._data = self._failed = None
+
+    def stats(self) -> Dict[str, Any]:
+        data = self._data
+        return {
+            "enabled": self.enabled,
+            "loaded": data is not None,
+            "reloading": self._reloading,
+            "data_version": data.version if data else None,
+            "first_day": data.first_day if data else None,
+            "last_day": data.last_day if data else None,
+            "shape": list(data.shape) if data else None,
+            "bytes": data.nbytes if data else 0,
+            "loads": self.loads,
+            "load_seconds": self.load_seconds,
+            "last_error": self.last_error,
+        }
+
+
+analytics_cube = AnalyticsCube()
@@ -0,0 +1,176 @@
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from crud.v2 import rollup
+from crud.v2.cube import PINNED_CUBE, CubeData, analytics_cube, load_cube
+from crud.v2.kpi import KPICrud
+from crud.v2.stores import StoreCrud
+from crud.v2.product import ProductCrud
+from crud.kpi import insights
+from db.fanout import SINGLE_SNAPSHOT
+from helpers.parse_date import parse_date_safe
+from helpers.response_cache import make_key
+from schemas.DashboardSchema import DashboardBatchRequest, DashboardWidget
+
+# Widest window, previous periods included, that a batch reads from the
+# rollup into memory for its widgets to share; wider batches query per widget.
+DASHBOARD_BATCH_MAX_DAYS = int(os.getenv("DASHBOARD_BATCH_MAX_DAYS", "400"))
+
+kpi_crud = KPICrud()
+
+Dates = Tuple[Optional[datetime], Optional[datetime]]
+
+
+def _kpi(db: Session, widget: DashboardWidget, start: datetime, end: datetime):
+    return kpi_crud.get_all_kpi(db, start, end, widget.granularity)
+
+
+def _insight(db: Session, widget: DashboardWidget, start: datetime, end: datetime):
+    return insights.fetch_insights(
+        db,
+        comparison_level=widget.comparison_level.lower(),
+        metric=widget.metric,
+        selected_regions=widget.selected_regions,
+        selected_stores=widget.selected_stores,
+        selected_brands=widget.selected_brands,
+        selected_products=widget.selected_products,
+        start_date=start,
+        end_date=end,
+    )
+
+
+def _top_stores(db: Session, widget: DashboardWidget, start, end):
+    return StoreCrud.get_top_stores_by_metric(db, widget.metric, start, end, widget.n)
+
+
+def _top_products(db: Session, widget: DashboardWidget, start, end):
+    return ProductCrud.get_top_products_by_metric(
+        db, widget.metric, start, end, widget.n
+    )
+
+
+def _store_table(db: Session, widget: DashboardWidget, start, end):
+    if widget.group_by == "region":
+        return StoreCrud.get_region_table_data(db, start, end)
+    return StoreCrud.get_store_table_data(db, start, end)
+
+
+def _product_table(db: Session, widget: DashboardWidget, start, end):
+    fetch = (
+        ProductCrud.get_brand_table_data
+        if widget.group_by == "brand"
+        else ProductCrud.get_product_table_data
+    )
+    return fetch(db, start, end, widget.metric, widget.limit, widget.sort)
+
+
+WIDGETS: Dict[str, Callable[..., Any]] = {
+    "kpi": _kpi,
+    "insight": _insight,
+    "top_stores": _top_stores,
+    "top_products": _top_products,
+    "store_table": _store_table,
+    "product_table": _product_table,
+}
+
+
+def _widget_dates(widget: DashboardWidget, request: DashboardBatchRequest) -> Dates:
+    """The widget's range, parsed the way its own endpoint parses it."""
+    try:
+        start = parse_date_safe(widget.start_date or request.start_date)
+        end = parse_date_safe(widget.end_date or request.end_date)
+    except HTTPException as error:
+        raise ValueError(f"Widget {widget.id}: {error.detail}")
+    if widget.type in ("kpi", "insight"):
+        if start is None:
+            raise ValueError(f"Widget {widget.id} needs a start_date")
+        start = start.replace(tzinfo=timezone.utc)
+        end = end.replace(tzinfo=timezone.utc) if end else datetime.now(timezone.utc)
+        if end < start:
+            raise ValueError(f"Widget {widget.id}: end date is before start date")
+    return start, end
+
+
+def _window(ranges: Iterable[Dates]) -> Optional[Tuple[date, date]]:
+    """Days the widgets read, comparison periods included; None if unbounded."""
+    first = last = None
+    for start, end in ranges:
+        if start is None or end is None:
+            return None
+        span = end.date() - start.date()
+        previous_start = start.date() - span - timedelta(days=1)
+        first = previous_start if first is None else min(first, previous_start)
+        last = end.date() if last is None else max(last, end.date())
+    return (first, last) if first is not None else None
+
+
+def _shared_cube(db: Session, ranges: List[Dates]) -> Optional[CubeData]:
+    """
+    The facts every widget reduces from: the process-wide cube when it is
+    loaded, else the rollup rows of the batch's window, read in one scan.
+    """
+    cube = analytics_cube.current(db)
+    if cube is not None or not rollup.rollup_available(db):
+        return cube
+    window = _window(ranges)
+    if window is None or (window[1] - window[0]).days + 1 > DASHBOARD_BATCH_MAX_DAYS:
+        return None
+    try:
+        return load_cube(db, *window)
+    except ValueError:
+        return None
+
+
+def run_batch(db: Session, request: DashboardBatchRequest) -> Dict[str, Any]:
+    """
+    Evaluate every widget of a dashboard inside one REPEATABLE READ
+    transaction, so they all see the same data.
+
+    Widgets the rollup can answer are reduced in memory from one shared read
+    of the facts (see _shared_cube); the rest query the database on the same
+    transaction, one statement at a time. Identical widgets run once.
+    """
+    # A widget with bad dates only fails itself; its error is its result
+    dated: List[Tuple[DashboardWidget, Any]] = []
+    for widget in request.widgets:
+        try:
+            dated.append((widget, _widget_dates(widget, request)))
+        except ValueError as error:
+            dated.append((widget, error))
+    ranges = [dates for _, dates in dated if not isinstance(dates, ValueError)]
+
+    # Start a fresh transaction so the isolation level covers every statement
+    db.rollback()
+    db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    db.info[SINGLE_SNAPSHOT] = True
+    try:
+        shared = _shared_cube(db, ranges)
+        if shared is not None:
+            db.info[PINNED_CUBE] = shared
+
+        answers: Dict[Tuple, Dict[str, Any]] = {}
+        results = []
+        for widget, dates in dated:
+            if isinstance(dates, ValueError):
+                results.append(
+                    {"id": widget.id, "type": widget.type, "error": str(dates)}
+                )
+                continue
+            start, end = dates
+            params = widget.model_dump(exclude={"id", "start_date", "end_date"})
+            key = make_key(widget.type, {**params, "start": start, "end": end})
+            if key not in answers:
+                try:
+                    answers[key] = {
+                        "data": WIDGETS[widget.type](db, widget, start, end)
+                    }
+                except ValueError as error:
+                    answers[key] = {"error": str(error)}
+            results.append({"id": widget.id, "type": widget.type, **answers[key]})
+        return {"widgets": results, "shared_scan": shared is not None}
+    finally:
+        db.info.pop(SINGLE_SNAPSHOT, None)
+        db.info.pop(PINNED_CUBE, None)
+        db.rollback()
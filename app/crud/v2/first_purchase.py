@@ -0,0 +1,122 @@
+import os
+from enum import Enum
+from typing import Collection, Optional
+from sqlalchemy import String, cast, func, insert, inspect, literal
+from sqlalchemy.orm import Session
+from models.CustomerFirstPurchaseModel import CustomerFirstPurchase
+from models.OrderModel import Order
+from models.OrderItemsModel import OrderItem
+from models.ProductModel import Product
+from models.StoreModel import Store
+from db.instrumentation import off_budget
+
+USE_FIRST_PURCHASE_TABLE = os.getenv("USE_FIRST_PURCHASE_TABLE", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Column each scope is keyed on when first purchases are computed from orders
+SCOPE_COLUMNS = {
+    "all": None,
+    "store": Order.store_id,
+    "region": Store.region,
+    "brand": Product.brand,
+    "product": OrderItem.product_id,
+}
+
+_table_present: Optional[bool] = None
+
+
+def first_purchase_available(db: Session) -> bool:
+    """Whether the table is enabled and exists in the connected database."""
+    global _table_present
+    if not USE_FIRST_PURCHASE_TABLE:
+        return False
+    if _table_present is None:
+        with off_budget():
+            _table_present = inspect(db.get_bind()).has_table(
+                CustomerFirstPurchase.__tablename__
+            )
+    return _table_present
+
+
+def scope_key(value) -> str:
+    """Text form of a store/product id or region/brand, as stored in scope_key."""
+    if isinstance(value, Enum):
+        return value.value
+    return "" if value is None else str(value)
+
+
+def first_purchases(db: Session, scope: str = "all"):
+    """
+    Subquery of (customer_id, scope_key, first_purchase_date) for one scope.
+
+    Reads customer_first_purchase when available; otherwise falls back to
+    aggregating the whole order history.
+    """
+    if scope not in SCOPE_COLUMNS:
+        raise ValueError(f"Invalid scope. Must be one of: {list(SCOPE_COLUMNS)}")
+
+    if first_purchase_available(db):
+        return (
+            db.query(
+                CustomerFirstPurchase.customer_id,
+                CustomerFirstPurchase.scope_key,
+                CustomerFirstPurchase.first_purchase_date,
+            )
+            .filter(CustomerFirstPurchase.scope == scope)
+            .subquery()
+        )
+
+    return _first_purchases_from_orders(db, scope).subquery()
+
+
+def _first_purchases_from_orders(db: Session, scope: str):
+    """Query of (customer_id, scope_key, first_purchase_date) over the orders."""
+    column = SCOPE_COLUMNS[scope]
+    key = literal("") if column is None else cast(column, String)
+    query = db.query(
+        Order.customer_id,
+        key.label("scope_key"),
+        func.min(Order.order_date).label("first_purchase_date"),
+    ).select_from(Order)
+    if scope == "region":
+        query = query.join(Store, Store.store_id == Order.store_id)
+    if scope in ("brand", "product"):
+        query = query.join(OrderItem, OrderItem.order_id == Order.order_id)
+    if scope == "brand":
+        query = query.join(Product, Product.product_id == OrderItem.product_id)
+    if column is not None:
+        query = query.filter(column.isnot(None))
+    group_by = [Order.customer_id] if column is None else [Order.customer_id, column]
+    return query.group_by(*group_by)
+
+
+def recompute_first_purchases(db: Session, customer_ids: Collection):
+    """
+    Rebuild every scope's first purchases of `customer_ids` from the orders
+    they have left, in the caller's transaction; for when orders are deleted.
+    """
+    if not customer_ids or not first_purchase_available(db):
+        return
+    db.query(CustomerFirstPurchase).filter(
+        CustomerFirstPurchase.customer_id.in_(customer_ids)
+    ).delete(synchronize_session=False)
+    for scope in SCOPE_COLUMNS:
+        purchases = (
+            _first_purchases_from_orders(db, scope)
+            .filter(Order.customer_id.in_(customer_ids))
+            .subquery()
+        )
+        db.execute(
+            insert(CustomerFirstPurchase).from_select(
+                ["scope", "scope_key", "customer_id", "first_purchase_date"],
+                db.query(
+                    literal(scope),
+                    purchases.c.scope_key,
+                    purchases.c.customer_id,
+                    purchases.c.first_purchase_date,
+                ),
+            )
+        )
@@ -1,15 +1,30 @@
 from fastapi import Depends
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, literal_column, cast, Date
 from db.session import get_db
-from models.OrderModel import Order
-from models.OrderItemsModel import OrderItem
-from models.ProductModel import Product
-from models.StoreModel import Store
-from models.ReturnsModel import Return as Returns
-from datetime import datetime, timezone, timedelta
-from typing import Optional, List, Dict, Tuple, Union, Any
-from dateutil.relativedelta import relativedelta
+from crud.v2 import metrics
+from crud.v2.cube import CubeData, analytics_cube, bucket_series
+from crud.kpi import insights
+from db.fanout import run_concurrently, run_concurrently_async
+from datetime import date, datetime, timezone, timedelta
+from typing import Optional, List, Dict, Tuple, Union, Any, Callable
+from functools import partial
+from helpers.serialization import plain_rows
+
+KPI_METRICS = ["Total Sales", "Total Profit", "Total Orders", "Total Returns"]
+
+# to_char() patterns for trend bucket labels, by date_trunc() unit
+TREND_BUCKET_FORMATS = {
+    "day": "YYYY-MM-DD",
+    "week": 'IYYY-"W"IW',
+    "month": "YYYY-MM",
+    "quarter": 'YYYY-"Q"Q',
+}
+
+
+def _as_date(value: Union[date, datetime]) -> date:
+    return value.date() if isinstance(value, datetime) else value
 
 
 class KPICrud:
@@ -38,61 +53,236 @@ class KPICrud:
 
     from datetime import timedelta
 
-    def _calculate_trend_data(
+    def _trend_bucket_series(
+        self, start_date: datetime, end_date: datetime, group_by: str = "day"
+    ):
+        """
+        Every trend bucket from start_date to end_date, generated by Postgres as
+        a derived table `series(bucket)`. Label it with `_trend_bucket_label`.
+        """
+        if group_by not in TREND_BUCKET_FORMATS:
+            raise ValueError(
+                f"Invalid trend granularity. Must be one of: {list(TREND_BUCKET_FORMATS)}"
+            )
+        return (
+            func.generate_series(
+                func.date_trunc(group_by, cast(_as_date(start_date), Date)),
+                func.date_trunc(group_by, cast(_as_date(end_date), Date)),
+                # group_by is whitelisted above
+                literal_column(f"interval '1 {group_by}'"),
+            )
+            .table_valued("bucket")
+            .render_derived(name="series")
+        )
+
+    def _trend_bucket_label(self, bucket: Any, group_by: str = "day"):
+        return func.to_char(bucket, TREND_BUCKET_FORMATS[group_by])
+
+    def _trend_bucket_text(self, bucket: datetime, group_by: str = "day") -> str:
+        """The label `_trend_bucket_label` gives `bucket`, formatted in Python."""
+        if group_by == "week":
+            year, week, _ = bucket.isocalendar()
+            return f"{year}-W{week:02d}"
+        if group_by == "quarter":
+            return f"{bucket.year}-Q{(bucket.month - 1) // 3 + 1}"
+        return bucket.strftime("%Y-%m" if group_by == "month" else "%Y-%m-%d")
+
+    def _fetch_period_buckets(
         self,
-        db,
-        base_model: Any,
-        date_field: Any,
-        value_expression: Any,
+        db: Session,
+        source: str,
+        metric_names: List[str],
         start_date: datetime,
         end_date: datetime,
+        prev_start: datetime,
+        prev_end: datetime,
         group_by: str = "day",
-        required_joins: Optional[List[Tuple[Any, Any]]] = None,
-        additional_filters: Optional[List[Any]] = None,
-    ) -> List[Dict[str, Any]]:
-        date_trunc_unit = "day" if group_by == "day" else "month"
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Aggregate several metrics from one source for the current and previous
+        period in one scan.
+
+        Each metric becomes a pair of conditional aggregates. Rows are grouped
+        by trend bucket and full-joined to the current period's bucket series,
+        so the same statement yields both period totals and the zero-filled,
+        labelled current period trend.
+        """
+        date_field = metrics.date_field(source)
+        current_period = date_field.between(start_date, end_date)
+        previous_period = date_field.between(prev_start, prev_end)
+
+        columns = [func.date_trunc(group_by, date_field).label("bucket")]
+        for index, name in enumerate(metric_names):
+            columns.append(
+                metrics.metric_column(name, source, period=current_period).label(
+                    f"current_{index}"
+                )
+            )
+            columns.append(
+                metrics.metric_column(name, source, period=previous_period).label(
+                    f"previous_{index}"
+                )
+            )
+        buckets = metrics.select_from_source(
+            db,
+            source,
+            columns,
+            filters=[date_field.between(prev_start, end_date)],
+            group_by=["bucket"],
+        ).subquery()
 
-        # Run the grouped query
-        query = db.query(
-            func.date_trunc(date_trunc_unit, date_field).label("bucket"),
-            value_expression.label("bucket_total"),
+        # Previous-period buckets have no series row and come back unlabelled
+        series = self._trend_bucket_series(start_date, end_date, group_by)
+        value_columns = []
+        for index in range(len(metric_names)):
+            for period in ("current", "previous"):
+                column = buckets.c[f"{period}_{index}"]
+                value_columns.append(
+                    func.coalesce(column, 0).label(f"{period}_{index}")
+                )
+        rows = plain_rows(
+            db.query(
+                self._trend_bucket_label(series.c.bucket, group_by).label("label"),
+                *value_columns,
+            )
+            .select_from(series)
+            .outerjoin(buckets, buckets.c.bucket == series.c.bucket, full=True)
+            .order_by(series.c.bucket)
+            .all()
         )
-        if required_joins:
-            for model, condition in required_joins:
-                query = query.join(model, condition)
-        if additional_filters:
-            for filter_condition in additional_filters:
-                query = query.filter(filter_condition)
-        query = query.filter(date_field.between(start_date, end_date))
-        query = query.group_by("bucket").order_by("bucket")
-
-        results = {
-            row.bucket.strftime(
-                "%Y-%m-%d" if group_by == "day" else "%Y-%m"
-            ): row.bucket_total
-            for row in query.all()
-        }
 
-        # Generate all expected dates
-        buckets = []
-        current = start_date.replace(day=1) if group_by == "month" else start_date
-        while current <= end_date:
-            bucket_label = current.strftime(
-                "%Y-%m-%d" if group_by == "day" else "%Y-%m"
+        snapshot = {}
+        for index, name in enumerate(metric_names):
+            current_total = previous_total = 0
+            trend = []
+            for row in rows:
+                current_value = row[f"current_{index}"]
+                current_total += current_value
+                previous_total += row[f"previous_{index}"]
+                if row["label"] is not None:
+                    trend.append({"date": row["label"], "value": current_value})
+            snapshot[name] = {
+                "total": current_total,
+                "previous_total": previous_total,
+                "trend": trend,
+            }
+        return snapshot
+
+    def _cube_period_buckets(
+        self,
+        cube: CubeData,
+        metric_names: List[str],
+        start_date: datetime,
+        end_date: datetime,
+        prev_start: datetime,
+        prev_end: datetime,
+        group_by: str = "day",
+    ) -> Dict[str, Dict[str, Any]]:
+        """`_fetch_period_buckets` for every metric, answered from the analytics cube."""
+        if group_by not in TREND_BUCKET_FORMATS:
+            raise ValueError(
+                f"Invalid trend granularity. Must be one of: {list(TREND_BUCKET_FORMATS)}"
             )
-            buckets.append(bucket_label)
-            current += (
-                timedelta(days=1) if group_by == "day" else relativedelta(months=1)
+        labels = {f"value_{index}": name for index, name in enumerate(metric_names)}
+        current = cube.aggregate(labels, start_date=start_date, end_date=end_date)
+        previous = cube.aggregate(labels, start_date=prev_start, end_date=prev_end)
+        buckets = {
+            row.bucket: row
+            for row in cube.aggregate(
+                labels, start_date=start_date, end_date=end_date, bucket=group_by
             )
+        }
 
-        # Return list with 0-filled gaps
-        return [
-            {
-                "date": bucket,
-                "value": results.get(bucket, 0),
+        snapshot = {}
+        for label, name in labels.items():
+            trend = []
+            for bucket in bucket_series(start_date, end_date, group_by):
+                row = buckets.get(bucket)
+                trend.append(
+                    {
+                        "date": self._trend_bucket_text(bucket, group_by),
+                        "value": getattr(row, label) if row else 0,
+                    }
+                )
+            snapshot[name] = {
+                "total": getattr(current[0], label) if current else 0,
+                "previous_total": getattr(previous[0], label) if previous else 0,
+                "trend": trend,
             }
-            for bucket in buckets
-        ]
+        return snapshot
+
+    def _fetch_kpi_snapshot(
+        self,
+        db: Session,
+        start_date: datetime,
+        end_date: datetime,
+        granularity: Optional[str] = None,
+        metric_names: List[str] = KPI_METRICS,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Compute /kpi/ metrics for both periods with one scan per source table."""
+        tasks, finish = self._plan_kpi_snapshot(
+            db, start_date, end_date, granularity, metric_names
+        )
+        return finish(run_concurrently(db, tasks))
+
+    def _plan_kpi_snapshot(
+        self,
+        db: Session,
+        start_date: datetime,
+        end_date: datetime,
+        granularity: Optional[str] = None,
+        metric_names: List[str] = KPI_METRICS,
+    ) -> Tuple[Dict[str, Callable[[Session], Any]], Callable[[Dict], Dict]]:
+        """
+        Split the snapshot into one scan per source plus a function that merges
+        their results, so sync and async callers can fan the scans out.
+        """
+        date_range = self._calculate_date_range(start_date, end_date)
+        prev_start, prev_end = date_range["prev_start"], date_range["prev_end"]
+        group_by = granularity or (
+            "day" if date_range["range_length"] <= 31 else "month"
+        )
+
+        cube = analytics_cube.serving(db, metric_names)
+        answered = {}
+        if cube is not None:
+            # Answered from memory; nothing is left to run on the database
+            answered = self._cube_period_buckets(
+                cube,
+                metric_names,
+                start_date,
+                end_date,
+                prev_start,
+                prev_end,
+                group_by,
+            )
+
+        # The scans touch different tables and are independent of each other.
+        tasks = {
+            source: partial(
+                self._fetch_period_buckets,
+                source=source,
+                metric_names=names,
+                start_date=start_date,
+                end_date=end_date,
+                prev_start=prev_start,
+                prev_end=prev_end,
+                group_by=group_by,
+            )
+            for source, names in metrics.sources_for(db, metric_names).items()
+            if cube is None
+        }
+
+        def finish(results: Dict[str, Dict]) -> Dict[str, Dict[str, Any]]:
+            snapshot = dict(answered)
+            for partial_snapshot in results.values():
+                snapshot.update(partial_snapshot)
+            for values in snapshot.values():
+                values["prev_start"] = prev_start
+                values["prev_end"] = prev_end
+            return snapshot
+
+        return tasks, finish
 
     def _format_kpi_response(
         self,
@@ -124,213 +314,34 @@ class KPICrud:
 
     # -- End --#
 
-    def get_total_sales(
-        self, db: Session, start_date: datetime, end_date: Optional[datetime] = None
+    def _get_single_kpi(
+        self, db: Session, name: str, start_date: datetime, end_date: Optional[datetime]
     ):
         end_date = end_date or datetime.now(timezone.utc)
-        date_range = self._calculate_date_range(start_date, end_date)
-        _, range_length, prev_start, prev_end = (
-            date_range["month_diff"],
-            date_range["range_length"],
-            date_range["prev_start"],
-            date_range["prev_end"],
-        )
-        total = (
-            db.query(func.sum(OrderItem.price * OrderItem.quantity))
-            .join(Order)
-            .filter(Order.order_date.between(start_date, end_date))
-            .scalar()
-        ) or 0.0
-        prev_total = (
-            db.query(func.sum(OrderItem.price * OrderItem.quantity))
-            .join(Order)
-            .filter(Order.order_date.between(prev_start, prev_end))
-            .scalar()
-        ) or 0.0
-        percentage_change = (
-            (total - prev_total) / prev_total * 100 if prev_total > 0 else 0.0
-        )
-        group_by = "day" if range_length <= 31 else "month"
-        trend_data = self._calculate_trend_data(
-            base_model=OrderItem,
-            db=db,
-            date_field=Order.order_date,
-            value_expression=func.sum(OrderItem.price * OrderItem.quantity),
-            start_date=start_date,
-            end_date=end_date,
-            group_by=group_by,
-            required_joins=[
-                (Order, Order.order_id == OrderItem.order_id),
-                (Product, Product.product_id == OrderItem.product_id),
-            ],
-        )
-        return self._format_kpi_response(
-            "Total Sales",
-            total,
-            percentage_change,
-            trend_data,
-            prev_total,
-            prev_start,
-            prev_end,
-            start_date,
-            end_date,
+        snapshot = self._fetch_kpi_snapshot(
+            db, start_date, end_date, metric_names=[name]
         )
+        return self._format_all_kpi(snapshot, start_date, end_date, [name])[0]
+
+    def get_total_sales(
+        self, db: Session, start_date: datetime, end_date: Optional[datetime] = None
+    ):
+        return self._get_single_kpi(db, "Total Sales", start_date, end_date)
 
     def get_total_orders(
         self, db: Session, start_date: datetime, end_date: Optional[datetime] = None
     ):
-        end_date = end_date or datetime.now(timezone.utc)
-        date_range = self._calculate_date_range(start_date, end_date)
-        _, range_length, prev_start, prev_end = (
-            date_range["month_diff"],
-            date_range["range_length"],
-            date_range["prev_start"],
-            date_range["prev_end"],
-        )
-        total = (
-            db.query(func.count(Order.order_id))
-            .filter(Order.order_date.between(start_date, end_date))
-            .scalar()
-        ) or 0
-        prev_total = (
-            db.query(func.count(Order.order_id))
-            .filter(Order.order_date.between(prev_start, prev_end))
-            .scalar()
-        ) or 0
-        percentage_change = (
-            ((total - prev_total) / prev_total) * 100 if prev_total > 0 else 0.0
-        )
-        group_by = "day" if range_length <= 31 else "month"
-        trend_data = self._calculate_trend_data(
-            base_model=Order,
-            db=db,
-            date_field=Order.order_date,
-            value_expression=func.count(Order.order_id),
-            start_date=start_date,
-            end_date=end_date,
-            group_by=group_by,
-            required_joins=[],
-        )
-        return self._format_kpi_response(
-            "Total Orders",
-            total,
-            percentage_change,
-            trend_data,
-            prev_total,
-            prev_start,
-            prev_end,
-            start_date,
-            end_date,
-        )
+        return self._get_single_kpi(db, "Total Orders", start_date, end_date)
 
     def get_total_profit(
         self, db: Session, start_date: datetime, end_date: Optional[datetime] = None
     ):
-        end_date = end_date or datetime.now(timezone.utc)
-        total = (
-            db.query(func.sum((Product.price - Product.cost) * OrderItem.quantity))
-            .select_from(OrderItem)
-            .join(Product)
-            .join(Order)
-            .filter(Order.order_date.between(start_date, end_date))
-            .scalar()
-        )
-        date_range = self._calculate_date_range(start_date, end_date)
-        _, range_length, prev_start, prev_end = (
-            date_range["month_diff"],
-            date_range["range_length"],
-            date_range["prev_start"],
-            date_range["prev_end"],
-        )
-        prev_total = (
-            db.query(func.sum((Product.price - Product.cost) * OrderItem.quantity))
-            .select_from(OrderItem)
-            .join(Product)
-            .join(Order)
-            .filter(Order.order_date.between(prev_start, prev_end))
-            .scalar()
-        )
-        percentage_change = (
-            ((total - prev_total) / prev_total) * 100 if prev_total else 0.0
-        )
-        group_by = "day" if range_length <= 31 else "month"
-        trend_data = self._calculate_trend_data(
-            base_model=OrderItem,
-            db=db,
-            date_field=Order.order_date,
-            value_expression=func.sum(
-                (Product.price - Product.cost) * OrderItem.quantity
-            ),
-            start_date=start_date,
-            end_date=end_date,
-            group_by=group_by,
-            required_joins=[
-                (Order, Order.order_id == OrderItem.order_id),
-                (Product, Product.product_id == OrderItem.product_id),
-            ],
-        )
-        return self._format_kpi_response(
-            "Total Profit",
-            total,
-            percentage_change,
-            trend_data,
-            prev_total,
-            prev_start,
-            prev_end,
-            start_date,
-            end_date,
-        )
+        return self._get_single_kpi(db, "Total Profit", start_date, end_date)
 
     def get_total_returns(
         self, db: Session, start_date: datetime, end_date: Optional[datetime] = None
     ):
-        end_date = end_date or datetime.now(timezone.utc)
-        total = (
-            db.query(func.count(Returns.return_id))
-            .filter(Returns.return_date.between(start_date, end_date))
-            .scalar()
-        )
-        date_range = self._calculate_date_range(start_date, end_date)
-        _, range_length, prev_start, prev_end = (
-            date_range["month_diff"],
-            date_range["range_length"],
-            date_range["prev_start"],
-            date_range["prev_end"],
-        )
-        prev_total = (
-            db.query(func.count(Returns.return_id))
-            .filter(Returns.return_date.between(prev_start, prev_end))
-            .scalar()
-        )
-        percentage_change = (
-            ((total - prev_total) / prev_total) * 100 if prev_total else 0.0
-        )
-        group_by = "day" if range_length <= 31 else "month"
-        trend_data = self._calculate_trend_data(
-            base_model=Returns,
-            db=db,
-            date_field=Returns.return_date,
-            value_expression=func.count(Returns.return_id),
-            start_date=start_date,
-            end_date=end_date,
-            group_by=group_by,
-            required_joins=[
-                (OrderItem, OrderItem.order_item_id == Returns.order_item_id),
-                (Order, Order.order_id == OrderItem.order_id),
-                (Product, Product.product_id == OrderItem.product_id),
-            ],
-        )
-        return self._format_kpi_response(
-            "Total Returns",
-            total,
-            percentage_change,
-            trend_data,
-            prev_total,
-            prev_start,
-            prev_end,
-            start_date,
-            end_date,
-        )
+        return self._get_single_kpi(db, "Total Returns", start_date, end_date)
 
     def fetch_insights(
         self,
@@ -344,27 +355,9 @@ class KPICrud:
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
     ) -> Dict[str, Union[List[Dict[str, Any]], List[Dict[str, Any]]]]:
-        valid_comparison_levels = ["region", "store", "brand", "product"]
-        if comparison_level not in valid_comparison_levels:
-            raise ValueError(
-                f"Invalid comparison level. Must be one of: {valid_comparison_levels}"
-            )
-        valid_metrics = {
-            "Total Sales": func.sum(OrderItem.price * OrderItem.quantity),
-            "Total Orders": func.count(OrderItem.order_item_id),
-            "Total Returns": func.count(Returns.return_id),
-            "Total Profit": func.sum(
-                (OrderItem.price - Product.cost) * OrderItem.quantity
-            ),
-        }
-        if metric not in valid_metrics:
-            raise ValueError(
-                f"Invalid metric. Must be one of: {list(valid_metrics.keys())}"
-            )
-        end_date = end_date or datetime.now(timezone.utc)
-        current_results = self._fetch_insights_data(
+        return insights.fetch_insights(
+            db,
             comparison_level=comparison_level,
-            db=db,
             metric=metric,
             selected_regions=selected_regions,
             selected_stores=selected_stores,
@@ -372,164 +365,71 @@ class KPICrud:
             selected_products=selected_products,
             start_date=start_date,
             end_date=end_date,
-            metric_expression=valid_metrics[metric],
         )
-        if start_date and end_date:
-            prev_start = start_date - (end_date - start_date) - timedelta(days=1)
-            prev_end = start_date - timedelta(days=1)
-            prev_results = self._fetch_insights_data(
-                comparison_level=comparison_level,
-                db=db,
-                metric=metric,
-                selected_regions=selected_regions,
-                selected_stores=selected_stores,
-                selected_brands=selected_brands,
-                selected_products=selected_products,
-                start_date=prev_start,
-                end_date=prev_end,
-                metric_expression=valid_metrics[metric],
-            )
-            prev_lookup = {
-                item["comparison_value"]: item for item in prev_results["summary"]
-            }
-            for current in current_results["summary"]:
-                prev_value = prev_lookup.get(current["comparison_value"], {}).get(
-                    "metric_value", 0
-                )
-                curr_value = current["metric_value"]
-                if prev_value > 0:
-                    current["percentage_change"] = (
-                        (curr_value - prev_value) / prev_value
-                    ) * 100
-                else:
-                    current["percentage_change"] = 0.0 if curr_value == 0 else 100.0
-        return current_results
-
-    def _fetch_insights_data(
-        self,
-        db: Session,
-        comparison_level: str,
-        metric: str,
-        selected_regions: List[str],
-        selected_stores: List[str],
-        selected_brands: List[str],
-        selected_products: List[str],
-        start_date: Optional[datetime],
-        end_date: Optional[datetime],
-        metric_expression: Any,
-    ) -> Dict[str, List]:
-        if metric == "Total Returns":
-            date_field = Returns.return_date
-        else:
-            date_field = Order.order_date
-
-        def build_base_query(query, include_date=False, date_trunc_unit="month"):
-            if comparison_level == "region":
-                query = query.add_columns(Store.region.label("comparison_value"))
-            elif comparison_level == "store":
-                query = query.add_columns(
-                    Store.name.label("comparison_value"),
-                )
-            elif comparison_level == "brand":
-                query = query.add_columns(Product.brand.label("comparison_value"))
-            elif comparison_level == "product":
-                query = query.add_columns(Product.name.label("comparison_value"))
-            if include_date:
-                query = query.add_columns(
-                    func.date_trunc(date_trunc_unit, date_field).label("date")
-                )
-            query = query.add_columns(metric_expression.label("metric_value"))
-            if metric in [
-                "Total Sales",
-                "Total Orders",
-                "Total Profit",
-                "Total Customers",
-            ]:
-                query = query.select_from(OrderItem)
-                query = query.join(Order, Order.order_id == OrderItem.order_id)
-                query = query.join(Product, Product.product_id == OrderItem.product_id)
-                if comparison_level in ["region", "store"]:
-                    query = query.join(Store, Store.store_id == Order.store_id)
-            elif metric == "Total Returns":
-                query = query.select_from(Returns)
-                query = query.join(
-                    OrderItem, OrderItem.order_item_id == Returns.order_item_id
-                )
-                query = query.join(Order, Order.order_id == OrderItem.order_id)
-                query = query.join(Product, Product.product_id == OrderItem.product_id)
-                if comparison_level in ["region", "store"]:
-                    query = query.join(Store, Store.store_id == Order.store_id)
-            if selected_regions:
-                query = query.filter(Store.region.in_(selected_regions))
-            if selected_stores:
-                query = query.filter(Store.store_id.in_(selected_stores))
-            if selected_brands:
-                query = query.filter(Product.brand.in_(selected_brands))
-            if selected_products:
-                query = query.filter(Product.name.in_(selected_products))
-            if start_date and end_date:
-                query = query.filter(date_field.between(start_date, end_date))
-            return query
-
-        summary_query = build_base_query(db.query())
-        group_by_fields = []
-        if comparison_level == "region":
-            group_by_fields.append(Store.region)
-        elif comparison_level == "store":
-            group_by_fields.extend([Store.store_id, Store.name])
-        elif comparison_level == "brand":
-            group_by_fields.append(Product.brand)
-        elif comparison_level == "product":
-            group_by_fields.append(Product.name)
-        summary_query = summary_query.group_by(*group_by_fields)
-        summary_results = summary_query.all()
-        formatted_summary = []
-        for row in summary_results:
-            result = {
-                "comparison_value": row.comparison_value,
-                "metric_value": float(row.metric_value or 0),
-                "metric_name": metric,
-            }
-            if hasattr(row, "store_name"):
-                result["store_name"] = row.store_name
-            formatted_summary.append(result)
-        trend_data = []
-        if start_date and end_date:
-            trend_query = build_base_query(
-                db.query(),
-                include_date=True,
-                date_trunc_unit="month",
-            )
-            trend_group_by = group_by_fields.copy()
-            trend_group_by.append(func.date_trunc("month", date_field))
-            trend_query = trend_query.group_by(*trend_group_by)
-            trend_results = trend_query.order_by("comparison_value").all()
-            for row in trend_results:
-                trend_data.append(
-                    {
-                        "comparison_value": row.comparison_value,
-                        "date": row.date.isoformat(),
-                        "metric_value": float(row.metric_value or 0),
-                    }
-                )
-        return {"summary": formatted_summary, "trend": trend_data}
 
-    def get_all_kpi(
-        self, db: Session, start_date: datetime, end_date: Optional[datetime] = None
-    ):
+    @staticmethod
+    def _normalize_kpi_dates(
+        start_date: datetime, end_date: Optional[datetime]
+    ) -> Tuple[datetime, datetime]:
         if start_date.tzinfo is None:
             start_date = start_date.replace(tzinfo=timezone.utc)
         end_date = end_date or datetime.now(timezone.utc)
         if end_date.tzinfo is None:
             end_date = end_date.replace(tzinfo=timezone.utc)
+        return start_date, end_date
 
-        total_sales = self.get_total_sales(db, start_date, end_date)
-        total_orders = self.get_total_orders(db, start_date, end_date)
-        total_profit = self.get_total_profit(db, start_date, end_date)
-        total_returns = self.get_total_returns(db, start_date, end_date)
-        return [
-            total_sales,
-            total_profit,
-            total_orders,
-            total_returns,
-        ]
+    def _format_all_kpi(
+        self,
+        snapshot: Dict[str, Dict[str, Any]],
+        start_date: datetime,
+        end_date: datetime,
+        metric_names: List[str] = KPI_METRICS,
+    ) -> List[Dict[str, Any]]:
+        response = []
+        for name in metric_names:
+            values = snapshot[name]
+            total = values["total"]
+            prev_total = values["previous_total"]
+            percentage_change = (
+                ((total - prev_total) / prev_total) * 100 if prev_total > 0 else 0.0
+            )
+            response.append(
+                self._format_kpi_response(
+                    name,
+                    total,
+                    percentage_change,
+                    values["trend"],
+                    prev_total,
+                    values["prev_start"],
+                    values["prev_end"],
+                    start_date,
+                    end_date,
+                )
+            )
+        return response
+
+    def get_all_kpi(
+        self,
+        db: Session,
+        start_date: datetime,
+        end_date: Optional[datetime] = None,
+        granularity: Optional[str] = None,
+    ):
+        start_date, end_date = self._normalize_kpi_dates(start_date, end_date)
+        snapshot = self._fetch_kpi_snapshot(db, start_date, end_date, granularity)
+        return self._format_all_kpi(snapshot, start_date, end_date)
+
+    async def get_all_kpi_async(
+        self,
+        db: AsyncSession,
+        start_date: datetime,
+        end_date: Optional[datetime] = None,
+        granularity: Optional[str] = None,
+    ):
+        start_date, end_date = self._normalize_kpi_dates(start_date, end_date)
+        tasks, finish = await db.run_sync(
+            self._plan_kpi_snapshot, start_date, end_date, granularity
+        )
+        # Fan out on the event loop; blocking on threads here would stall it.
+        snapshot = finish(await run_concurrently_async(db, tasks))
+        return self._format_all_kpi(snapshot, start_date, end_date)
@@ -0,0 +1,626 @@
+from typing import Any, Dict, Iterable, List, Literal, Optional, Sequence, Union
+from datetime import datetime
+from sqlalchemy import func, case, desc, distinct, and_, literal_column, select, tuple_
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql.util import find_tables
+from models.OrderItemsModel import OrderItem
+from models.ProductModel import Product
+from models.StoreModel import Store
+from models.ReturnsModel import Return as Returns
+from models.DailySalesRollupModel import DailySalesRollup
+from crud.v2 import rollup
+
+# Fact tables metrics are computed from, in order of preference for raw data.
+# `joins` lists every table reachable from the base as (model, onclause,
+# prerequisite model) in dependency order; a compiled query only emits the
+# joins its columns, filters and grouping actually reference. `dimensions`
+# maps each dimension to its key column, preferring a foreign key already on
+# a joined table over the dimension table itself.
+SOURCES = {
+    "rollup": {
+        "base": DailySalesRollup,
+        "date_field": DailySalesRollup.day,
+        "joins": [
+            (Store, DailySalesRollup.store_id == Store.store_id, None),
+            (Product, DailySalesRollup.product_id == Product.product_id, None),
+        ],
+        "dimensions": {
+            "region": Store.region,
+            "store": DailySalesRollup.store_id,
+            "brand": Product.brand,
+            "product": DailySalesRollup.product_id,
+        },
+    },
+    # order_items and returns carry copies of their order's date and store
+    # (and returns their item's product), so neither joins back to orders.
+    "items": {
+        "base": OrderItem,
+        "date_field": OrderItem.order_date,
+        "joins": [
+            (Product, OrderItem.product_id == Product.product_id, None),
+            (Store, OrderItem.store_id == Store.store_id, None),
+        ],
+        "dimensions": {
+            "region": Store.region,
+            "store": OrderItem.store_id,
+            "brand": Product.brand,
+            "product": OrderItem.product_id,
+        },
+    },
+    "returns": {
+        "base": Returns,
+        "date_field": Returns.return_date,
+        "joins": [
+            (Product, Returns.product_id == Product.product_id, None),
+            (Store, Returns.store_id == Store.store_id, None),
+        ],
+        "dimensions": {
+            "region": Store.region,
+            "store": Returns.store_id,
+            "brand": Product.brand,
+            "product": Returns.product_id,
+        },
+    },
+}
+
+# Display column of each dimension; the same on every source.
+DIMENSION_LABELS = {
+    "region": Store.region,
+    "store": Store.name,
+    "brand": Product.brand,
+    "product": Product.name,
+}
+
+# The single definition of every sales metric. `aggregate` is applied to the
+# per-row value of the raw source(s) listed in `values`; `rollup` lists the
+# rollup measures that answer it, tried in order (see rollup.can_answer).
+METRICS = {
+    "Total Sales": {
+        "aggregate": func.sum,
+        "values": {"items": OrderItem.price * OrderItem.quantity},
+        "rollup": ["sales"],
+    },
+    "Total Profit": {
+        "aggregate": func.sum,
+        "values": {"items": (OrderItem.price - Product.cost) * OrderItem.quantity},
+        "rollup": ["profit"],
+    },
+    "Total Orders": {
+        "aggregate": lambda value: func.count(distinct(value)),
+        "values": {"items": OrderItem.order_id},
+        "rollup": ["order_count", "product_order_count"],
+    },
+    "Total Returns": {
+        "aggregate": func.count,
+        "values": {"returns": Returns.return_id},
+        "rollup": ["return_count"],
+    },
+}
+
+DIMENSIONS = list(DIMENSION_LABELS)
+
+# Type of a metric name request parameter: FastAPI answers 422 to any other.
+MetricName = Literal[tuple(METRICS)]
+
+
+# Columns of the store, region, brand and product tables
+TABLE_METRICS = {
+    "total_sales": "Total Sales",
+    "total_profit": "Total Profit",
+    "total_orders": "Total Orders",
+    "total_returns": "Total Returns",
+}
+
+
+def _check_metrics(metrics: Iterable[str]):
+    for metric in metrics:
+        if metric not in METRICS:
+            raise ValueError(f"Invalid metric. Must be one of: {list(METRICS)}")
+
+
+def _active_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # A select of keys always filters; an empty list means "no filter"
+    return {
+        name: values
+        for name, values in (filters or {}).items()
+        if values is not None and (not isinstance(values, (list, tuple, set)) or values)
+    }
+
+
+def _rollup_measure_for(
+    metric: str, group_by: Iterable[str] = (), filter_by: Iterable[str] = ()
+) -> Optional[str]:
+    for name in METRICS[metric]["rollup"]:
+        if rollup.can_answer([name], group_by, filter_by):
+            return name
+    return None
+
+
+def _raw_source_for(metric: str, group_by: Iterable[str] = ()) -> str:
+    for source in SOURCES:
+        if source in METRICS[metric]["values"] and set(group_by) <= set(
+            SOURCES[source]["dimensions"]
+        ):
+            return source
+    raise ValueError(f"{metric} cannot be grouped by {list(group_by)}")
+
+
+def sources_for(
+    db: Session,
+    metrics: Sequence[str],
+    group_by: Iterable[str] = (),
+    filter_by: Iterable[str] = (),
+) -> Dict[str, List[str]]:
+    """
+    Group `metrics` by the source each one is computed from. The rollup answers
+    all of them in one scan when it can; otherwise each metric goes to its raw
+    fact table.
+    """
+    _check_metrics(metrics)
+    group_by, filter_by = list(group_by), list(filter_by)
+    if rollup.rollup_available(db) and all(
+        _rollup_measure_for(metric, group_by, filter_by) for metric in metrics
+    ):
+        return {"rollup": list(metrics)}
+
+    grouped: Dict[str, List[str]] = {}
+    for metric in metrics:
+        grouped.setdefault(_raw_source_for(metric, group_by), []).append(metric)
+    return grouped
+
+
+def metric_column(
+    metric: str,
+    source: str,
+    group_by: Iterable[str] = (),
+    filter_by: Iterable[str] = (),
+    period: Any = None,
+):
+    """Aggregate expression of `metric` on `source`, optionally only over `period`."""
+    if source == "rollup":
+        name = _rollup_measure_for(metric, group_by, filter_by)
+        if period is None:
+            return rollup.rollup_measure(name)
+        return rollup.conditional_rollup_measure(name, period)
+
+    spec = METRICS[metric]
+    value = spec["values"][source]
+    if period is not None:
+        value = case([(period, value)])
+    return spec["aggregate"](value)
+
+
+def date_field(source: str):
+    return SOURCES[source]["date_field"]
+
+
+def dimension_key(dimension: str, source: str):
+    if dimension not in DIMENSION_LABELS:
+        raise ValueError(f"Invalid dimension. Must be one of: {DIMENSIONS}")
+    return SOURCES[source]["dimensions"][dimension]
+
+
+def select_from_source(
+    db: Session,
+    source: str,
+    columns: Sequence[Any],
+    filters: Sequence[Any] = (),
+    group_by: Sequence[Any] = (),
+    key_filters: Sequence[Any] = (),
+) -> Query:
+    """
+    db.query(*columns) over the source's fact table, joined only to the tables
+    that the columns, filters and grouping touch.
+
+    `key_filters` are (key column, condition) pairs. Only the key column is
+    inspected, so a condition may hold a subquery over other tables without
+    pulling them into the join.
+    """
+    spec = SOURCES[source]
+    tables = set()
+    inspected = [*columns, *filters, *group_by, *(key for key, _ in key_filters)]
+    for clause in inspected:
+        if not isinstance(clause, str):
+            tables.update(find_tables(clause, check_columns=True))
+
+    needed = {model for model, _, _ in spec["joins"] if model.__table__ in tables}
+    for model, _, prerequisite in reversed(spec["joins"]):
+        if model in needed and prerequisite is not None:
+            needed.add(prerequisite)
+
+    query = db.query(*columns).select_from(spec["base"])
+    for model, onclause, _ in spec["joins"]:
+        if model in needed:
+            query = query.join(model, onclause)
+    for condition in [*filters, *(condition for _, condition in key_filters)]:
+        query = query.filter(condition)
+    if group_by:
+        query = query.group_by(*group_by)
+    return query
+
+
+def aggregate_query(
+    db: Session,
+    metrics: Dict[str, str],
+    dimensions: Optional[Dict[str, Union[str, Any]]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    bucket: Optional[str] = None,
+    source: Optional[str] = None,
+) -> Query:
+    """
+    Compile one grouped query for metrics that share a source.
+
+    `metrics` maps output labels to metric names. `dimensions` maps output
+    labels to either a dimension name (selects its key column) or a model
+    column such as Store.name; every dimension is grouped on. `filters` maps
+    dimension names to a list of keys (or a select of keys). With `bucket`, the
+    source's date field truncated to that unit is added as "bucket".
+    """
+    dimensions = dimensions or {}
+    filters = _active_filters(filters)
+    group_dims = [value for value in dimensions.values() if isinstance(value, str)]
+    filter_dims = list(filters)
+
+    if source is None:
+        by_source = sources_for(db, list(metrics.values()), group_dims, filter_dims)
+        if len(by_source) > 1:
+            raise ValueError(
+                f"Metrics come from different sources: {by_source}; query them separately"
+            )
+        source = next(iter(by_source))
+
+    columns, group_by = [], []
+    for label, dimension in dimensions.items():
+        column = (
+            dimension_key(dimension, source)
+            if isinstance(dimension, str)
+            else dimension
+        )
+        columns.append(column.label(label))
+        group_by.append(column)
+    if bucket:
+        columns.append(func.date_trunc(bucket, date_field(source)).label("bucket"))
+        # Group on the label: a repeated date_trunc() would get its own bind
+        # parameter under asyncpg and no longer match the select list.
+        group_by.append(literal_column("bucket"))
+    for label, metric in metrics.items():
+        columns.append(
+            metric_column(metric, source, group_dims, filter_dims).label(label)
+        )
+
+    conditions = []
+    if start_date and end_date:
+        conditions.append(date_field(source).between(start_date, end_date))
+    key_filters = []
+    for dimension, values in filters.items():
+        key = dimension_key(dimension, source)
+        key_filters.append((key, key.in_(values)))
+
+    return select_from_source(
+        db, source, columns, conditions, group_by, key_filters=key_filters
+    )
+
+
+def aggregate_subquery(
+    db: Session,
+    metrics: Dict[str, str],
+    dimensions: Dict[str, str],
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    filters: Optional[Dict[str, Any]] = None,
+):
+    """
+    One subquery with a column per dimension key and metric, for metrics that
+    may live on different sources.
+
+    Rows are the entities that sold something in the range. Metrics from other
+    sources (returns) are aggregated separately and LEFT JOINed on the keys,
+    defaulting to 0.
+    """
+    group_dims = list(dimensions.values())
+    filter_dims = list(_active_filters(filters))
+    by_source = sources_for(db, list(metrics.values()), group_dims, filter_dims)
+    parts = []
+    for source, names in by_source.items():
+        query = aggregate_query(
+            db,
+            {label: metric for label, metric in metrics.items() if metric in names},
+            dimensions,
+            filters=filters,
+            start_date=start_date,
+            end_date=end_date,
+            source=source,
+        )
+        if source == "rollup":
+            # Rollup rows also exist for days with only returns
+            query = query.having(rollup.rollup_measure("item_count") > 0)
+        parts.append((source, names, query.subquery()))
+
+    # Entities are defined by the sales side; returns only ride along
+    parts.sort(key=lambda part: part[0] == "returns")
+    base_source, _, base = parts[0]
+    columns = [base.c[label] for label in dimensions]
+    for label, metric in metrics.items():
+        for _, names, part in parts:
+            if metric in names:
+                column = part.c[label]
+                if part is not base:
+                    column = func.coalesce(column, 0).label(label)
+                columns.append(column)
+
+    query = db.query(*columns).select_from(base)
+    for _, _, part in parts[1:]:
+        query = query.outerjoin(
+            part, and_(*[part.c[label] == base.c[label] for label in dimensions])
+        )
+    return query.subquery()
+
+
+def total(
+    db: Session,
+    metric: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+):
+    """Ungrouped value of a single metric over the range."""
+    return aggregate_query(
+        db, {"value": metric}, start_date=start_date, end_date=end_date
+    ).scalar()
+
+
+def entity_table(
+    db: Session,
+    metrics: Dict[str, str],
+    entity: Dict[str, str],
+    tops: Dict[str, str],
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    rank_by: str = "total_sales",
+    sort_by: Optional[str] = None,
+    descending: bool = True,
+    limit: Optional[int] = None,
+) -> Query:
+    """
+    One row per entity with its metrics, the key of its top member along each
+    of `tops` (ranked by the `rank_by` metric label) and "grand_total", the sum
+    of `rank_by` over all entities. Rows are ordered by the `sort_by` label.
+
+    Without a limit the sales fact is scanned once: GROUPING SETS aggregate
+    the entity and every (entity, top dimension) pair in a single pass into a
+    CTE, and ROW_NUMBER picks the tops from it. With a limit, the entities are
+    aggregated, sorted and cut first, and the tops are only computed for the
+    entities kept. Metrics from other sources (returns) are LEFT JOINed on the
+    entity keys, defaulting to 0.
+    """
+    for label in (rank_by, sort_by):
+        if label is not None and label not in metrics:
+            raise ValueError(f"Invalid sort metric. Must be one of: {list(metrics)}")
+
+    if limit is None:
+        query, sort_columns = _entity_table_one_pass(
+            db, metrics, entity, tops, start_date, end_date, rank_by
+        )
+    else:
+        query, sort_columns = _entity_table_page(
+            db,
+            metrics,
+            entity,
+            tops,
+            start_date,
+            end_date,
+            rank_by,
+            sort_by,
+            descending,
+            limit,
+        )
+    if sort_by is not None:
+        column = sort_columns[sort_by]
+        query = query.order_by(desc(column) if descending else column)
+    return query
+
+
+def _metric_sources(
+    db: Session, metrics: Dict[str, str], entity: Dict[str, str], rank_by: str
+):
+    by_source = sources_for(db, list(metrics.values()), list(entity.values()))
+    main = next(name for name, names in by_source.items() if metrics[rank_by] in names)
+    return main, by_source
+
+
+def _other_source_parts(
+    db: Session,
+    metrics: Dict[str, str],
+    entity: Dict[str, str],
+    by_source: Dict[str, List[str]],
+    main: str,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    filters: Optional[Dict[str, Any]] = None,
+):
+    """Per-entity subqueries of the metrics that live outside the main source."""
+    parts = {}
+    for label, metric in metrics.items():
+        if metric in by_source[main]:
+            continue
+        source = next(name for name, names in by_source.items() if metric in names)
+        parts[label] = aggregate_query(
+            db,
+            {label: metric},
+            entity,
+            filters=filters,
+            start_date=start_date,
+            end_date=end_date,
+            source=source,
+        ).subquery()
+    return parts
+
+
+def _top_per_entity(
+    db: Session, rows, entity: Dict[str, str], label: str, rank_by: str
+):
+    """The `label` value of the highest `rank_by` row of every entity."""
+    entity_columns = [rows.c[name] for name in entity]
+    ranked = (
+        db.query(
+            *entity_columns,
+            rows.c[label],
+            func.row_number()
+            .over(partition_by=entity_columns, order_by=desc(rows.c[rank_by]))
+            .label("position"),
+        )
+        .filter(rows.c[label].isnot(None))
+        .subquery()
+    )
+    return (
+        db.query(*(ranked.c[name] for name in entity), ranked.c[label])
+        .filter(ranked.c.position == 1)
+        .subquery()
+    )
+
+
+def _join_on_entity(query: Query, part, base, entity: Dict[str, str]) -> Query:
+    return query.outerjoin(
+        part, and_(*[part.c[label] == base.c[label] for label in entity])
+    )
+
+
+def _entity_table_one_pass(db, metrics, entity, tops, start_date, end_date, rank_by):
+    main, by_source = _metric_sources(db, metrics, entity, rank_by)
+    entity_dims = list(entity.values())
+
+    keys = [dimension_key(dim, main) for dim in entity_dims]
+    top_keys = [dimension_key(dim, main) for dim in tops.values()]
+    columns = [key.label(label) for label, key in zip(entity, keys)]
+    columns += [key.label(label) for label, key in zip(tops, top_keys)]
+    # grouping() is 1 when the column is rolled up in a row's grouping set
+    columns += [
+        func.grouping(key).label(f"{label}_grouped")
+        for label, key in zip(tops, top_keys)
+    ]
+    for label, metric in metrics.items():
+        if metric in by_source[main]:
+            columns.append(metric_column(metric, main, entity_dims).label(label))
+
+    conditions = []
+    if start_date and end_date:
+        conditions.append(date_field(main).between(start_date, end_date))
+    grouping_sets = func.grouping_sets(
+        tuple_(*keys), *(tuple_(*keys, top_key) for top_key in top_keys)
+    )
+    query = select_from_source(db, main, columns, conditions, [grouping_sets])
+    if main == "rollup":
+        # Rollup rows also exist for days with only returns
+        query = query.having(rollup.rollup_measure("item_count") > 0)
+    facts = query.cte("facts")
+
+    entity_rows = (
+        db.query(
+            *(facts.c[label] for label in entity),
+            *(
+                facts.c[label]
+                for label, metric in metrics.items()
+                if metric in by_source[main]
+            ),
+            func.sum(facts.c[rank_by]).over().label("grand_total"),
+        )
+        .filter(*(facts.c[f"{label}_grouped"] == 1 for label in tops))
+        .subquery()
+    )
+
+    query_columns = [entity_rows.c[label] for label in entity]
+    joins = []
+    for label in tops:
+        top_facts = db.query(facts).filter(facts.c[f"{label}_grouped"] == 0).subquery()
+        top = _top_per_entity(db, top_facts, entity, label, rank_by)
+        query_columns.append(top.c[label])
+        joins.append(top)
+
+    parts = _other_source_parts(
+        db, metrics, entity, by_source, main, start_date, end_date
+    )
+    sort_columns = {}
+    for label in metrics:
+        if label in parts:
+            column = func.coalesce(parts[label].c[label], 0)
+            joins.append(parts[label])
+        else:
+            column = entity_rows.c[label]
+        sort_columns[label] = column
+        query_columns.append(column.label(label))
+    query_columns.append(entity_rows.c.grand_total)
+
+    query = db.query(*query_columns).select_from(entity_rows)
+    for part in joins:
+        query = _join_on_entity(query, part, entity_rows, entity)
+    return query, sort_columns
+
+
+def _entity_table_page(
+    db, metrics, entity, tops, start_date, end_date, rank_by, sort_by, descending, limit
+):
+    main, by_source = _metric_sources(db, metrics, entity, rank_by)
+    if len(entity) != 1:
+        raise ValueError("A limited entity table needs a single entity dimension")
+    ((entity_label, entity_dim),) = entity.items()
+
+    main_rows = aggregate_query(
+        db,
+        {
+            label: metric
+            for label, metric in metrics.items()
+            if metric in by_source[main]
+        },
+        entity,
+        start_date=start_date,
+        end_date=end_date,
+        source=main,
+    )
+    if main == "rollup":
+        # Rollup rows also exist for days with only returns
+        main_rows = main_rows.having(rollup.rollup_measure("item_count") > 0)
+    main_rows = main_rows.subquery()
+    parts = _other_source_parts(
+        db, metrics, entity, by_source, main, start_date, end_date
+    )
+
+    columns = {label: main_rows.c[label] for label in entity}
+    for label in metrics:
+        if label in parts:
+            columns[label] = func.coalesce(parts[label].c[label], 0).label(label)
+        else:
+            columns[label] = main_rows.c[label]
+    # Window functions run before LIMIT, so this still sums every entity
+    grand_total = func.sum(main_rows.c[rank_by]).over().label("grand_total")
+    page = db.query(*columns.values(), grand_total).select_from(main_rows)
+    for part in parts.values():
+        page = _join_on_entity(page, part, main_rows, entity)
+    if sort_by is not None:
+        column = columns[sort_by]
+        page = page.order_by(desc(column) if descending else column)
+    page = page.limit(limit).cte("page")
+
+    # Tops are only aggregated for the entities on the page
+    page_keys = select([page.c[entity_label]])
+    query_columns = [page.c[entity_label]]
+    joins = []
+    for label, dim in tops.items():
+        rows = aggregate_query(
+            db,
+            {rank_by: metrics[rank_by]},
+            {entity_label: entity_dim, label: dim},
+            filters={entity_dim: page_keys},
+            start_date=start_date,
+            end_date=end_date,
+        ).subquery()
+        top = _top_per_entity(db, rows, entity, label, rank_by)
+        query_columns.append(top.c[label])
+        joins.append(top)
+    query_columns += [page.c[label] for label in metrics]
+    query_columns.append(page.c.grand_total)
+
+    query = db.query(*query_columns).select_from(page)
+    for part in joins:
+        query = _join_on_entity(query, part, page, entity)
+    return query, {label: page.c[label] for label in metrics}
@@ -1,13 +1,14 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, asc, literal, distinct
-from models.StoreModel import Store
-from models.OrderItemsModel import OrderItem
-from models.OrderModel import Order
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, literal
 from models.ProductModel import Product  # Assuming Product is the model
-from models.ReturnsModel import Return as Returns
+from crud.v2 import metrics
+from crud.v2.cube import CubeData, analytics_cube
 from schemas.ProductSchema import ProductCreate, ProductUpdate
 from typing import List, Optional
 from datetime import datetime, timezone
+from helpers.dimension_resolver import dimension_resolver
+from helpers.serialization import plain_rows
 
 
 class ProductCrud:
@@ -16,6 +17,7 @@ class ProductCrud:
         db_product = Product(**product.dict())
         db.add(db_product)
         db.commit()
+        dimension_resolver.invalidate()
         db.refresh(db_product)
         return db_product
 
@@ -36,6 +38,7 @@ class ProductCrud:
             for key, value in product.dict(exclude_unset=True).items():
                 setattr(db_product, key, value)
             db.commit()
+            dimension_resolver.invalidate()
             db.refresh(db_product)
             return db_product
         return None
@@ -46,6 +49,7 @@ class ProductCrud:
         if db_product:
             db.delete(db_product)
             db.commit()
+            dimension_resolver.invalidate()
             return True
         return False
 
@@ -59,84 +63,81 @@ class ProductCrud:
     ) -> List[Product]:
         end_date = end_date or datetime.now(timezone.utc)
 
-        metric_expr_map = {
-            "Total Sales": func.sum(OrderItem.price * OrderItem.quantity),
-            "Total Orders": func.count(OrderItem.order_item_id),
-            "Total Returns": func.count(Returns.return_id),
-            "Total Profit": func.sum(
-                (OrderItem.price - Product.cost) * OrderItem.quantity
-            ),
-        }
-
-        if metric not in metric_expr_map:
+        if metric not in metrics.METRICS:
             raise ValueError(f"Unsupported metric: {metric}")
 
-        metric_expr = metric_expr_map[metric]
-
-        # Add literal column for identifying the metric in frontend
-        metric_key_literal = literal(metric).label("metric_key")
-
-        if metric == "Total Returns":
-            query = (
-                db.query(
-                    Product.product_id,
-                    Product.name.label("product_name"),
-                    Product.brand.label("brand_name"),
-                    Product.price,
-                    Product.cost,
-                    Product.category,
-                    func.count(Returns.return_id).label("metric_value"),
-                    metric_key_literal,
-                )
-                .join(OrderItem, OrderItem.product_id == Product.product_id)
-                .join(Order, Order.order_id == OrderItem.order_id)
-                .join(Returns, Returns.order_item_id == OrderItem.order_item_id)
-                .filter(Returns.return_date.between(start_date, end_date))
+        cube = analytics_cube.serving(db, [metric], ["product"])
+        if cube is not None:
+            return ProductCrud._top_products_from_cube(
+                cube, metric, start_date, end_date, n
             )
-        else:
-            query = (
-                db.query(
-                    Product.product_id,
-                    Product.name.label("product_name"),
-                    Product.brand.label("brand_name"),
-                    Product.price,
-                    Product.cost,
-                    Product.category,
-                    metric_expr.label("metric_value"),
-                    metric_key_literal,
-                )
-                .join(OrderItem, OrderItem.product_id == Product.product_id)
-                .join(Order, Order.order_id == OrderItem.order_id)
-                .filter(Order.order_date.between(start_date, end_date))
+
+        ranked = (
+            metrics.aggregate_query(
+                db,
+                {"metric_value": metric},
+                {"product_id": "product"},
+                start_date=start_date,
+                end_date=end_date,
             )
+            .order_by(desc("metric_value"))
+            .limit(n)
+            .subquery()
+        )
 
-        result = (
-            query.group_by(
+        return plain_rows(
+            db.query(
                 Product.product_id,
-                Product.name,
-                Product.brand,
+                Product.name.label("product_name"),
+                Product.brand.label("brand_name"),
                 Product.price,
                 Product.cost,
                 Product.category,
-                # Remove metric_key_literal from GROUP BY since it's a constant
+                ranked.c.metric_value,
+                # Add literal column for identifying the metric in frontend
+                literal(metric).label("metric_key"),
             )
-            .order_by(desc("metric_value"))
-            .limit(n)
+            .select_from(ranked)
+            .join(Product, Product.product_id == ranked.c.product_id)
+            .order_by(desc(ranked.c.metric_value))
             .all()
         )
-        return [
-            {
-                "product_id": row.product_id,
-                "product_name": row.product_name,
-                "brand_name": row.brand_name,
-                "price": row.price,
-                "cost": row.cost,
-                "category": row.category,
-                "metric_value": row.metric_value,
-                "metric_key": row.metric_key,
-            }
-            for row in result
-        ]
+
+    @staticmethod
+    def _top_products_from_cube(
+        cube: CubeData,
+        metric: str,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        n: int,
+    ) -> List[dict]:
+        ranked = sorted(
+            cube.aggregate(
+                {"metric_value": metric},
+                {"product_id": "product"},
+                start_date=start_date,
+                end_date=end_date,
+            ),
+            key=lambda row: row.metric_value,
+            reverse=True,
+        )[:n]
+
+        results = []
+        for row in ranked:
+            product = cube.members["product"][row.product_id]
+            results.append(
+                {
+                    "product_id": product.product_id,
+                    "product_name": product.name,
+                    "brand_name": product.brand,
+                    "price": product.price,
+                    "cost": product.cost,
+                    "category": product.category,
+                    "metric_value": row.metric_value,
+                    "metric_key": metric,
+                }
+            )
+        return results
 
     @staticmethod
     def get_unique_product_names(
@@ -163,113 +164,21 @@ class ProductCrud:
         limit: Optional[int],
         sort: str,
     ) -> List[dict]:
-        # First get the total sales across all brands for percentage calculation
-        total_sales_result = (
-            db.query(
-                func.sum(OrderItem.price * OrderItem.quantity).label("total_sales")
-            )
-            .join(Order, Order.order_id == OrderItem.order_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .first()
-        )
-
-        total_sales = total_sales_result[0] or 0  # Handle None case
-
-        # Get base brand data with aggregations
-        brand_data = (
-            db.query(
-                Product.brand,
-                func.sum(OrderItem.price * OrderItem.quantity).label("total_sales"),
-                func.sum((OrderItem.price - Product.cost) * OrderItem.quantity).label(
-                    "total_profit"
-                ),
-                func.count(distinct(Order.order_id)).label("total_orders"),
-            )
-            .select_from(OrderItem)
-            .join(Order, Order.order_id == OrderItem.order_id)
-            .join(Product, Product.product_id == OrderItem.product_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .group_by(Product.brand)
-            .subquery()
-        )
-
-        # Get top product per brand
-        top_products = (
-            db.query(
-                Product.brand,
-                Product.name.label("product_name"),
-                func.sum(OrderItem.price * OrderItem.quantity).label("product_sales"),
-            )
-            .join(OrderItem, OrderItem.product_id == Product.product_id)
-            .join(Order, Order.order_id == OrderItem.order_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .group_by(Product.brand, Product.name)
-            .subquery()
-        )
-
-        top_product_per_brand = (
-            db.query(top_products.c.brand, top_products.c.product_name)
-            .distinct(top_products.c.brand)
-            .order_by(top_products.c.brand, desc(top_products.c.product_sales))
-            .subquery()
-        )
-
-        # Get top region per brand
-        top_regions = (
-            db.query(
-                Product.brand,
-                Store.region,
-                func.sum(OrderItem.price * OrderItem.quantity).label("region_sales"),
-            )
-            .join(OrderItem, OrderItem.product_id == Product.product_id)
-            .join(Order, Order.order_id == OrderItem.order_id)
-            .join(Store, Store.store_id == Order.store_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .group_by(Product.brand, Store.region)
-            .subquery()
-        )
-
-        top_region_per_brand = (
-            db.query(top_regions.c.brand, top_regions.c.region)
-            .distinct(top_regions.c.brand)
-            .order_by(top_regions.c.brand, desc(top_regions.c.region_sales))
-            .subquery()
-        )
-
-        # Get returns data per brand
-        returns_data = (
-            db.query(
-                Product.brand, func.count(Returns.return_id).label("total_returns")
-            )
-            .join(OrderItem, OrderItem.product_id == Product.product_id)
-            .join(Returns, Returns.order_item_id == OrderItem.order_item_id)
-            .filter(Returns.return_date.between(start_date, end_date))
-            .group_by(Product.brand)
-            .subquery()
-        )
-
-        # Combine all data
-        final_query = (
-            db.query(
-                brand_data.c.brand,
-                top_product_per_brand.c.product_name.label("top_product"),
-                top_region_per_brand.c.region.label("top_region"),
-                brand_data.c.total_sales,
-                brand_data.c.total_profit,
-                func.coalesce(returns_data.c.total_returns, 0).label("total_returns"),
-                brand_data.c.total_orders,
-            )
-            .outerjoin(
-                top_product_per_brand,
-                top_product_per_brand.c.brand == brand_data.c.brand,
-            )
-            .outerjoin(
-                top_region_per_brand, top_region_per_brand.c.brand == brand_data.c.brand
-            )
-            .outerjoin(returns_data, returns_data.c.brand == brand_data.c.brand)
-        )
-
-        results = final_query.all()
+        # Brands with their top product and region, sorted and limited in the
+        # database; the grand total gives the contribution percentage.
+        results = metrics.entity_table(
+            db,
+            metrics.TABLE_METRICS,
+            {"brand": "brand"},
+            {"top_product": "product", "top_region": "region"},
+            start_date,
+            end_date,
+            sort_by=ProductCrud._sort_label(metric),
+            descending=sort != "asc",
+            limit=limit,
+        ).all()
+        total_sales = (results[0].grand_total if results else None) or 0
+        product_name = dimension_resolver.resolver(db, "product")
 
         # Format the results with percentage calculations
         formatted_results = []
@@ -280,10 +189,14 @@ class ProductCrud:
 
             formatted_results.append(
                 {
-                    "brand_name": row.brand.value
-                    if hasattr(row.brand, "value")
-                    else row.brand,  # Handle enum if needed
-                    "top_product": row.top_product,
+                    "brand_name": (
+                        row.brand.value if hasattr(row.brand, "value") else row.brand
+                    ),  # Handle enum if needed
+                    "top_product": (
+                        product_name(row.top_product)
+                        if row.top_product is not None
+                        else None
+                    ),
                     "top_region": row.top_region,
                     "total_sales": row.total_sales,
                     "total_profit": row.total_profit,
@@ -304,107 +217,10 @@ class ProductCrud:
         limit: Optional[int],
         sort: str,
     ) -> List[dict]:
-        total_sales_result = (
-            db.query(
-                func.sum(OrderItem.price * OrderItem.quantity).label("total_sales")
-            )
-            .join(Order, Order.order_id == OrderItem.order_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .first()
-        )
-
-        total_sales = total_sales_result[0] or 0  # Handle None case
-
-        # Get base product data with aggregations
-        product_data = (
-            db.query(
-                Product.product_id,
-                Product.name.label("product_name"),
-                Product.category,
-                Product.brand,
-                Product.cost,
-                Product.stock_quantity,
-                func.sum(OrderItem.price * OrderItem.quantity).label("total_sales"),
-                func.sum((OrderItem.price - Product.cost) * OrderItem.quantity).label(
-                    "total_profit"
-                ),
-                func.count(distinct(Order.order_id)).label("total_orders"),
-            )
-            .select_from(OrderItem)
-            .join(Order, Order.order_id == OrderItem.order_id)
-            .join(Product, Product.product_id == OrderItem.product_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .group_by(
-                Product.product_id,
-                Product.name,
-                Product.category,
-                Product.brand,
-                Product.cost,
-                Product.stock_quantity,
-            )
-            .subquery()
-        )
-
-        # Get top region per product
-        top_regions = (
-            db.query(
-                Product.product_id,
-                Store.region,
-                func.sum(OrderItem.price * OrderItem.quantity).label("region_sales"),
-            )
-            .join(OrderItem, OrderItem.product_id == Product.product_id)
-            .join(Order, Order.order_id == OrderItem.order_id)
-            .join(Store, Store.store_id == Order.store_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .group_by(Product.product_id, Store.region)
-            .subquery()
-        )
-
-        top_region_per_product = (
-            db.query(top_regions.c.product_id, top_regions.c.region)
-            .distinct(top_regions.c.product_id)
-            .order_by(top_regions.c.product_id, desc(top_regions.c.region_sales))
-            .subquery()
-        )
-
-        # Get returns data per product
-        returns_data = (
-            db.query(
-                Product.product_id, func.count(Returns.return_id).label("total_returns")
-            )
-            .join(OrderItem, OrderItem.product_id == Product.product_id)
-            .join(Returns, Returns.order_item_id == OrderItem.order_item_id)
-            .filter(Returns.return_date.between(start_date, end_date))
-            .group_by(Product.product_id)
-            .subquery()
-        )
-
-        # Combine all data
-        final_query = (
-            db.query(
-                product_data.c.product_id,
-                product_data.c.product_name,
-                product_data.c.category,
-                product_data.c.brand,
-                product_data.c.cost,
-                product_data.c.stock_quantity,
-                product_data.c.total_sales,
-                product_data.c.total_profit,
-                func.coalesce(returns_data.c.total_returns, 0).label("total_returns"),
-                product_data.c.total_orders,
-                top_region_per_product.c.region.label("top_region"),
-            )
-            .outerjoin(
-                top_region_per_product,
-                top_region_per_product.c.product_id == product_data.c.product_id,
-            )
-            .outerjoin(
-                returns_data, returns_data.c.product_id == product_data.c.product_id
-            )
+        total_sales, results = ProductCrud._query_product_table(
+            db, start_date, end_date, metric, limit, sort
         )
 
-        results = final_query.all()
-
         # Format the results with percentage calculations
         formatted_results = []
         for row in results:
@@ -416,12 +232,14 @@ class ProductCrud:
                 {
                     "product_id": row.product_id,
                     "product_name": row.product_name,
-                    "category": row.category.value
-                    if hasattr(row.category, "value")
-                    else row.category,
-                    "brand": row.brand.value
-                    if hasattr(row.brand, "value")
-                    else row.brand,
+                    "category": (
+                        row.category.value
+                        if hasattr(row.category, "value")
+                        else row.category
+                    ),
+                    "brand": (
+                        row.brand.value if hasattr(row.brand, "value") else row.brand
+                    ),
                     "cost": row.cost,
                     "stock_quantity": row.stock_quantity,
                     "total_sales": row.total_sales,
@@ -434,3 +252,139 @@ class ProductCrud:
             )
 
         return formatted_results
+
+    @staticmethod
+    def _sort_label(metric: str) -> str:
+        """Column of the brand/product tables that `metric` sorts on."""
+        for label, name in metrics.TABLE_METRICS.items():
+            if name == metric:
+                return label
+        raise ValueError(
+            f"Unsupported metric: {metric}. Must be one of: {list(metrics.TABLE_METRICS.values())}"
+        )
+
+    @staticmethod
+    def _query_product_table(
+        db: Session,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        metric: str = "Total Sales",
+        limit: Optional[int] = None,
+        sort: str = "desc",
+    ):
+        cube = analytics_cube.serving(db, metrics.TABLE_METRICS.values(), ["product"])
+        if cube is not None:
+            results = cube.entity_table(
+                metrics.TABLE_METRICS,
+                {"product_id": "product"},
+                {"top_region": "region"},
+                start_date,
+                end_date,
+                sort_by=ProductCrud._sort_label(metric),
+                descending=sort != "asc",
+                limit=limit,
+                attributes={
+                    "product_name": Product.name,
+                    "category": Product.category,
+                    "brand": Product.brand,
+                    "cost": Product.cost,
+                    "stock_quantity": Product.stock_quantity,
+                },
+            )
+            total_sales = (results[0].grand_total if results else None) or 0
+            return total_sales, results
+
+        # Products with their top region, sorted and limited in the database;
+        # the top region is only computed for the products returned.
+        product_data = metrics.entity_table(
+            db,
+            metrics.TABLE_METRICS,
+            {"product_id": "product"},
+            {"top_region": "region"},
+            start_date,
+            end_date,
+            sort_by=ProductCrud._sort_label(metric),
+            descending=sort != "asc",
+            limit=limit,
+        ).subquery()
+
+        sort_column = product_data.c[ProductCrud._sort_label(metric)]
+        final_query = (
+            db.query(
+                product_data.c.product_id,
+                Product.name.label("product_name"),
+                Product.category,
+                Product.brand,
+                Product.cost,
+                Product.stock_quantity,
+                product_data.c.total_sales,
+                product_data.c.total_profit,
+                product_data.c.total_returns,
+                product_data.c.total_orders,
+                product_data.c.top_region,
+                product_data.c.grand_total,
+            )
+            .select_from(product_data)
+            .join(Product, Product.product_id == product_data.c.product_id)
+            .order_by(sort_column.asc() if sort == "asc" else desc(sort_column))
+        )
+        results = final_query.all()
+
+        total_sales = (results[0].grand_total if results else None) or 0
+        return total_sales, results
+
+    # --- Async entry points --- #
+    # The queries above are synchronous ORM code; run_sync executes them on the
+    # AsyncSession's connection without blocking the event loop.
+
+    @staticmethod
+    async def get_top_products_by_metric_async(
+        db: AsyncSession,
+        metric: str = "Total Sales",
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        n: int = 10,
+    ) -> List[Product]:
+        return await db.run_sync(
+            ProductCrud.get_top_products_by_metric,
+            metric=metric,
+            start_date=start_date,
+            end_date=end_date,
+            n=n,
+        )
+
+    @staticmethod
+    async def get_brand_table_data_async(
+        db: AsyncSession,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        metric: str,
+        limit: Optional[int],
+        sort: str,
+    ) -> List[dict]:
+        return await db.run_sync(
+            ProductCrud.get_brand_table_data,
+            start_date=start_date,
+            end_date=end_date,
+            metric=metric,
+            limit=limit,
+            sort=sort,
+        )
+
+    @staticmethod
+    async def get_product_table_data_async(
+        db: AsyncSession,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        metric: str,
+        limit: Optional[int],
+        sort: str,
+    ) -> List[dict]:
+        return await db.run_sync(
+            ProductCrud.get_product_table_data,
+            start_date=start_date,
+            end_date=end_date,
+            metric=metric,
+            limit=limit,
+            sort=sort,
+        )
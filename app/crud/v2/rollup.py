@@ -0,0 +1,80 @@
+import os
+from typing import Iterable, Optional
+from sqlalchemy import func, case, inspect
+from sqlalchemy.orm import Session
+from models.DailySalesRollupModel import DailySalesRollup
+from db.instrumentation import off_budget
+
+USE_DAILY_ROLLUP = os.getenv("USE_DAILY_ROLLUP", "true").lower() in ("1", "true", "yes")
+
+# Rollup column for each measure, plus the dimensions that break it. A measure
+# is unusable when the request groups or filters on one of its blocking
+# dimensions; `product_order_count` additionally needs product grain.
+ROLLUP_MEASURES = {
+    "sales": {"column": DailySalesRollup.sales, "blocked_by": set()},
+    "profit": {"column": DailySalesRollup.profit, "blocked_by": set()},
+    "quantity": {"column": DailySalesRollup.quantity, "blocked_by": set()},
+    "item_count": {"column": DailySalesRollup.item_count, "blocked_by": set()},
+    "return_count": {"column": DailySalesRollup.return_count, "blocked_by": set()},
+    "refund_amount": {"column": DailySalesRollup.refund_amount, "blocked_by": set()},
+    "order_count": {
+        "column": DailySalesRollup.order_count,
+        "blocked_by": {"brand", "product"},
+    },
+    "product_order_count": {
+        "column": DailySalesRollup.product_order_count,
+        "blocked_by": set(),
+        "requires": "product",
+    },
+}
+
+_rollup_table_present: Optional[bool] = None
+
+
+def rollup_available(db: Session) -> bool:
+    """Whether the rollup is enabled and exists in the connected database."""
+    global _rollup_table_present
+    if not USE_DAILY_ROLLUP:
+        return False
+    if _rollup_table_present is None:
+        with off_budget():
+            _rollup_table_present = inspect(db.get_bind()).has_table(
+                DailySalesRollup.__tablename__
+            )
+    return _rollup_table_present
+
+
+def can_answer(
+    measures: Iterable[str],
+    group_by: Iterable[str] = (),
+    filter_by: Iterable[str] = (),
+) -> bool:
+    """Whether every measure can be re-aggregated from the rollup exactly."""
+    group_by = set(group_by)
+    dimensions = group_by | set(filter_by)
+    for name in measures:
+        spec = ROLLUP_MEASURES.get(name)
+        if spec is None or spec["blocked_by"] & dimensions:
+            return False
+        if spec.get("requires") and spec["requires"] not in group_by:
+            return False
+    return True
+
+
+def use_rollup(
+    db: Session,
+    measures: Iterable[str],
+    group_by: Iterable[str] = (),
+    filter_by: Iterable[str] = (),
+) -> bool:
+    return can_answer(measures, group_by, filter_by) and rollup_available(db)
+
+
+def rollup_measure(name: str):
+    """SUM of a rollup measure."""
+    return func.sum(ROLLUP_MEASURES[name]["column"])
+
+
+def conditional_rollup_measure(name: str, condition):
+    """SUM of a rollup measure restricted to rows matching `condition`."""
+    return func.sum(case([(condition, ROLLUP_MEASURES[name]["column"])]))
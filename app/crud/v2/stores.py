@@ -1,13 +1,20 @@
 from datetime import datetime, timezone
-from typing import Optional, List, Dict, Any
+from typing import Optional, List
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, literal, and_, distinct
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, literal, select
 from models.StoreModel import Store
 from schemas.StoreSchema import StoreCreate, StoreUpdate
+from models.ProductModel import Product
 from models.OrderModel import Order
 from models.OrderItemsModel import OrderItem
 from models.ReturnsModel import Return as Returns
-from models.ProductModel import Product
+from models.DailySalesRollupModel import DailySalesRollup
+from crud.v2 import metrics
+from crud.v2.cube import CubeData, analytics_cube
+from crud.v2.first_purchase import recompute_first_purchases
+from helpers.dimension_resolver import dimension_resolver
+from helpers.serialization import plain_rows
 import uuid
 
 
@@ -27,6 +34,7 @@ class StoreCrud:
         )
         db.add(db_store)
         db.commit()
+        dimension_resolver.invalidate()
         db.refresh(db_store)
         return db_store
 
@@ -41,6 +49,7 @@ class StoreCrud:
             for key, value in store.dict(exclude_unset=True).items():
                 setattr(db_store, key, value)
             db.commit()
+            dimension_resolver.invalidate()
             db.refresh(db_store)
         return db_store
 
@@ -48,8 +57,30 @@ class StoreCrud:
     def delete_store(db: Session, store_id: str) -> bool:
         db_store = db.query(Store).filter(Store.store_id == store_id).first()
         if db_store:
+            # order_items and returns lost their foreign keys to orders when
+            # they were partitioned (migration 0002), and the rollup and first
+            # purchases never had any: remove the store's rows from each in
+            # this transaction so no metric keeps counting them.
+            customer_ids = [
+                customer_id
+                for (customer_id,) in db.query(Order.customer_id)
+                .filter(Order.store_id == db_store.store_id)
+                .distinct()
+            ]
+            for model, store_column in (
+                (Returns, Returns.store_id),
+                (OrderItem, OrderItem.store_id),
+                (Order, Order.store_id),
+                (DailySalesRollup, DailySalesRollup.store_id),
+            ):
+                db.query(model).filter(store_column == db_store.store_id).delete(
+                    synchronize_session=False
+                )
+            # Their first purchases in every scope may have been at this store
+            recompute_first_purchases(db, customer_ids)
             db.delete(db_store)
             db.commit()
+            dimension_resolver.invalidate()
             return True
         return False
 
@@ -63,20 +94,43 @@ class StoreCrud:
     ) -> List[dict]:
         end_date = end_date or datetime.now(timezone.utc)
 
-        metric_expr_map = {
-            "Total Sales": func.sum(OrderItem.price * OrderItem.quantity),
-            "Total Orders": func.count(OrderItem.order_item_id),
-            "Total Returns": func.count(Returns.return_id),
-            "Total Profit": func.sum(
-                (OrderItem.price - Product.cost) * OrderItem.quantity
-            ),
-        }
-
-        if metric not in metric_expr_map:
+        if metric not in metrics.METRICS:
             raise ValueError(f"Unsupported metric: {metric}")
 
-        metric_expr = metric_expr_map[metric]
-        metric_key_literal = literal(metric).label("metric_key")
+        cube = analytics_cube.serving(db, [metric], ["store"])
+        if cube is not None:
+            return StoreCrud._top_stores_from_cube(
+                cube, metric, start_date, end_date, n
+            )
+
+        ranked = (
+            metrics.aggregate_query(
+                db,
+                {"metric_value": metric},
+                {"store_id": "store"},
+                start_date=start_date,
+                end_date=end_date,
+            )
+            .order_by(desc("metric_value"))
+            .limit(n)
+            .subquery()
+        )
+
+        # Best-selling product of each ranked store
+        product_sales = metrics.aggregate_query(
+            db,
+            {"product_sales": "Total Sales"},
+            {"store_id": "store", "product_name": Product.name},
+            filters={"store": select([ranked.c.store_id])},
+            start_date=start_date,
+            end_date=end_date,
+        ).subquery()
+        top_product_per_store = (
+            db.query(product_sales.c.store_id, product_sales.c.product_name)
+            .distinct(product_sales.c.store_id)
+            .order_by(product_sales.c.store_id, desc(product_sales.c.product_sales))
+            .subquery()
+        )
 
         query = (
             db.query(
@@ -85,33 +139,70 @@ class StoreCrud:
                 Store.is_active,
                 Store.manager_name,
                 Store.region,
-                metric_expr.label("metric_value"),
-                metric_key_literal,
-                func.max(Product.name).label("top_product"),
+                ranked.c.metric_value,
+                literal(metric).label("metric_key"),
+                top_product_per_store.c.product_name.label("top_product"),
             )
-            .join(Order, Order.store_id == Store.store_id)
-            .join(OrderItem, OrderItem.order_id == Order.order_id)
-            .join(Product, Product.product_id == OrderItem.product_id)
-            .outerjoin(Returns, Returns.order_item_id == OrderItem.order_item_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .group_by(Store.store_id)
-            .order_by(desc("metric_value"))
-            .limit(n)
+            .select_from(ranked)
+            .join(Store, Store.store_id == ranked.c.store_id)
+            .outerjoin(
+                top_product_per_store,
+                top_product_per_store.c.store_id == ranked.c.store_id,
+            )
+            .order_by(desc(ranked.c.metric_value))
         )
 
-        return [
-            {
-                "store_id": row.store_id,
-                "name": row.name,
-                "is_active": row.is_active,
-                "manager_name": row.manager_name,
-                "region": row.region,
-                "metric_value": row.metric_value,
-                "metric_key": row.metric_key,
-                "top_product": row.top_product,
-            }
-            for row in query.all()
-        ]
+        return plain_rows(query.all())
+
+    @staticmethod
+    def _top_stores_from_cube(
+        cube: CubeData,
+        metric: str,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        n: int,
+    ) -> List[dict]:
+        ranked = sorted(
+            cube.aggregate(
+                {"metric_value": metric},
+                {"store_id": "store"},
+                start_date=start_date,
+                end_date=end_date,
+            ),
+            key=lambda row: row.metric_value,
+            reverse=True,
+        )[:n]
+
+        # Best-selling product of each ranked store
+        product_sales = cube.aggregate(
+            {"product_sales": "Total Sales"},
+            {"store_id": "store", "product_name": Product.name},
+            filters={"store": [row.store_id for row in ranked]},
+            start_date=start_date,
+            end_date=end_date,
+        )
+        top_product = {}
+        for row in sorted(
+            product_sales, key=lambda row: row.product_sales, reverse=True
+        ):
+            top_product.setdefault(row.store_id, row.product_name)
+
+        results = []
+        for row in ranked:
+            store = cube.members["store"][row.store_id]
+            results.append(
+                {
+                    "store_id": store.store_id,
+                    "name": store.name,
+                    "is_active": store.is_active,
+                    "manager_name": store.manager_name,
+                    "region": store.region,
+                    "metric_value": row.metric_value,
+                    "metric_key": metric,
+                    "top_product": top_product.get(row.store_id),
+                }
+            )
+        return results
 
     @staticmethod
     def get_unique_regions(db: Session) -> List[str]:
@@ -135,114 +226,9 @@ class StoreCrud:
     def get_region_table_data(
         db: Session, start_date: datetime, end_date: datetime
     ) -> List[dict]:
-        # First get the total sales across all regions for percentage calculation
-        total_sales_result = (
-            db.query(
-                func.sum(OrderItem.price * OrderItem.quantity).label("total_sales")
-            )
-            .join(Order, Order.order_id == OrderItem.order_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .first()
-        )
-
-        total_sales = total_sales_result[0] or 0  # Handle None case
-
-        # Get base region data with aggregations
-        region_data = (
-            db.query(
-                Store.region.label("region_name"),
-                func.sum(OrderItem.price * OrderItem.quantity).label("total_sales"),
-                func.sum((OrderItem.price - Product.cost) * OrderItem.quantity).label(
-                    "total_profit"
-                ),
-                func.count(distinct(Order.order_id)).label("total_orders"),
-            )
-            .select_from(OrderItem)
-            .join(Order, Order.order_id == OrderItem.order_id)
-            .join(Store, Store.store_id == Order.store_id)
-            .join(Product, Product.product_id == OrderItem.product_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .group_by(Store.region)
-            .subquery()
-        )
-
-        # Get top store per region
-        top_stores = (
-            db.query(
-                Store.region.label("region"),
-                Store.name.label("store_name"),
-                func.sum(OrderItem.price * OrderItem.quantity).label("store_sales"),
-            )
-            .join(Order, Order.store_id == Store.store_id)
-            .join(OrderItem, OrderItem.order_id == Order.order_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .group_by(Store.region, Store.name)
-            .subquery()
-        )
-
-        top_store_per_region = (
-            db.query(top_stores.c.region, top_stores.c.store_name)
-            .distinct(top_stores.c.region)
-            .order_by(top_stores.c.region, desc(top_stores.c.store_sales))
-            .subquery()
-        )
-
-        # Get top product per region
-        top_products = (
-            db.query(
-                Store.region.label("region"),
-                Product.name.label("product_name"),
-                func.sum(OrderItem.price * OrderItem.quantity).label("product_sales"),
-            )
-            .join(Order, Order.store_id == Store.store_id)
-            .join(OrderItem, OrderItem.order_id == Order.order_id)
-            .join(Product, Product.product_id == OrderItem.product_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .group_by(Store.region, Product.name)
-            .subquery()
-        )
-
-        top_product_per_region = (
-            db.query(top_products.c.region, top_products.c.product_name)
-            .distinct(top_products.c.region)
-            .order_by(top_products.c.region, desc(top_products.c.product_sales))
-            .subquery()
-        )
-
-        # Get returns data
-        returns_data = (
-            db.query(Store.region, func.count(Returns.return_id).label("total_returns"))
-            .join(OrderItem, OrderItem.order_item_id == Returns.order_item_id)
-            .join(Order, Order.order_id == OrderItem.order_id)
-            .join(Store, Store.store_id == Order.store_id)
-            .filter(Returns.return_date.between(start_date, end_date))
-            .group_by(Store.region)
-            .subquery()
-        )
-
-        # Combine all data
-        final_query = (
-            db.query(
-                region_data.c.region_name,
-                top_store_per_region.c.store_name.label("top_store"),
-                top_product_per_region.c.product_name.label("top_product"),
-                region_data.c.total_sales,
-                region_data.c.total_profit,
-                func.coalesce(returns_data.c.total_returns, 0).label("total_returns"),
-                region_data.c.total_orders,
-            )
-            .outerjoin(
-                top_store_per_region,
-                top_store_per_region.c.region == region_data.c.region_name,
-            )
-            .outerjoin(
-                top_product_per_region,
-                top_product_per_region.c.region == region_data.c.region_name,
-            )
-            .outerjoin(returns_data, returns_data.c.region == region_data.c.region_name)
-        )
-
-        results = final_query.all()
+        total_sales, results = StoreCrud._query_region_table(db, start_date, end_date)
+        store_name = dimension_resolver.resolver(db, "store")
+        product_name = dimension_resolver.resolver(db, "product")
 
         # Format the results with percentage calculations
         formatted_results = []
@@ -254,8 +240,14 @@ class StoreCrud:
             formatted_results.append(
                 {
                     "region_name": row.region_name,
-                    "top_store": row.top_store,
-                    "top_product": row.top_product,
+                    "top_store": (
+                        store_name(row.top_store) if row.top_store is not None else None
+                    ),
+                    "top_product": (
+                        product_name(row.top_product)
+                        if row.top_product is not None
+                        else None
+                    ),
                     "total_sales": float(row.total_sales or 0),
                     "total_profit": float(row.total_profit or 0),
                     "total_returns": float(row.total_returns or 0),
@@ -267,95 +259,32 @@ class StoreCrud:
         return formatted_results
 
     @staticmethod
-    def get_store_table_data(
-        db: Session, start_date: datetime, end_date: datetime
-    ) -> List[dict]:
-        # First get the total sales across all stores for percentage calculation
-        total_sales_result = (
-            db.query(
-                func.sum(OrderItem.price * OrderItem.quantity).label("total_sales")
-            )
-            .join(Order, Order.order_id == OrderItem.order_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .first()
+    def _query_region_table(db: Session, start_date: datetime, end_date: datetime):
+        # Regions, their top store and product and the grand total for the
+        # contribution percentage all come from one scan of the sales facts.
+        table_args = dict(
+            entity={"region_name": "region"},
+            tops={"top_store": "store", "top_product": "product"},
+            start_date=start_date,
+            end_date=end_date,
         )
+        cube = analytics_cube.serving(db, metrics.TABLE_METRICS.values(), ["region"])
+        if cube is not None:
+            results = cube.entity_table(metrics.TABLE_METRICS, **table_args)
+        else:
+            results = metrics.entity_table(
+                db, metrics.TABLE_METRICS, **table_args
+            ).all()
 
-        total_sales = total_sales_result[0] or 0  # Handle None case
-
-        # Get base store data with aggregations
-        store_data = (
-            db.query(
-                Store.store_id,
-                Store.name.label("store_name"),
-                Store.region,
-                func.sum(OrderItem.price * OrderItem.quantity).label("total_sales"),
-                func.sum((OrderItem.price - Product.cost) * OrderItem.quantity).label(
-                    "total_profit"
-                ),
-                func.count(distinct(Order.order_id)).label("total_orders"),
-            )
-            .select_from(OrderItem)
-            .join(Order, Order.order_id == OrderItem.order_id)
-            .join(Store, Store.store_id == Order.store_id)
-            .join(Product, Product.product_id == OrderItem.product_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .group_by(Store.store_id, Store.name, Store.region)
-            .subquery()
-        )
+        total_sales = (results[0].grand_total if results else None) or 0
+        return total_sales, results
 
-        # Get top product per store
-        top_products = (
-            db.query(
-                Order.store_id,
-                Product.name.label("product_name"),
-                func.sum(OrderItem.price * OrderItem.quantity).label("product_sales"),
-            )
-            .join(OrderItem, OrderItem.order_id == Order.order_id)
-            .join(Product, Product.product_id == OrderItem.product_id)
-            .filter(Order.order_date.between(start_date, end_date))
-            .group_by(Order.store_id, Product.name)
-            .subquery()
-        )
-
-        top_product_per_store = (
-            db.query(top_products.c.store_id, top_products.c.product_name)
-            .distinct(top_products.c.store_id)
-            .order_by(top_products.c.store_id, desc(top_products.c.product_sales))
-            .subquery()
-        )
-
-        # Get returns data per store
-        returns_data = (
-            db.query(
-                Order.store_id, func.count(Returns.return_id).label("total_returns")
-            )
-            .join(OrderItem, OrderItem.order_item_id == Returns.order_item_id)
-            .join(Order, Order.order_id == OrderItem.order_id)
-            .filter(Returns.return_date.between(start_date, end_date))
-            .group_by(Order.store_id)
-            .subquery()
-        )
-
-        # Combine all data
-        final_query = (
-            db.query(
-                store_data.c.store_id,
-                store_data.c.store_name,
-                store_data.c.region,
-                top_product_per_store.c.product_name.label("top_product"),
-                store_data.c.total_sales,
-                store_data.c.total_profit,
-                func.coalesce(returns_data.c.total_returns, 0).label("total_returns"),
-                store_data.c.total_orders,
-            )
-            .outerjoin(
-                top_product_per_store,
-                top_product_per_store.c.store_id == store_data.c.store_id,
-            )
-            .outerjoin(returns_data, returns_data.c.store_id == store_data.c.store_id)
-        )
-
-        results = final_query.all()
+    @staticmethod
+    def get_store_table_data(
+        db: Session, start_date: datetime, end_date: datetime
+    ) -> List[dict]:
+        total_sales, results = StoreCrud._query_store_table(db, start_date, end_date)
+        product_name = dimension_resolver.resolver(db, "product")
 
         # Format the results with percentage calculations
         formatted_results = []
@@ -369,7 +298,11 @@ class StoreCrud:
                     "store_id": row.store_id,
                     "store_name": row.store_name,
                     "region": row.region,
-                    "top_product": row.top_product,
+                    "top_product": (
+                        product_name(row.top_product)
+                        if row.top_product is not None
+                        else None
+                    ),
                     "total_sales": float(row.total_sales or 0),
                     "total_profit": float(row.total_profit or 0),
                     "total_returns": float(row.total_returns or 0),
@@ -379,3 +312,85 @@ class StoreCrud:
             )
 
         return formatted_results
+
+    @staticmethod
+    def _query_store_table(db: Session, start_date: datetime, end_date: datetime):
+        # Stores, their top product and the grand total for the contribution
+        # percentage all come from one scan of the sales facts.
+        cube = analytics_cube.serving(db, metrics.TABLE_METRICS.values(), ["store"])
+        if cube is not None:
+            results = cube.entity_table(
+                metrics.TABLE_METRICS,
+                {"store_id": "store"},
+                {"top_product": "product"},
+                start_date,
+                end_date,
+                attributes={"store_name": Store.name, "region": Store.region},
+            )
+            total_sales = (results[0].grand_total if results else None) or 0
+            return total_sales, results
+
+        store_data = metrics.entity_table(
+            db,
+            metrics.TABLE_METRICS,
+            {"store_id": "store"},
+            {"top_product": "product"},
+            start_date,
+            end_date,
+        ).subquery()
+
+        final_query = (
+            db.query(
+                store_data.c.store_id,
+                Store.name.label("store_name"),
+                Store.region,
+                store_data.c.top_product,
+                store_data.c.total_sales,
+                store_data.c.total_profit,
+                store_data.c.total_returns,
+                store_data.c.total_orders,
+                store_data.c.grand_total,
+            )
+            .select_from(store_data)
+            .join(Store, Store.store_id == store_data.c.store_id)
+        )
+        results = final_query.all()
+
+        total_sales = (results[0].grand_total if results else None) or 0
+        return total_sales, results
+
+    # --- Async entry points --- #
+    # The queries above are synchronous ORM code; run_sync executes them on the
+    # AsyncSession's connection without blocking the event loop.
+
+    @staticmethod
+    async def get_top_stores_by_metric_async(
+        db: AsyncSession,
+        metric: str = "Total Sales",
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        n: int = 10,
+    ) -> List[dict]:
+        return await db.run_sync(
+            StoreCrud.get_top_stores_by_metric,
+            metric=metric,
+            start_date=start_date,
+            end_date=end_date,
+            n=n,
+        )
+
+    @staticmethod
+    async def get_region_table_data_async(
+        db: AsyncSession, start_date: datetime, end_date: datetime
+    ) -> List[dict]:
+        return await db.run_sync(
+            StoreCrud.get_region_table_data, start_date=start_date, end_date=end_date
+        )
+
+    @staticmethod
+    async def get_store_table_data_async(
+        db: AsyncSession, start_date: datetime, end_date: datetime
+    ) -> List[dict]:
+        return await db.run_sync(
+            StoreCrud.get_store_table_data, start_date=start_date, end_date=end_date
+        )
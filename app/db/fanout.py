@@ -0,0 +1,107 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from db.session import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    AsyncSessionLocal,
+    SessionLocal,
+)
+
+# Connections one engine can hand out at once; fan-out never asks for more.
+_POOL_CAPACITY = DB_POOL_SIZE + DB_MAX_OVERFLOW
+# Statements a single request may have in flight at once. 1 disables fan-out
+# and runs every task sequentially on the caller's session.
+KPI_MAX_FANOUT = min(int(os.getenv("KPI_MAX_FANOUT", "3")), _POOL_CAPACITY)
+# Worker threads shared by every request. Keep this at or below the engine's
+# pool_size so fan-out tasks do not queue for connections behind each other.
+KPI_FANOUT_WORKERS = min(int(os.getenv("KPI_FANOUT_WORKERS", "5")), _POOL_CAPACITY)
+
+# Session.info flag: run every task on the caller's session so that they all
+# read the same transaction snapshot.
+SINGLE_SNAPSHOT = "single_snapshot"
+
+_executor = ThreadPoolExecutor(
+    max_workers=KPI_FANOUT_WORKERS, thread_name_prefix="kpi-fanout"
+)
+
+
+def _run_on_own_session(bind, task: Callable[[Session], Any]) -> Any:
+    db = SessionLocal(bind=bind)
+    try:
+        return task(db)
+    finally:
+        db.close()
+
+
+def run_concurrently(
+    db: Session,
+    tasks: Dict[str, Callable[[Session], Any]],
+    max_fanout: int = KPI_MAX_FANOUT,
+) -> Dict[str, Any]:
+    """
+    Run independent read-only tasks and return their results by name.
+
+    Each task receives a Session. With fan-out enabled every task gets its own
+    pooled connection to the caller's database, so the request takes about as long as its slowest
+    statement; at most `max_fanout` of them run at the same time. Tasks see
+    separate snapshots, so only use this for queries that tolerate that.
+
+    The caller's transaction is committed first, returning its connection to
+    the pool: a request holding one connection while waiting for more would
+    deadlock the pool once every connection is held that way.
+    """
+    if max_fanout <= 1 or len(tasks) <= 1 or db.info.get(SINGLE_SNAPSHOT):
+        return {name: task(db) for name, task in tasks.items()}
+    db.commit()
+
+    queue = list(tasks.items())
+    pending = {}
+    results = {}
+    try:
+        while queue or pending:
+            while queue and len(pending) < max_fanout:
+                name, task = queue.pop(0)
+                # Carry the request's context along so its statements are counted
+                context = contextvars.copy_context()
+                future = _executor.submit(
+                    context.run, _run_on_own_session, db.get_bind(), task
+                )
+                pending[future] = name
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[pending.pop(future)] = future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+    return {name: results[name] for name in tasks}
+
+
+async def run_concurrently_async(
+    db: AsyncSession,
+    tasks: Dict[str, Callable[[Session], Any]],
+    max_fanout: int = KPI_MAX_FANOUT,
+) -> Dict[str, Any]:
+    """
+    run_concurrently for async callers: the same synchronous tasks, each on its
+    own AsyncSession via run_sync, gathered on the event loop instead of
+    blocking it on worker threads. Honors SINGLE_SNAPSHOT and releases the
+    caller's connection the same way.
+    """
+    if max_fanout <= 1 or len(tasks) <= 1 or db.info.get(SINGLE_SNAPSHOT):
+        return {name: await db.run_sync(task) for name, task in tasks.items()}
+    await db.commit()
+
+    semaphore = asyncio.Semaphore(max_fanout)
+
+    async def run(task: Callable[[Session], Any]) -> Any:
+        async with semaphore:
+            async with AsyncSessionLocal(bind=db.bind) as session:
+                return await session.run_sync(task)
+
+    results = await asyncio.gather(*(run(task) for task in tasks.values()))
+    return dict(zip(tasks, results))
@@ -0,0 +1,261 @@
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from db.replicas import read_router
+from db.session import pool_stats
+from db.slow_queries import slow_query_log
+
+# Request header that asks for the DB timings as response headers.
+DB_DEBUG_HEADER = os.getenv("DB_DEBUG_HEADER", "X-Debug-DB")
+
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ROW_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+
+
+class RequestStats:
+    """Statements one request issued, across every engine and session."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.statements = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: Optional[str] = None
+        # Statements the route itself is accountable for (see off_budget)
+        self.budgeted: Counter = Counter()
+        self.budget: Optional[int] = None
+        self.slow_queries: List[Dict] = []
+
+    def record(self, statement: str, seconds: float, rows: int):
+        # Fan-out tasks report from worker threads
+        with self._lock:
+            self.statements += 1
+            if not _off_budget.get():
+                self.budgeted[statement] += 1
+            self.seconds += seconds
+            self.rows += rows
+            if seconds >= self.slowest_seconds:
+                self.slowest_seconds, self.slowest_statement = seconds, statement
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "X-DB-Queries": str(self.statements),
+            "X-DB-Time-ms": f"{self.seconds * 1000:.1f}",
+            "X-DB-Rows": str(self.rows),
+            "X-DB-Slowest-ms": f"{self.slowest_seconds * 1000:.1f}",
+        }
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar(
+    "db_request_stats", default=None
+)
+
+
+_off_budget: ContextVar[bool] = ContextVar("db_off_budget", default=False)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+@contextmanager
+def track_request() -> Iterator[RequestStats]:
+    """Count the statements run in this context (and the threads it spawns)."""
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def off_budget() -> Iterator[None]:
+    """
+    Leave the statements run inside out of the request's query budget: the
+    refreshes of process-wide caches, which whichever request comes first pays
+    for. They still count towards the request's totals.
+    """
+    token = _off_budget.set(True)
+    try:
+        yield
+    finally:
+        _off_budget.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.record(statement, elapsed, max(cursor.rowcount or 0, 0))
+    slow = slow_query_log.record(
+        conn.engine, statement, None if executemany else parameters, elapsed
+    )
+    if slow is not None:
+        stats.slow_queries.append(slow)
+
+
+@event.listens_for(Engine, "handle_error")
+def _failed_execute(context):
+    started = (
+        context.connection.info.get("query_started") if context.connection else None
+    )
+    if started:
+        started.pop()
+
+
+def _labels(names: Sequence[str], values: Sequence[str], **extra: str) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    text = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + text + "}" if text else ""
+
+
+class Histogram:
+    """A Prometheus histogram with one series per label set."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts, sum, count]
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        with self._lock:
+            series = self._series.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(
+                (labels, list(counts), total, count)
+                for labels, (counts, total, count) in self._series.items()
+            )
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, hits in zip(self.buckets, counts):
+                cumulative += hits
+                le = _labels(self.labels, labels, le=str(bound))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _labels(self.labels, labels, le="+Inf")
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {count}")
+        return lines
+
+
+REQUEST_QUERIES = Histogram(
+    "db_request_queries",
+    "SQL statements executed per request.",
+    ("route", "method"),
+    QUERY_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    "db_request_seconds",
+    "Time spent executing SQL per request.",
+    ("route", "method"),
+    SECONDS_BUCKETS,
+)
+REQUEST_ROWS = Histogram(
+    "db_request_rows",
+    "Rows returned or affected by SQL per request.",
+    ("route", "method"),
+    ROW_BUCKETS,
+)
+REQUEST_SLOWEST_SECONDS = Histogram(
+    "db_request_slowest_statement_seconds",
+    "Duration of the slowest SQL statement of each request.",
+    ("route", "method"),
+    SECONDS_BUCKETS,
+)
+
+
+def observe_request(route: str, method: str, stats: RequestStats):
+    labels = (route, method)
+    for entry in stats.slow_queries:
+        entry.update(route=route, method=method)
+    REQUEST_QUERIES.observe(labels, stats.statements)
+    REQUEST_DB_SECONDS.observe(labels, stats.seconds)
+    REQUEST_ROWS.observe(labels, stats.rows)
+    REQUEST_SLOWEST_SECONDS.observe(labels, stats.slowest_seconds)
+
+
+def _pool_lines(pools: List[Tuple[Dict[str, str], Dict]]) -> List[str]:
+    """Occupancy gauges and checkout wait histograms of the given pools."""
+    lines = []
+    gauges = {
+        "db_pool_size": ("size", "Configured connections of the pool."),
+        "db_pool_checked_out": ("checked_out", "Connections currently in use."),
+        "db_pool_overflow": ("overflow", "Connections open beyond the pool size."),
+    }
+    for name, (key, help) in gauges.items():
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+        for labels, usage in pools:
+            lines.append(f"{name}{_labels(labels, labels.values())} {usage[key]}")
+
+    name = "db_pool_checkout_timeouts_total"
+    lines += [
+        f"# HELP {name} Checkouts that gave up waiting for a connection.",
+        f"# TYPE {name} counter",
+    ]
+    for labels, usage in pools:
+        lines.append(f"{name}{_labels(labels, labels.values())} {usage['timeouts']}")
+
+    name = "db_pool_checkout_wait_seconds"
+    lines += [
+        f"# HELP {name} Time spent waiting for a pooled connection.",
+        f"# TYPE {name} histogram",
+    ]
+    for labels, usage in pools:
+        for bound, count in usage["wait_histogram"].items():
+            le = _labels(labels, labels.values(), le=bound)
+            lines.append(f"{name}_bucket{le} {count}")
+        plain = _labels(labels, labels.values())
+        lines.append(f"{name}_sum{plain} {usage['wait_seconds_total']}")
+        lines.append(f"{name}_count{plain} {usage['checkouts']}")
+    return lines
+
+
+def render_metrics() -> str:
+    """Everything above plus the connection pools, in the Prometheus text format."""
+    pools = [
+        ({"database": "primary", "pool": kind}, usage)
+        for kind, usage in pool_stats().items()
+    ]
+    for replica in read_router.stats()["replicas"]:
+        for kind in ("sync", "async"):
+            pools.append(({"database": replica["url"], "pool": kind}, replica[kind]))
+
+    lines = []
+    for histogram in (
+        REQUEST_QUERIES,
+        REQUEST_DB_SECONDS,
+        REQUEST_ROWS,
+        REQUEST_SLOWEST_SECONDS,
+    ):
+        lines += histogram.render()
+    lines += _pool_lines(pools)
+    return "\n".join(lines) + "\n"
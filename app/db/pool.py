@@ -0,0 +1,107 @@
+import threading
+import time
+from typing import Any, Dict, Tuple
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Upper bounds (seconds) of the checkout wait histogram.
+CHECKOUT_WAIT_BUCKETS: Tuple[float, ...] = (
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+)
+
+
+class CheckoutStats:
+    """
+    How long callers waited for a pooled connection.
+
+    The wait covers queueing for a free connection, opening a new one when the
+    pool grows, and the pre-ping. A growing tail here with the database idle
+    means the workers outnumber the pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.buckets = [0] * len(CHECKOUT_WAIT_BUCKETS)
+
+    def record(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            for index, bound in enumerate(CHECKOUT_WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.buckets[index] += 1
+                    break
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cumulative, histogram = 0, {}
+            for bound, count in zip(CHECKOUT_WAIT_BUCKETS, self.buckets):
+                cumulative += count
+                histogram[str(bound)] = cumulative
+            histogram["+Inf"] = self.checkouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.wait_seconds,
+                "wait_seconds_max": self.max_wait_seconds,
+                "wait_seconds_avg": (
+                    self.wait_seconds / self.checkouts if self.checkouts else 0.0
+                ),
+                "wait_histogram": histogram,
+            }
+
+
+class _TimedCheckout:
+    """Pool mixin recording every checkout in `checkout_stats`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_stats = CheckoutStats()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.checkout_stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.checkout_stats.record(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting where we were
+        pool = super().recreate()
+        pool.checkout_stats = self.checkout_stats
+        return pool
+
+    def usage(self) -> Dict[str, Any]:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": self.overflow(),
+            **self.checkout_stats.snapshot(),
+        }
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, List
+from fastapi import Depends
+from fastapi.logger import logger
+from db.instrumentation import RequestStats, current_stats
+
+# What happens when a request runs more statements than its route's budget:
+# "off" ignores it, "warn" logs a structured warning, "raise" raises
+# QueryBudgetExceeded (set it in test runs so the offending test fails).
+DB_QUERY_BUDGET_MODE = os.getenv("DB_QUERY_BUDGET_MODE", "off").lower()
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"%\(\w+\)s|\$\d+|\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)"), "(?+)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(statement: str) -> str:
+    """The statement with its literals and placeholders replaced by `?`."""
+    for pattern, replacement in _LITERALS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+def query_budget(statements: int):
+    """
+    Route dependency declaring how many statements one request may run:
+
+        @router.get("/table", dependencies=[query_budget(1)])
+
+    Statements run under off_budget (cache refreshes) are not counted.
+    """
+
+    def declare():
+        stats = current_stats()
+        if stats is not None:
+            stats.budget = statements
+
+    return Depends(declare)
+
+
+def budget_report(stats: RequestStats) -> List[Dict[str, Any]]:
+    """The counted statements grouped by fingerprint, most frequent first."""
+    groups: Dict[str, Dict[str, Any]] = {}
+    for statement, count in stats.budgeted.items():
+        text = fingerprint(statement)
+        group = groups.setdefault(
+            text,
+            {
+                "fingerprint": hashlib.sha1(text.encode()).hexdigest()[:12],
+                "count": 0,
+                "statement": text[:300],
+            },
+        )
+        group["count"] += count
+    return sorted(groups.values(), key=lambda group: -group["count"])
+
+
+def enforce_budget(route: str, method: str, stats: RequestStats):
+    """Warn or raise, per DB_QUERY_BUDGET_MODE, when `stats` is over budget."""
+    if DB_QUERY_BUDGET_MODE == "off" or stats.budget is None:
+        return
+    used = sum(stats.budgeted.values())
+    if used <= stats.budget:
+        return
+    report = {
+        "event": "query_budget_exceeded",
+        "route": route,
+        "method": method,
+        "budget": stats.budget,
+        "statements": used,
+        "fingerprints": budget_report(stats),
+    }
+    if DB_QUERY_BUDGET_MODE == "raise":
+        raise QueryBudgetExceeded(json.dumps(report, indent=2))
+    logger.warning(json.dumps(report))
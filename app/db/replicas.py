@@ -0,0 +1,166 @@
+import itertools
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from fastapi.logger import logger
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from db.session import (
+    AsyncSessionLocal,
+    SessionLocal,
+    async_engine,
+    engine,
+    make_async_engine,
+    make_engine,
+)
+
+# Comma-separated URLs of read replicas for the analytic routes. Empty routes
+# every read to the primary.
+DATABASE_REPLICA_URLS = [
+    url.strip()
+    for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+    if url.strip()
+]
+# Seconds a replica that failed to connect is skipped before being retried.
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+# Seconds after a write on this process during which reads stay on the
+# primary, so a user sees their own change despite replication lag.
+DB_REPLICA_WRITE_GRACE_SECONDS = float(os.getenv("DB_REPLICA_WRITE_GRACE_SECONDS", "5"))
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.engine = make_engine(url)
+        self.async_engine = make_async_engine(url)
+        self.down_until = 0.0
+        self.sessions = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def usage(self) -> Dict[str, Any]:
+        return {
+            "url": self.engine.url.render_as_string(hide_password=True),
+            "up": self.down_until <= time.monotonic(),
+            "sessions": self.sessions,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "sync": self.engine.pool.usage(),
+            "async": self.async_engine.pool.usage(),
+        }
+
+
+class ReplicaRouter:
+    """
+    Picks the engine for read-only analytic sessions.
+
+    Replicas are used round-robin. One that fails to connect is skipped for
+    `retry_seconds`; with none reachable, or right after a write, reads go
+    to the primary.
+    """
+
+    def __init__(
+        self,
+        urls: List[str] = DATABASE_REPLICA_URLS,
+        retry_seconds: float = DB_REPLICA_RETRY_SECONDS,
+        write_grace_seconds: float = DB_REPLICA_WRITE_GRACE_SECONDS,
+    ):
+        self.replicas = [Replica(url) for url in urls]
+        self.retry_seconds = retry_seconds
+        self.write_grace_seconds = write_grace_seconds
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self._primary_until = 0.0
+        self.primary_sessions = 0
+
+    def candidates(self) -> List[Replica]:
+        """Replicas to try, in order, for the next session."""
+        now = time.monotonic()
+        if not self.replicas or now < self._primary_until:
+            return []
+        start = next(self._turn) % len(self.replicas)
+        ordered = self.replicas[start:] + self.replicas[:start]
+        return [replica for replica in ordered if replica.down_until <= now]
+
+    def failed(self, replica: Replica, error: Exception):
+        logger.warning("Read replica unavailable, falling back: %s", error)
+        with self._lock:
+            replica.down_until = time.monotonic() + self.retry_seconds
+            replica.failures += 1
+            replica.last_error = str(error)
+
+    def served(self, replica: Optional[Replica]):
+        with self._lock:
+            if replica is None:
+                self.primary_sessions += 1
+            else:
+                replica.sessions += 1
+
+    def wrote(self):
+        self._primary_until = time.monotonic() + self.write_grace_seconds
+
+    def open_session(self) -> Session:
+        """A connected Session on a healthy replica, else on the primary."""
+        for replica in self.candidates():
+            db = SessionLocal(bind=replica.engine)
+            try:
+                db.connection()
+            except SQLAlchemyError as error:
+                db.close()
+                self.failed(replica, error)
+                continue
+            self.served(replica)
+            return db
+        self.served(None)
+        return SessionLocal(bind=engine)
+
+    async def open_async_session(self):
+        for replica in self.candidates():
+            db = AsyncSessionLocal(bind=replica.async_engine)
+            try:
+                await db.connection()
+            except (SQLAlchemyError, OSError) as error:
+                await db.close()
+                self.failed(replica, error)
+                continue
+            self.served(replica)
+            return db
+        self.served(None)
+        return AsyncSessionLocal(bind=async_engine)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "primary_sessions": self.primary_sessions,
+            "replicas": [replica.usage() for replica in self.replicas],
+        }
+
+
+read_router = ReplicaRouter()
+
+
+@event.listens_for(Session, "after_flush")
+def _note_write(session, flush_context):
+    # Only primary sessions write; keep this process reading from the primary
+    # until the replicas have likely replayed the change.
+    read_router.wrote()
+
+
+def get_read_db():
+    """
+    Session for read-only analytic routes: on a replica when one is
+    configured and reachable, else on the primary. Never write through it.
+    """
+    db = read_router.open_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db():
+    db = await read_router.open_async_session()
+    try:
+        yield db
+    finally:
+        await db.close()
@@ -0,0 +1,177 @@
+import itertools
+import os
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from fastapi.logger import logger
+from psycopg2.extras import UUID_adapter
+from sqlalchemy.engine import Engine
+from db.replicas import read_router
+from db.session import async_engine, engine as primary_engine
+
+# Statements of a request slower than this (ms) are captured; 0 disables.
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "500"))
+# Captured statements kept; the oldest are dropped first.
+DB_SLOW_QUERY_BUFFER = int(os.getenv("DB_SLOW_QUERY_BUFFER", "100"))
+# Re-run captured reads under EXPLAIN (ANALYZE, BUFFERS) to record their plan.
+DB_SLOW_QUERY_EXPLAIN = os.getenv("DB_SLOW_QUERY_EXPLAIN", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Plans waiting to be taken at most; statements beyond that keep no plan.
+DB_SLOW_QUERY_EXPLAIN_BACKLOG = int(os.getenv("DB_SLOW_QUERY_EXPLAIN_BACKLOG", "4"))
+
+EXPLAIN_PREFIX = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+
+
+def _sync_engine_for(engine: Engine) -> Optional[Engine]:
+    """The psycopg2 engine reaching the same database as `engine`."""
+    if not engine.dialect.is_async:
+        return engine
+    if engine is async_engine.sync_engine:
+        return primary_engine
+    for replica in read_router.replicas:
+        if engine is replica.async_engine.sync_engine:
+            return replica.engine
+    return None
+
+
+def _explainable(statement: str) -> bool:
+    return statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "WITH")
+
+
+def _for_psycopg2(value: Any) -> Any:
+    """
+    A captured parameter psycopg2 can bind. asyncpg takes uuid.UUID as is,
+    where psycopg2 has no adapter for it unless one is registered process-wide.
+    """
+    if isinstance(value, uuid.UUID):
+        return UUID_adapter(value)
+    if isinstance(value, dict):
+        return {key: _for_psycopg2(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_for_psycopg2(item) for item in value)
+    return value
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class SlowQueryLog:
+    """
+    Ring buffer of the slowest statements requests ran, with their plans.
+
+    Statements over `threshold_ms` are kept with their SQL, bound parameters
+    and route. Reads are then executed once more under EXPLAIN (ANALYZE,
+    BUFFERS) on a worker thread, on a connection of their own that is rolled
+    back afterwards, so the plan shows what the statement actually did.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = DB_SLOW_QUERY_MS,
+        max_entries: int = DB_SLOW_QUERY_BUFFER,
+        explain: bool = DB_SLOW_QUERY_EXPLAIN,
+        explain_backlog: int = DB_SLOW_QUERY_EXPLAIN_BACKLOG,
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.explain_backlog = explain_backlog
+        self._entries: deque = deque(maxlen=max_entries)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._explaining = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="slow-query-explain"
+        )
+        self.captured = 0
+
+    def record(
+        self, engine: Engine, statement: str, parameters: Any, seconds: float
+    ) -> Optional[Dict[str, Any]]:
+        """Keep the statement if it was slow; returns the new entry, if any."""
+        if not self.threshold_ms or seconds * 1000 < self.threshold_ms:
+            return None
+        entry = {
+            "id": next(self._ids),
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(seconds * 1000, 3),
+            "route": None,
+            "method": None,
+            "statement": statement,
+            "parameters": _jsonable(parameters),
+            "plan": None,
+            "plan_error": None,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self.captured += 1
+            explain_engine = _sync_engine_for(engine) if self.explain else None
+            if (
+                explain_engine is None
+                or parameters is None
+                or not _explainable(statement)
+            ):
+                entry["plan_error"] = "not explained"
+            elif self._explaining >= self.explain_backlog:
+                entry["plan_error"] = "skipped: explain backlog full"
+            else:
+                self._explaining += 1
+                self._executor.submit(
+                    self._explain, explain_engine, entry, statement, parameters
+                )
+        return entry
+
+    def _explain(self, engine: Engine, entry, statement: str, parameters: Any):
+        # A raw DBAPI connection: the EXPLAIN itself stays out of the
+        # instrumentation, and the rollback undoes whatever ANALYZE ran.
+        # Statements captured on asyncpg use the same "format" placeholders
+        # as psycopg2; only their values need adapting.
+        try:
+            connection = engine.raw_connection()
+            try:
+                cursor = connection.cursor()
+                cursor.execute(EXPLAIN_PREFIX + statement, _for_psycopg2(parameters))
+                entry["plan"] = cursor.fetchone()[0]
+                cursor.close()
+            finally:
+                connection.rollback()
+                connection.close()
+        except Exception as error:
+            logger.warning("Slow query not explained: %s", error)
+            entry["plan_error"] = str(error)
+        finally:
+            with self._lock:
+                self._explaining -= 1
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Captured statements, newest first."""
+        with self._lock:
+            return [dict(entry) for entry in reversed(self._entries)]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": self.threshold_ms,
+            "explain": self.explain,
+            "captured": self.captured,
+            "kept": len(self._entries),
+            "max_entries": self._entries.maxlen,
+        }
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,73 @@
+import threading
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy.orm import Session
+from db.instrumentation import off_budget
+from helpers.response_cache import response_cache
+from models.ProductModel import Product
+from models.StoreModel import Store
+
+# Dimensions whose keys are ids and need a name lookup; region and brand keys
+# are enums that already are their own label.
+LABELLED_DIMENSIONS = {
+    "store": (Store.store_id, Store.name),
+    "product": (Product.product_id, Product.name),
+}
+
+
+class DimensionResolver:
+    """
+    Process-wide id -> name labels for the store and product dimensions.
+
+    All labels are loaded in one query per dimension and kept until a product
+    or store is written (see invalidate) or the data_version watermark moves.
+    """
+
+    def __init__(self):
+        self._labels: Optional[Dict[str, Dict[str, str]]] = None
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self.loads = 0
+        # Bumped on every invalidate so dependants can tell their copy is stale
+        self.generation = 0
+
+    def labels(self, db: Session) -> Dict[str, Dict[str, str]]:
+        version = response_cache.data_version(db)
+        with self._lock:
+            if self._labels is not None and self._version == version:
+                return self._labels
+
+        labels = {}
+        for dimension, (key_column, name_column) in LABELLED_DIMENSIONS.items():
+            with off_budget():
+                rows = db.query(key_column, name_column).all()
+            labels[dimension] = {str(key): name for key, name in rows}
+        with self._lock:
+            self._labels, self._version = labels, version
+            self.loads += 1
+        return labels
+
+    def resolver(self, db: Session, dimension: Optional[str]) -> Callable[[Any], str]:
+        """Label function for one dimension; loads the labels at most once."""
+        names = None
+        if dimension in LABELLED_DIMENSIONS:
+            names = self.labels(db)[dimension]
+
+        def resolve(value: Any) -> str:
+            if isinstance(value, Enum):
+                return value.value
+            key = "" if value is None else str(value)
+            return names.get(key, key) if names is not None else key
+
+        return resolve
+
+    def label(self, db: Session, dimension: Optional[str], value: Any) -> str:
+        return self.resolver(db, dimension)(value)
+
+    def invalidate(self):
+        with self._lock:
+            self._labels = None
+            self.generation += 1
+
+
+dimension_resolver = DimensionResolver()
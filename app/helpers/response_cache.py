@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from fastapi.logger import logger
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from db.instrumentation import off_budget
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+# How long a data_version read is trusted before the table is consulted again.
+# This is also how late, at most, a load is noticed: the pipeline runs in its
+# own process and can only bump the table, not this process' copy of it.
+RESPONSE_CACHE_VERSION_TTL = float(os.getenv("RESPONSE_CACHE_VERSION_TTL", "1"))
+# SQLSTATE of undefined_table: the data_version table was never created.
+UNDEFINED_TABLE = "42P01"
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+
+def _normalize(value: Any) -> Hashable:
+    """Turn a request parameter into a stable, hashable cache key component."""
+    if isinstance(value, datetime):
+        # Fact tables are bucketed by DATE, so only the calendar day matters.
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted(_normalize(item) for item in value))
+    if isinstance(value, dict):
+        return tuple(sorted((key, _normalize(item)) for key, item in value.items()))
+    return value
+
+
+def make_key(endpoint: str, params: Dict[str, Any]) -> Tuple:
+    return (endpoint, _normalize(params))
+
+
+class ResponseCache:
+    """
+    In-process LRU cache for analytic responses.
+
+    Every entry is tagged with the data_version watermark that was current when
+    it was computed. The datapipeline bumps that watermark after each load, and
+    the first lookup that sees a new version drops every entry. The watermark
+    is re-read at most every `version_ttl` seconds, so responses computed
+    before a load can be served for up to that long after it.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        version_ttl: float = RESPONSE_CACHE_VERSION_TTL,
+        enabled: bool = RESPONSE_CACHE_ENABLED,
+    ):
+        self.max_entries = max_entries
+        self.version_ttl = version_ttl
+        self.enabled = enabled
+        self._entries: "OrderedDict[Tuple, Tuple[Optional[int], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._version_checked_at = 0.0
+        self._version_supported = True
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def data_version(self, db: Session) -> Optional[int]:
+        """Current data watermark; re-read at most once per `version_ttl` seconds."""
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_ttl:
+            return self._version
+        try:
+            with off_budget():
+                version = db.execute(
+                    text("SELECT version FROM data_version WHERE id = 1")
+                ).scalar()
+        except SQLAlchemyError as error:
+            db.rollback()
+            if getattr(error.orig, "pgcode", None) == UNDEFINED_TABLE:
+                logger.warning("data_version table missing; response cache disabled")
+                self._version_supported = False
+                return None
+            # Transient (connection lost, timeout...): keep the last watermark
+            # and read it again on the next call.
+            logger.warning("data_version not read, retrying on next use: %s", error)
+            return self._version
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._version = version
+            self._version_checked_at = now
+        return version
+
+    def get_or_compute(
+        self,
+        db: Session,
+        endpoint: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Any],
+    ) -> Any:
+        if not self.enabled or not self._version_supported:
+            return compute()
+
+        version = self.data_version(db)
+        if not self._version_supported:
+            return compute()
+
+        key = make_key(endpoint, params)
+        found, value = self._lookup(key, version)
+        if found:
+            return value
+        value = compute()
+        self._store(key, version, value)
+        return value
+
+    async def get_or_compute_async(
+        self,
+        db: AsyncSession,
+        endpoint: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Same as get_or_compute, for AsyncSession callers and coroutine computes."""
+        if not self.enabled or not self._version_supported:
+            return await compute()
+
+        version = await db.run_sync(self.data_version)
+        if not self._version_supported:
+            return await compute()
+
+        key = make_key(endpoint, params)
+        found, value = self._lookup(key, version)
+        if found:
+            return value
+        value = await compute()
+        self._store(key, version, value)
+        return value
+
+    def _lookup(self, key: Tuple, version: Optional[int]) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            self.misses += 1
+        return False, None
+
+    def _store(self, key: Tuple, version: Optional[int], value: Any):
+        with self._lock:
+            # Skip the store if new data landed while we were computing.
+            if version == self._version:
+                self._entries[key] = (version, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled and self._version_supported,
+                "data_version": self._version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,105 @@
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    # orjson handles dates, enums, UUIDs and numpy natively. Decimals of rows
+    # not mapped with plain_rows and the KPI date-range sets end up here, and
+    # so do asyncpg's UUIDs: orjson only takes uuid.UUID itself, not subclasses.
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response encoded with orjson.
+
+    Returned from a route directly, it also skips FastAPI's jsonable_encoder
+    walk over the content, so a large payload is encoded in a single pass.
+    Content should be plain: dicts, lists, str, numbers, dates and enums.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class EncodedJSONResponse(Response):
+    """A JSON body encoded ahead of time, e.g. by encoded(), sent as is."""
+
+    media_type = "application/json"
+
+
+def encoded(
+    compute: Callable[[], Awaitable[Any]],
+) -> Callable[[], Awaitable[Optional[bytes]]]:
+    """
+    `compute`, returning its result as JSON bytes: what a route caches so its
+    cache hits skip the encoding too. None stays None, for "no data" checks.
+    """
+
+    async def encode() -> Optional[bytes]:
+        content = await compute()
+        return None if content is None else dumps(content)
+
+    return encode
+
+
+def _nullable(convert: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    return lambda value: None if value is None else convert(value)
+
+
+def _converter(value: Any) -> Callable[[Any], Any]:
+    """How to make values of the column `value` came from JSON-native."""
+    if isinstance(value, Decimal):
+        return _nullable(float)
+    if isinstance(value, (date, datetime)):
+        return _nullable(lambda item: item.isoformat())
+    if isinstance(value, Enum):
+        return _nullable(lambda item: item.value)
+    return None
+
+
+def plain_rows(rows: Iterable) -> List[Dict[str, Any]]:
+    """
+    Result rows as dicts of JSON-native values: Decimals become floats, dates
+    ISO strings and enums their values.
+
+    The conversion of each column is picked once, from its first non-null
+    value, and applied to the whole column.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    keys = list(rows[0]._mapping.keys())
+    converters = []
+    for index in range(len(keys)):
+        sample = next((row[index] for row in rows if row[index] is not None), None)
+        converters.append(_converter(sample))
+    if not any(converters):
+        return [dict(zip(keys, row)) for row in rows]
+
+    columns = [
+        (
+            [convert(row[index]) for row in rows]
+            if convert
+            else [row[index] for row in rows]
+        )
+        for index, convert in enumerate(converters)
+    ]
+    return [dict(zip(keys, values)) for values in zip(*columns)]
@@ -1,4 +1,7 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from anyio import to_thread
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from api.routes import (
     # customer_router,
@@ -8,12 +11,36 @@ from api.routes import (
     # return_router,
     store_router,
     kpi_router,
+    admin_router,
+    dashboard_router,
+    metrics_router,
 )
+from crud.v2.cube import analytics_cube
+from helpers.serialization import FastJSONResponse
+from db.instrumentation import DB_DEBUG_HEADER, observe_request, track_request
+from db.query_budget import enforce_budget
+from db.session import DB_THREADPOOL_SIZE, warm_async_pool, warm_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync routes run on this threadpool; size it to the connection pool so
+    # threads do not pile up waiting for a checkout
+    to_thread.current_default_thread_limiter().total_tokens = DB_THREADPOOL_SIZE
+    # Open the pooled connections now rather than on the first requests
+    await run_in_threadpool(warm_pool)
+    await warm_async_pool()
+    # Load the analytics cube (if enabled) before the first request needs it
+    await run_in_threadpool(analytics_cube.warm)
+    yield
+
 
 app = FastAPI(
     title="My Retail API",
     version="0.1.0",
     description="FastAPI backend for retail KPIs and operations.",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # CORS setup (consider loading from env in production
@@ -26,6 +53,21 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def instrument_db(request: Request, call_next):
+    """Count the SQL each request runs; echo it back when asked to."""
+    with track_request() as stats:
+        response = await call_next(request)
+    # Label by route template, not the raw path, to keep the series bounded
+    route = request.scope.get("route")
+    route = route.path if route else "unmatched"
+    observe_request(route, request.method, stats)
+    enforce_budget(route, request.method, stats)
+    if request.headers.get(DB_DEBUG_HEADER):
+        response.headers.update(stats.headers())
+    return response
+
+
 @app.get("/", tags=["root"])
 async def root():
     return {"message": "Retail API up and running"}
@@ -39,5 +81,6 @@ app.include_router(product_router, prefix="/products", tags=["Products"])
 # app.include_router(return_router, prefix="/returns", tags=["Returns"])
 # app.include_router(order_item_router, prefix="/order-items", tags=["Order Items"])
 app.include_router(kpi_router, prefix="/kpi", tags=["KPI"])
-
-# Optional: lifespan event handlers (if needed for DB/session/metrics)
+app.include_router(admin_router, prefix="/admin", tags=["Admin"])
+app.include_router(dashboard_router, prefix="/dashboard", tags=["Dashboard"])
+app.include_router(metrics_router, tags=["Metrics"])
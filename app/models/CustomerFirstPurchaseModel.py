@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Date, Index, String
+from sqlalchemy.dialects.postgresql import UUID
+
+from db.base import Base
+
+
+class CustomerFirstPurchase(Base):
+    """
+    Date of each customer's first purchase, overall and per store, region,
+    brand and product.
+
+    `scope` is one of "all", "store", "region", "brand" or "product" and
+    `scope_key` the store/product id or region/brand name as text ("" for
+    "all"). Maintained by the datapipeline (generateTables/first_purchase.py).
+    """
+
+    __tablename__ = "customer_first_purchase"
+    __table_args__ = (
+        Index("customer_first_purchase_date_idx", "scope", "first_purchase_date"),
+    )
+
+    scope = Column(String(16), primary_key=True)
+    scope_key = Column(String(64), primary_key=True)
+    customer_id = Column(UUID(as_uuid=True), primary_key=True)
+    first_purchase_date = Column(Date, nullable=False)
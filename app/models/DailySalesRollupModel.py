@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Date, Integer, Numeric
+from sqlalchemy.dialects.postgresql import UUID
+
+from db.base import Base
+
+
+class DailySalesRollup(Base):
+    """
+    Pre-aggregated facts at day x store x product grain.
+
+    Sales measures are bucketed by order date and return measures by return
+    date. Maintained by the datapipeline (generateTables/rollup.py).
+    """
+
+    __tablename__ = "daily_sales_rollup"
+
+    day = Column(Date, primary_key=True)
+    store_id = Column(UUID(as_uuid=True), primary_key=True)
+    product_id = Column(UUID(as_uuid=True), primary_key=True, nullable=True)
+
+    sales = Column(Numeric(14, 2), nullable=False, default=0)
+    profit = Column(Numeric(14, 2), nullable=False, default=0)
+    quantity = Column(Integer, nullable=False, default=0)
+    # Each order is counted once, on the row of its first item, so this column
+    # sums correctly across days, stores and regions (not brands or products).
+    order_count = Column(Integer, nullable=False, default=0)
+    # Distinct orders containing the product; exact only at product grain.
+    product_order_count = Column(Integer, nullable=False, default=0)
+    item_count = Column(Integer, nullable=False, default=0)
+    return_count = Column(Integer, nullable=False, default=0)
+    refund_amount = Column(Numeric(14, 2), nullable=False, default=0)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Numeric, Integer
+from sqlalchemy import Column, Date, ForeignKey, Numeric, Integer
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from uuid import uuid4
@@ -24,6 +24,10 @@ class OrderItem(Base):
     quantity = Column(Integer, nullable=False)
     total_price = Column(Numeric(10, 2), nullable=False)
 
+    # Copies of the order's date (the partition key) and store
+    order_date = Column(Date, nullable=False)
+    store_id = Column(UUID(as_uuid=True))
+
     # Optional relationships
     order = relationship("Order", back_populates="order_items")
     product = relationship("Product", back_populates="order_item")
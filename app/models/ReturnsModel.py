@@ -23,5 +23,10 @@ class Return(Base):
     return_status = Column(Enum(ReturnStatusEnum), nullable=True)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
 
+    # Copies of the returned item's store, product and order date
+    store_id = Column(UUID(as_uuid=True))
+    product_id = Column(UUID(as_uuid=True))
+    order_date = Column(Date)
+
     # Relationships (optional)
     order_item = relationship("OrderItem", back_populates="reverse")
@@ -0,0 +1,46 @@
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+
+WidgetType = Literal[
+    "kpi",
+    "insight",
+    "top_stores",
+    "top_products",
+    "store_table",
+    "product_table",
+]
+
+
+class DashboardWidget(BaseModel):
+    """
+    One dashboard widget, answered like the endpoint of the same name. Only
+    the fields of its type are read; dates default to the batch's.
+    """
+
+    id: str
+    type: WidgetType
+    start_date: Optional[str] = Field(None, description="YYYY-MM-DD")
+    end_date: Optional[str] = Field(None, description="YYYY-MM-DD")
+    # kpi
+    granularity: Optional[Literal["day", "week", "month", "quarter"]] = None
+    # insight
+    comparison_level: str = "region"
+    selected_regions: List[str] = []
+    selected_stores: List[str] = []
+    selected_brands: List[str] = []
+    selected_products: List[str] = []
+    # insight, top_stores, top_products, product_table
+    metric: str = "Total Sales"
+    # top_stores, top_products
+    n: int = 10
+    # store_table: "store" | "region"; product_table: "product" | "brand"
+    group_by: Optional[str] = None
+    # product_table
+    limit: Optional[int] = None
+    sort: Literal["asc", "desc"] = "desc"
+
+
+class DashboardBatchRequest(BaseModel):
+    start_date: Optional[str] = Field(None, description="YYYY-MM-DD")
+    end_date: Optional[str] = Field(None, description="YYYY-MM-DD")
+    widgets: List[DashboardWidget]
@@ -0,0 +1,71 @@
+from sqlalchemy import text
+
+# A store whose customers also bought elsewhere, after their first order there
+CUSTOMERS_SQL = """
+WITH firsts AS (
+    SELECT DISTINCT ON (customer_id) customer_id, store_id
+    FROM orders
+    ORDER BY customer_id, order_date, order_id
+)
+SELECT f.store_id, array_agg(f.customer_id)
+FROM firsts f
+WHERE EXISTS (
+    SELECT 1 FROM orders o
+    WHERE o.customer_id = f.customer_id AND o.store_id <> f.store_id
+)
+GROUP BY f.store_id
+ORDER BY count(*) DESC
+LIMIT 1
+"""
+
+EXPECTED_SQL = {
+    "all": """
+        SELECT o.customer_id, '' AS scope_key, MIN(o.order_date)
+        FROM orders o WHERE o.customer_id::text = ANY(:ids)
+        GROUP BY o.customer_id
+    """,
+    "region": """
+        SELECT o.customer_id, s.region::text, MIN(o.order_date)
+        FROM orders o JOIN stores s ON s.store_id = o.store_id
+        WHERE o.customer_id::text = ANY(:ids)
+        GROUP BY o.customer_id, s.region
+    """,
+    "product": """
+        SELECT o.customer_id, oi.product_id::text, MIN(o.order_date)
+        FROM orders o JOIN order_items oi ON oi.order_id = o.order_id
+        WHERE o.customer_id::text = ANY(:ids) AND oi.product_id IS NOT NULL
+        GROUP BY o.customer_id, oi.product_id
+    """,
+}
+
+ACTUAL_SQL = """
+SELECT customer_id, scope_key, first_purchase_date
+FROM customer_first_purchase
+WHERE scope = :scope AND customer_id::text = ANY(:ids)
+"""
+
+
+def _rows(db, sql, **params):
+    return sorted(tuple(row) for row in db.execute(text(sql), params))
+
+
+def test_delete_store_recomputes_first_purchases_of_other_scopes(db):
+    from crud.v2.stores import StoreCrud
+
+    store_id, customer_ids = db.execute(text(CUSTOMERS_SQL)).one()
+    ids = [str(customer_id) for customer_id in customer_ids]
+    before = _rows(db, ACTUAL_SQL, scope="all", ids=ids)
+
+    assert StoreCrud.delete_store(db, str(store_id))
+
+    for scope, expected in EXPECTED_SQL.items():
+        actual = _rows(db, ACTUAL_SQL, scope=scope, ids=ids)
+        assert actual == _rows(db, expected, ids=ids), scope
+    # Every one of them first bought at the deleted store
+    assert _rows(db, ACTUAL_SQL, scope="all", ids=ids) != before
+    assert not _rows(
+        db,
+        "SELECT 1 FROM customer_first_purchase"
+        " WHERE scope = 'store' AND scope_key = :key",
+        key=str(store_id),
+    )
@@ -0,0 +1,67 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+from db.fanout import run_concurrently, run_concurrently_async
+
+# Requests sent at once, against a pool that holds two connections
+REQUESTS = 6
+POOL = {"pool_size": 1, "max_overflow": 1, "pool_timeout": 2}
+
+
+def _task(db):
+    value = db.execute(text("SELECT 1")).scalar()
+    time.sleep(0.05)  # with its connection checked out
+    return value
+
+
+def test_fanout_does_not_deadlock_a_full_pool(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'fanout.db'}",
+        poolclass=QueuePool,
+        connect_args={"check_same_thread": False},
+        **POOL,
+    )
+    tasks = {name: _task for name in ("a", "b", "c")}
+
+    def request(_):
+        with Session(bind=engine) as db:
+            # Like data_version and rollup_available, before the fan-out
+            db.execute(text("SELECT 1"))
+            time.sleep(0.05)
+            return run_concurrently(db, tasks, max_fanout=3)
+
+    with ThreadPoolExecutor(max_workers=REQUESTS) as requests:
+        results = list(requests.map(request, range(REQUESTS)))
+
+    assert results == [{"a": 1, "b": 1, "c": 1}] * REQUESTS
+    assert engine.pool.checkedout() == 0
+
+
+def test_async_fanout_does_not_deadlock_a_full_pool(database_url):
+    async def run():
+        engine = create_async_engine(
+            database_url.replace("postgresql://", "postgresql+asyncpg://", 1), **POOL
+        )
+        tasks = {
+            name: lambda db: db.execute(text("SELECT 1 FROM pg_sleep(0.05)")).scalar()
+            for name in ("a", "b", "c")
+        }
+
+        async def request():
+            async with AsyncSession(bind=engine) as db:
+                await db.execute(text("SELECT 1"))
+                await asyncio.sleep(0.05)
+                return await run_concurrently_async(db, tasks, max_fanout=3)
+
+        try:
+            return await asyncio.gather(*(request() for _ in range(REQUESTS)))
+        finally:
+            await engine.dispose()
+
+    results = asyncio.run(run())
+
+    assert results == [{"a": 1, "b": 1, "c": 1}] * REQUESTS
@@ -0,0 +1,70 @@
+from sqlalchemy import create_engine, text
+from db.instrumentation import (
+    REQUEST_QUERIES,
+    observe_request,
+    off_budget,
+    render_metrics,
+    track_request,
+)
+
+
+def test_track_request_counts_statements_and_time():
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 0"))  # outside any request: not counted
+        with track_request() as stats:
+            conn.execute(text("SELECT 1"))
+            with off_budget():
+                conn.execute(text("SELECT 2"))
+
+    assert stats.statements == 2
+    assert sum(stats.budgeted.values()) == 1
+    assert stats.seconds > 0
+    assert 0 < stats.slowest_seconds <= stats.seconds
+    assert stats.slowest_statement in ("SELECT 1", "SELECT 2")
+    headers = stats.headers()
+    assert headers["X-DB-Queries"] == "2"
+    assert float(headers["X-DB-Time-ms"]) == round(stats.seconds * 1000, 1)
+
+
+def test_observe_request_renders_histograms():
+    engine = create_engine("sqlite://")
+    with track_request() as stats, engine.connect() as conn:
+        for _ in range(3):
+            conn.execute(text("SELECT 1"))
+    observe_request("/test/observed", "GET", stats)
+
+    lines = REQUEST_QUERIES.render()
+    assert (
+        'db_request_queries_bucket{route="/test/observed",method="GET",le="2"} 0'
+        in lines
+    )
+    assert (
+        'db_request_queries_bucket{route="/test/observed",method="GET",le="3"} 1'
+        in lines
+    )
+    assert 'db_request_queries_sum{route="/test/observed",method="GET"} 3.0' in lines
+    assert "db_request_seconds_count" in render_metrics()
+
+
+def test_route_reports_query_count_and_time(client):
+    response = client.get("/stores/filters/regions", headers={"X-Debug-DB": "1"})
+
+    assert response.status_code == 200
+    assert int(response.headers["X-DB-Queries"]) >= 1
+    assert float(response.headers["X-DB-Time-ms"]) > 0
+    assert float(response.headers["X-DB-Slowest-ms"]) <= float(
+        response.headers["X-DB-Time-ms"]
+    )
+    metrics = client.get("/metrics").text
+    assert (
+        'db_request_queries_count{route="/stores/filters/regions",method="GET"}'
+        in metrics
+    )
+
+
+def test_headers_only_on_request(client):
+    response = client.get("/stores/filters/regions")
+
+    assert response.status_code == 200
+    assert "X-DB-Queries" not in response.headers
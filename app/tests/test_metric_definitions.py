@@ -0,0 +1,107 @@
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+import pytest
+from crud.v2 import metrics, rollup
+from db.fanout import SINGLE_SNAPSHOT
+
+# A month no benchmark dataset reaches
+DAY = date(2031, 3, 10)
+START = datetime(2031, 3, 1, tzinfo=timezone.utc)
+END = datetime(2031, 3, 31, tzinfo=timezone.utc)
+
+# (price sold at, quantity) of the items of each order. The product lists at
+# 30.00 and costs 10.00; the last order has no items.
+ORDERS = [
+    [("25.00", 2), ("20.00", 1)],
+    [("25.00", 1)],
+    [],
+]
+
+# (25 - 10) * 2 + (20 - 10) * 1 + (25 - 10) * 1; the product's list price
+# would give (30 - 10) * 4 = 80
+TOTAL_PROFIT = Decimal("55.00")
+# Orders with items; counting orders would give 3, counting items 3
+TOTAL_ORDERS = 2
+
+
+@pytest.fixture
+def fixture_month(db, monkeypatch):
+    from enumsC import BrandEnum, CategoryEnum, RegionEnum
+    from models.CustomersModel import Customer
+    from models.OrderItemsModel import OrderItem
+    from models.OrderModel import Order
+    from models.ProductModel import Product
+    from models.StoreModel import Store
+
+    # The rollup is rebuilt by the datapipeline, not by these inserts
+    monkeypatch.setattr(rollup, "USE_DAILY_ROLLUP", False)
+    db.info[SINGLE_SNAPSHOT] = True
+
+    store = Store(
+        store_id=uuid.uuid4(),
+        manager_name="Fixture",
+        name="Fixture store",
+        region=RegionEnum.Region1,
+    )
+    product = Product(
+        product_id=uuid.uuid4(),
+        name="Fixture product",
+        price=Decimal("30.00"),
+        cost=Decimal("10.00"),
+        brand=BrandEnum.BrandA,
+        category=CategoryEnum.electronics,
+    )
+    customer = Customer(
+        customer_id=uuid.uuid4(),
+        email=f"{uuid.uuid4()}@example.com",
+        password_hash="x",
+    )
+    db.add_all([store, product, customer])
+    db.flush()
+
+    for items in ORDERS:
+        order = Order(
+            order_id=uuid.uuid4(),
+            store_id=store.store_id,
+            customer_id=customer.customer_id,
+            total_amount=sum(Decimal(price) * quantity for price, quantity in items),
+            order_date=DAY,
+        )
+        db.add(order)
+        db.flush()
+        for price, quantity in items:
+            db.add(
+                OrderItem(
+                    order_id=order.order_id,
+                    product_id=product.product_id,
+                    price=Decimal(price),
+                    quantity=quantity,
+                    total_price=Decimal(price) * quantity,
+                    order_date=DAY,
+                    store_id=store.store_id,
+                )
+            )
+    db.flush()
+    return db
+
+
+def test_total_profit_is_priced_at_the_sold_price(fixture_month):
+    assert metrics.total(fixture_month, "Total Profit", START, END) == TOTAL_PROFIT
+
+
+def test_total_orders_counts_orders_with_items(fixture_month):
+    assert metrics.total(fixture_month, "Total Orders", START, END) == TOTAL_ORDERS
+
+
+def test_kpi_cards_use_the_registry_definitions(fixture_month):
+    from crud.v2.kpi import KPICrud
+
+    cards = {
+        card["metric_name"]: card["total_value"]
+        for card in KPICrud().get_all_kpi(fixture_month, START, END)
+    }
+
+    assert cards["Total Profit"] == TOTAL_PROFIT
+    assert cards["Total Orders"] == TOTAL_ORDERS
+    assert cards["Total Sales"] == Decimal("95.00")
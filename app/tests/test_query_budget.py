@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import create_engine, text
+from db import query_budget
+from db.instrumentation import off_budget, track_request
+from db.query_budget import QueryBudgetExceeded, enforce_budget, fingerprint
+
+# Statements each budgeted route may run, as declared by its query_budget()
+BUDGETS = {
+    "/kpi/": 3,
+    "/kpi/insight": 3,
+    "/stores/table": 1,
+    "/stores/top": 1,
+    "/stores/filters/regions": 1,
+    "/stores/filters/stores": 1,
+    "/products/table": 1,
+    "/products/top": 1,
+    "/products/filters/products": 1,
+    "/products/filters/brands": 1,
+}
+
+
+@pytest.fixture
+def raise_mode(monkeypatch):
+    monkeypatch.setattr(query_budget, "DB_QUERY_BUDGET_MODE", "raise")
+
+
+@pytest.fixture
+def budgets_seen(raise_mode, monkeypatch):
+    """(route, stats) of every request, recorded as the middleware enforces it."""
+    import main
+
+    seen = []
+
+    def record(route, method, stats):
+        seen.append((route, stats))
+        enforce_budget(route, method, stats)
+
+    monkeypatch.setattr(main, "enforce_budget", record)
+    return seen
+
+
+def test_fingerprint_replaces_literals():
+    statement = "SELECT * FROM t WHERE a = %(a_1)s AND b IN (1, 2, 3) AND c = 'x'"
+
+    assert (
+        fingerprint(statement) == "SELECT * FROM t WHERE a = ? AND b IN (?+) AND c = ?"
+    )
+
+
+def test_enforce_budget_raises_over_budget(raise_mode):
+    engine = create_engine("sqlite://")
+    with track_request() as stats, engine.connect() as conn:
+        stats.budget = 1
+        conn.execute(text("SELECT 1"))
+        with off_budget():
+            conn.execute(text("SELECT 2"))
+    enforce_budget("/test/budget", "GET", stats)  # off-budget statements are free
+
+    with engine.connect() as conn, track_request() as stats:
+        stats.budget = 1
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 1"))
+    with pytest.raises(QueryBudgetExceeded, match="query_budget_exceeded"):
+        enforce_budget("/test/budget", "GET", stats)
+
+
+@pytest.mark.parametrize("route", sorted(BUDGETS))
+def test_route_within_budget(route, client, cases, budgets_seen):
+    route_cases = [case for case in cases if case["route"] == route]
+    assert route_cases, f"no benchmark case requests {route}"
+
+    for case in route_cases:
+        response = client.request(
+            case["method"], case["path"], params=case["params"], json=case["json"]
+        )
+        assert response.status_code == 200, case["name"]
+
+    counted = [stats for seen, stats in budgets_seen if seen == route]
+    assert len(counted) == len(route_cases)
+    for stats in counted:
+        assert stats.budget == BUDGETS[route]
+        assert sum(stats.budgeted.values()) <= BUDGETS[route]
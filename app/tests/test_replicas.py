@@ -0,0 +1,104 @@
+import asyncio
+import time
+import pytest
+from sqlalchemy import text
+from db import session
+from db.replicas import ReplicaRouter
+
+# Nothing listens on port 1: connecting fails at once
+UNREACHABLE_URL = "postgresql://postgres@127.0.0.1:1/omega3_unreachable"
+
+
+@pytest.fixture
+def routers():
+    """Routers made by a test; their engines are disposed of afterwards."""
+    made = []
+
+    def make(urls, **options):
+        made.append(ReplicaRouter(urls, **options))
+        return made[-1]
+
+    yield make
+    for router in made:
+        for replica in router.replicas:
+            replica.engine.dispose()
+
+
+def _port(db):
+    return int(db.execute(text("SELECT current_setting('port')")).scalar())
+
+
+def test_reads_go_to_the_replica(routers, replica_url):
+    router = routers([replica_url])
+    replica = router.replicas[0]
+
+    db = router.open_session()
+    try:
+        assert db.get_bind() is replica.engine
+        assert _port(db) == (replica.engine.url.port or 5432)
+    finally:
+        db.close()
+    assert replica.sessions == 1
+    assert router.primary_sessions == 0
+
+
+def test_async_reads_go_to_the_replica(routers, replica_url):
+    router = routers([replica_url])
+    replica = router.replicas[0]
+
+    async def route():
+        db = await router.open_async_session()
+        try:
+            return db.bind
+        finally:
+            await db.close()
+            await replica.async_engine.dispose()
+
+    assert asyncio.run(route()) is replica.async_engine
+    assert replica.sessions == 1
+
+
+def test_unreachable_replica_falls_back_to_the_primary(routers):
+    router = routers([UNREACHABLE_URL], retry_seconds=60)
+    replica = router.replicas[0]
+
+    for _ in range(2):
+        router.open_session().close()
+
+    # Tried once, then skipped until retry_seconds have passed
+    assert replica.failures == 1
+    assert replica.last_error
+    assert router.candidates() == []
+    assert router.primary_sessions == 2
+    assert router.open_session().get_bind() is session.engine
+
+
+def test_unreachable_replica_is_skipped_for_the_next_one(routers, replica_url):
+    router = routers([UNREACHABLE_URL, replica_url], retry_seconds=60)
+    down, up = router.replicas
+
+    db = router.open_session()
+    try:
+        assert db.get_bind() is up.engine
+    finally:
+        db.close()
+    assert down.failures == 1
+    assert router.primary_sessions == 0
+
+
+def test_reads_stay_on_the_primary_after_a_write(routers, replica_url):
+    router = routers([replica_url], write_grace_seconds=0.2)
+    replica = router.replicas[0]
+
+    router.wrote()
+    db = router.open_session()
+    assert db.get_bind() is session.engine
+    db.close()
+
+    time.sleep(0.25)
+    db = router.open_session()
+    try:
+        assert db.get_bind() is replica.engine
+    finally:
+        db.close()
+    assert (router.primary_sessions, replica.sessions) == (1, 1)
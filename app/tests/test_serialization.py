@@ -0,0 +1,37 @@
+import asyncio
+from decimal import Decimal
+import orjson
+from helpers.serialization import EncodedJSONResponse, dumps, encoded
+
+
+def test_encoded_returns_json_bytes():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return [{"store": "A", "sales": Decimal("12.50")}]
+
+    body = asyncio.run(encoded(compute)())
+
+    assert calls == [1]
+    assert orjson.loads(body) == [{"store": "A", "sales": 12.5}]
+    response = EncodedJSONResponse(body)
+    assert response.body is body
+    assert response.headers["content-type"] == "application/json"
+
+
+def test_encoded_keeps_none():
+    async def compute():
+        return None
+
+    assert asyncio.run(encoded(compute)()) is None
+
+
+def test_dumps_asyncpg_uuid():
+    from asyncpg.pgproto.pgproto import UUID
+
+    store_id = "12345678-1234-5678-1234-567812345678"
+
+    assert orjson.loads(dumps([{"store_id": UUID(store_id)}])) == [
+        {"store_id": store_id}
+    ]
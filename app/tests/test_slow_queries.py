@@ -0,0 +1,54 @@
+import uuid
+import pytest
+from psycopg2.extensions import adapt
+from sqlalchemy import column, select, table, text
+from sqlalchemy.dialects.postgresql import UUID
+from db.slow_queries import SlowQueryLog, _for_psycopg2
+from db.session import async_engine
+
+
+def _store_statement(store_id):
+    """A statement and its parameters as the asyncpg engine hands them over."""
+    stores = table("stores", column("name"), column("store_id", UUID(as_uuid=True)))
+    compiled = (
+        select(stores.c.name)
+        .where(stores.c.store_id == store_id)
+        .compile(dialect=async_engine.dialect)
+    )
+    params = compiled.construct_params()
+    return str(compiled), tuple(params[name] for name in compiled.positiontup)
+
+
+def test_asyncpg_parameters_adapt_for_psycopg2():
+    store_id = uuid.uuid4()
+    statement, parameters = _store_statement(store_id)
+    assert "%s" in statement
+    assert parameters == (store_id,)
+
+    replayed = _for_psycopg2(parameters)
+    assert adapt(replayed[0]).getquoted() == f"'{store_id}'::uuid".encode()
+    assert _for_psycopg2({"ids": [store_id], "n": 1})["n"] == 1
+
+
+def test_slow_async_statement_with_uuid_is_explained(dataset):
+    from db.session import engine
+
+    with engine.connect() as conn:
+        store_id = conn.execute(text("SELECT store_id FROM stores LIMIT 1")).scalar()
+    statement, parameters = _store_statement(uuid.UUID(str(store_id)))
+    log = SlowQueryLog(threshold_ms=1, explain=True)
+
+    entry = log.record(async_engine.sync_engine, statement, parameters, 1.0)
+    log._executor.shutdown(wait=True)
+
+    assert entry["plan_error"] is None
+    assert entry["plan"][0]["Plan"]
+    assert entry["parameters"] == [str(store_id)]
+
+
+@pytest.mark.parametrize("seconds", [0.0001, 0.5])
+def test_fast_statements_are_not_kept(seconds):
+    log = SlowQueryLog(threshold_ms=1000, explain=False)
+
+    assert log.record(async_engine.sync_engine, "SELECT 1", (), seconds) is None
+    assert log.entries() == []
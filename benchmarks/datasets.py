@@ -0,0 +1,218 @@
+"""
+Seeded synthetic datasets for the endpoint benchmarks.
+
+Builds one of DATASETS into a PostgreSQL database with the datapipeline's own
+generators and loader, the same way generateTables/backfill.py does:
+
+    python benchmarks/datasets.py small postgresql://localhost/omega3_bench_small
+
+random, numpy, Faker and uuid4 are all seeded, so a dataset holds the same
+rows wherever it is built; only the created_at/updated_at audit columns
+differ. What was built is recorded in the benchmark_dataset table.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+
+ROOT = Path(__file__).resolve().parents[1]
+DATAPIPELINE = ROOT / "datapipeline"
+
+# Months of facts and dimension sizes; every dataset ends with END_MONTH so
+# that its rows do not depend on the day it is built.
+DATASETS = {
+    "small": {"months": 1, "stores": 10, "products": 100, "customers": 1000},
+    "medium": {"months": 12, "stores": 20, "products": 200, "customers": 4000},
+    "large": {"months": 60, "stores": 30, "products": 300, "customers": 7000},
+}
+END_MONTH = date(2024, 12, 1)
+SEED = 42
+
+CREATE_MARKER_SQL = """
+CREATE TABLE benchmark_dataset (
+    name VARCHAR(32) NOT NULL,
+    seed INTEGER NOT NULL,
+    first_day DATE NOT NULL,
+    last_day DATE NOT NULL,
+    row_counts JSONB NOT NULL,
+    built_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+)
+"""
+COUNTED_TABLES = ["stores", "products", "customers", "orders", "order_items", "returns"]
+
+
+def dataset_window(name: str) -> Tuple[date, date]:
+    """First and last day of the dataset's facts."""
+    first = END_MONTH - relativedelta(months=DATASETS[name]["months"] - 1)
+    return first, END_MONTH + relativedelta(months=1) - timedelta(days=1)
+
+
+def read_marker(url: str) -> Optional[Dict[str, Any]]:
+    """What benchmark_dataset says the database holds; None if not built."""
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            if not inspect(conn).has_table("benchmark_dataset"):
+                return None
+            row = conn.execute(text("SELECT * FROM benchmark_dataset")).first()
+            return dict(row._mapping) if row else None
+    finally:
+        engine.dispose()
+
+
+def recreate_database(url: str):
+    """Drop and create the database of `url`; only for benchmark databases."""
+    url = make_url(url)
+    if "bench" not in url.database:
+        raise SystemExit(f"Refusing to recreate {url.database!r}: not a benchmark db")
+    admin = create_engine(url.set(database="postgres"), isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.execute(text(f'DROP DATABASE IF EXISTS "{url.database}"'))
+        conn.execute(text(f'CREATE DATABASE "{url.database}"'))
+    admin.dispose()
+
+
+def seed_generators(seed: int, modules):
+    """Make every random source of the generator modules reproducible."""
+    import numpy as np
+    from faker import Faker
+
+    random.seed(seed)
+    np.random.seed(seed)
+    Faker.seed(seed)
+
+    def uuid4():
+        return uuid.UUID(int=random.getrandbits(128), version=4)
+
+    for module in modules:
+        module.uuid4 = uuid4
+
+
+def build(name: str, url: str, seed: int = SEED):
+    """Generate the dataset and load it into the (empty) database at `url`."""
+    spec = DATASETS[name]
+    first, last = dataset_window(name)
+
+    # The datapipeline reads its database and data directory from the
+    # environment when utils.common is imported.
+    parsed = make_url(url)
+    os.environ.update(
+        {
+            "DATABASE_USER": parsed.username or "",
+            "DATABASE_PASSWORD": parsed.password or "",
+            "DATABASE_HOST": parsed.host or "localhost",
+            "DATABASE_PORT": str(parsed.port or 5432),
+            "DATABASE_NAME": parsed.database,
+            "DATA_DIR": tempfile.mkdtemp(prefix=f"omega3-bench-{name}-"),
+        }
+    )
+    sys.path.insert(0, str(DATAPIPELINE))
+    import pandas as pd
+    from generateTables import (
+        generate_customers,
+        generate_order_items,
+        generate_orders,
+        generate_products,
+        generate_returns,
+        generate_stores,
+    )
+    from generateTables.upload import upload_all_tables_to_sql
+    from utils.common import engine, ensure_dirs
+
+    with engine.begin() as conn:
+        if inspect(conn).has_table("stores"):
+            raise SystemExit(f"{parsed.database} is not empty; pass --recreate")
+        with conn.connection.cursor() as cursor:
+            cursor.execute((DATAPIPELINE / "sql" / "create_table.sql").read_text())
+
+    seed_generators(
+        seed,
+        [
+            generate_customers,
+            generate_orders,
+            generate_products,
+            generate_returns,
+            generate_stores,
+        ],
+    )
+    ensure_dirs()
+    store_df = generate_stores.generate_stores(spec["stores"])
+    products_df = generate_products.generate_static_products(spec["products"], seed)
+    customer_pool = generate_customers.generate_and_save_customer_pool(
+        spec["customers"], start_date=first - relativedelta(years=5)
+    )
+    month = first
+    while month <= last:
+        start_date = month
+        end_date = month + relativedelta(months=1) - timedelta(days=1)
+        timestamp = month.strftime("%Y_%m")
+        eligible = customer_pool[
+            pd.to_datetime(customer_pool["created_at"]) <= pd.Timestamp(month)
+        ]
+        active = eligible.sample(n=min(len(eligible), 500), random_state=seed)
+        orders_df = generate_orders.generate_orders_for_customers_and_stores(
+            timestamp,
+            active["customer_id"].tolist(),
+            store_df["store_id"].tolist(),
+            start_date,
+            end_date,
+        )
+        order_items_df = generate_order_items.generate_order_items(
+            timestamp, orders_df, products_df, month.strftime("%Y%m%d")
+        )
+        generate_returns.generate_returns(
+            timestamp, order_items_df, month, start_date, end_date
+        )
+        print(f"🤖 Data for {timestamp} generated")
+        month += relativedelta(months=1)
+
+    upload_all_tables_to_sql()
+
+    with engine.begin() as conn:
+        counts = {
+            table: conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+            for table in COUNTED_TABLES
+        }
+        conn.execute(text(CREATE_MARKER_SQL))
+        conn.execute(
+            text(
+                "INSERT INTO benchmark_dataset (name, seed, first_day, last_day,"
+                " row_counts) VALUES (:name, :seed, :first, :last, :counts)"
+            ),
+            {
+                "name": name,
+                "seed": seed,
+                "first": first,
+                "last": last,
+                "counts": json.dumps(counts),
+            },
+        )
+    print(f"🎉 Dataset {name!r} built: {counts}")
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("name", choices=sorted(DATASETS))
+    parser.add_argument("url", help="postgresql:// URL of the benchmark database")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument(
+        "--recreate", action="store_true", help="drop and create the database first"
+    )
+    args = parser.parse_args(argv)
+    if args.recreate:
+        recreate_database(args.url)
+    build(args.name, args.url, args.seed)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,197 @@
+"""
+Before/after plans and latency of the analytic endpoints for a migration.
+
+Runs the CRUD behind each endpoint against the database in DATABASE_URL (one
+that does not have the migration yet), applies the migration inside the same
+transaction, runs them again, then rolls the migration back to a savepoint and
+runs them a third time. "before" is measured both ahead of and after the
+migration so cache warm-up shows up as a difference between the two "before"
+columns rather than as a speedup. Everything is rolled back at the end, so the
+database is left as it was:
+
+    python benchmarks/index_plans.py 0001_analytics_indexes --output plans.json
+
+By default the raw fact tables are measured (the daily rollup is switched
+off); pass --rollup to measure the rollup paths instead.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+MIGRATIONS_DIR = ROOT / "datapipeline" / "sql" / "migrations"
+sys.path.insert(0, str(ROOT / "app"))
+
+# Plans of slow statements are the point here; let them finish.
+os.environ.setdefault("DB_STATEMENT_TIMEOUT_MS", "0")
+# Imported first: registers every mapper
+importlib.import_module("main")
+
+from sqlalchemy import event, text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from crud.v2 import rollup  # noqa: E402
+from crud.v2.kpi import KPICrud  # noqa: E402
+from crud.v2.product import ProductCrud  # noqa: E402
+from crud.v2.stores import StoreCrud  # noqa: E402
+from crud.kpi.insights import fetch_insights  # noqa: E402
+from db.fanout import SINGLE_SNAPSHOT  # noqa: E402
+from db.session import engine  # noqa: E402
+
+ENDPOINTS = {
+    "GET /kpi/": lambda db, s, e: KPICrud().get_all_kpi(db, s, e),
+    "GET /kpi/insight (store, sales)": lambda db, s, e: fetch_insights(
+        db, "store", "Total Sales", [], [], [], [], s, e
+    ),
+    "GET /kpi/insight (brand, returns)": lambda db, s, e: fetch_insights(
+        db, "brand", "Total Returns", [], [], [], [], s, e
+    ),
+    "GET /stores/table": lambda db, s, e: StoreCrud.get_store_table_data(db, s, e),
+    "GET /stores/table?group_by=region": lambda db, s, e: (
+        StoreCrud.get_region_table_data(db, s, e)
+    ),
+    "GET /stores/top": lambda db, s, e: StoreCrud.get_top_stores_by_metric(
+        db, "Total Sales", s, e, 10
+    ),
+    "GET /products/top": lambda db, s, e: ProductCrud.get_top_products_by_metric(
+        db, "Total Sales", s, e, 10
+    ),
+    "GET /products/table": lambda db, s, e: ProductCrud.get_product_table_data(
+        db, s, e, "Total Sales", 50, "desc"
+    ),
+    "GET /products/table?group_by=brand": lambda db, s, e: (
+        ProductCrud.get_brand_table_data(db, s, e, "Total Sales", 50, "desc")
+    ),
+}
+
+
+def scans(plan):
+    """Scan nodes of a JSON plan, e.g. 'Index Only Scan using x on orders'."""
+    found = []
+    if "Relation Name" in plan:
+        index = f" using {plan['Index Name']}" if "Index Name" in plan else ""
+        found.append(f"{plan['Node Type']}{index} on {plan['Relation Name']}")
+    for child in plan.get("Plans", []):
+        found.extend(scans(child))
+    return found
+
+
+def measure(connection, start, end, runs):
+    """Latency of every endpoint plus the plan of each statement it issues."""
+    results = {}
+    for name, call in ENDPOINTS.items():
+        db = Session(bind=connection)
+        db.info[SINGLE_SNAPSHOT] = True
+        call(db, start, end)  # warm caches and the dimension labels
+
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        timings = []
+        for attempt in range(runs):
+            if attempt == 0:
+                event.listen(connection, "before_cursor_execute", capture)
+            started = time.perf_counter()
+            call(db, start, end)
+            timings.append((time.perf_counter() - started) * 1000)
+            if attempt == 0:
+                event.remove(connection, "before_cursor_execute", capture)
+
+        plans = []
+        for statement, parameters in statements:
+            explained = connection.exec_driver_sql(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters
+            ).scalar()
+            plan = explained[0]
+            plans.append(
+                {
+                    "execution_ms": plan["Execution Time"],
+                    "scans": scans(plan["Plan"]),
+                    "plan": plan,
+                }
+            )
+        results[name] = {
+            "median_ms": statistics.median(timings),
+            "statements": len(statements),
+            "plans": plans,
+        }
+    return results
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("migration", help="migration version, e.g. 0001_...")
+    parser.add_argument("--start", help="YYYY-MM-DD; default 90 days before --end")
+    parser.add_argument("--end", help="YYYY-MM-DD; default the last order date")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rollup", action="store_true")
+    parser.add_argument("--output", help="write the full results as JSON")
+    args = parser.parse_args(argv)
+
+    path = MIGRATIONS_DIR / f"{args.migration}.sql"
+    rollup.USE_DAILY_ROLLUP = args.rollup
+
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        end = (
+            datetime.fromisoformat(args.end)
+            if args.end
+            else datetime.combine(
+                connection.execute(text("SELECT MAX(order_date) FROM orders")).scalar(),
+                datetime.min.time(),
+            )
+        ).replace(tzinfo=timezone.utc)
+        start = (
+            datetime.fromisoformat(args.start).replace(tzinfo=timezone.utc)
+            if args.start
+            else end - timedelta(days=90)
+        )
+
+        before = measure(connection, start, end, args.runs)
+        savepoint = connection.begin_nested()
+        with connection.connection.cursor() as cursor:
+            cursor.execute(path.read_text())
+        after = measure(connection, start, end, args.runs)
+        savepoint.rollback()
+        before_again = measure(connection, start, end, args.runs)
+        transaction.rollback()
+
+    print(f"{args.migration}: {start.date()} .. {end.date()}")
+    print(
+        f"{'endpoint':40} {'before ms':>10} {'after ms':>10} {'before ms':>10}"
+        f" {'speedup':>8}"
+    )
+    for name in ENDPOINTS:
+        was, now = before[name]["median_ms"], after[name]["median_ms"]
+        again = before_again[name]["median_ms"]
+        # Against the warmer of the two "before" passes
+        speedup = min(was, again) / now
+        print(f"{name:40} {was:10.1f} {now:10.1f} {again:10.1f} {speedup:7.1f}x")
+        for old, new in zip(before[name]["plans"], after[name]["plans"]):
+            if old["scans"] != new["scans"]:
+                print(f"    - {', '.join(old['scans'])}")
+                print(f"    + {', '.join(new['scans'])}")
+
+    if args.output:
+        report = {
+            "migration": args.migration,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "rollup": args.rollup,
+            "before": before,
+            "after": after,
+            "before_again": before_again,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,316 @@
+"""
+Closed-loop load test replaying dashboard sessions.
+
+    python benchmarks/load.py small --concurrency 32 --duration 60
+    python benchmarks/load.py medium --base-url http://localhost:8000
+
+Each of --concurrency virtual users opens dashboard sessions back to back:
+the filter lists, /kpi/, /stores/table, /products/top and a few /kpi/insight
+comparisons with varied filters, over a random date range of the dataset.
+A user sends its next request as soon as the previous one answered (plus
+--think-ms), so throughput shows what the app sustains at that concurrency.
+
+Without --base-url the app runs in-process on the benchmark database of
+endpoints.py; with it, requests go to a running server. Connection pool
+waits come from /admin/pool, read before and after the run.
+"""
+
+import argparse
+import importlib
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from datasets import DATASETS, SEED, dataset_window  # noqa: E402
+from endpoints import (  # noqa: E402
+    BENCH_DATABASE_URL,
+    configure_app,
+    ensure_dataset,
+    git_revision,
+)
+
+METRICS = ["Total Sales", "Total Profit", "Total Orders", "Total Returns"]
+COMPARISON_LEVELS = ["region", "store", "brand", "product"]
+
+
+class Recorder:
+    """Latency and outcome of every request, by request kind."""
+
+    def __init__(self):
+        self.timings: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+        self.sessions = 0
+        self.recording = False
+
+    def record(self, kind: str, elapsed_ms: float, error: Optional[str]):
+        if not self.recording:
+            return
+        self.timings.setdefault(kind, []).append(elapsed_ms)
+        if error is not None:
+            counts = self.errors.setdefault(kind, {})
+            counts[error] = counts.get(error, 0) + 1
+
+
+class DashboardUser:
+    """One virtual user opening dashboards one after another."""
+
+    def __init__(self, client, recorder, window, filters, rng, think_ms):
+        self.client = client
+        self.recorder = recorder
+        self.first, self.last = window
+        self.filters = filters
+        self.rng = rng
+        self.think = think_ms / 1000
+
+    async def get(self, kind: str, path: str, **params):
+        started = time.perf_counter()
+        error = None
+        try:
+            response = await self.client.get(path, params=params)
+            if response.status_code >= 400:
+                error = str(response.status_code)
+        except httpx.HTTPError as exc:
+            error = type(exc).__name__
+        self.recorder.record(kind, (time.perf_counter() - started) * 1000, error)
+        if self.think:
+            await asyncio.sleep(self.think)
+
+    def date_range(self) -> Dict[str, str]:
+        """A last-7/30/90-days or whole-dataset style range."""
+        days = (self.last - self.first).days
+        span = min(days, self.rng.choice([7, 30, 90, days]))
+        end = self.last - timedelta(days=self.rng.randint(0, days - span))
+        start = end - timedelta(days=span)
+        return {"start_date": start.isoformat(), "end_date": end.isoformat()}
+
+    def insight_filters(self) -> Dict[str, Any]:
+        picks = {}
+        for param, key in (
+            ("selected_regions", "regions"),
+            ("selected_brands", "brands"),
+            ("selected_stores", "stores"),
+        ):
+            values = self.filters[key]
+            if values and self.rng.random() < 0.3:
+                picks[param] = self.rng.sample(
+                    values, self.rng.randint(1, min(3, len(values)))
+                )
+        return picks
+
+    async def session(self):
+        dates = self.date_range()
+        await self.get("GET /stores/filters/regions", "/stores/filters/regions")
+        await self.get("GET /stores/filters/stores", "/stores/filters/stores")
+        await self.get("GET /products/filters/brands", "/products/filters/brands")
+        await self.get("GET /kpi/", "/kpi/", **dates)
+        group_by = self.rng.choice(["store", "store", "region"])
+        await self.get("GET /stores/table", "/stores/table", group_by=group_by, **dates)
+        await self.get(
+            "GET /products/top",
+            "/products/top",
+            metric=self.rng.choice(METRICS),
+            n=self.rng.choice([5, 10]),
+            **dates,
+        )
+        for _ in range(self.rng.randint(1, 3)):
+            await self.get(
+                "GET /kpi/insight",
+                "/kpi/insight",
+                comparison_level=self.rng.choice(COMPARISON_LEVELS),
+                metric=self.rng.choice(METRICS),
+                **self.insight_filters(),
+                **dates,
+            )
+        if self.recorder.recording:
+            self.recorder.sessions += 1
+
+    async def run(self, stop_at: float):
+        while time.monotonic() < stop_at:
+            await self.session()
+
+
+async def fetch_filters(client) -> Dict[str, List[str]]:
+    regions = (await client.get("/stores/filters/regions")).json()
+    stores = (await client.get("/stores/filters/stores")).json()
+    brands = (await client.get("/products/filters/brands")).json()
+    return {
+        "regions": sorted(regions),
+        "stores": sorted(store["store_id"] for store in stores),
+        "brands": sorted(brands),
+    }
+
+
+def pool_delta(before: Dict, after: Dict) -> Dict[str, Any]:
+    """Checkout waits during the run, per pool (primary sync/async only)."""
+    delta = {}
+    for pool in ("sync", "async"):
+        was, now = before[pool], after[pool]
+        checkouts = now["checkouts"] - was["checkouts"]
+        waited = now["wait_seconds_total"] - was["wait_seconds_total"]
+        histogram = {
+            bound: now["wait_histogram"][bound] - was["wait_histogram"].get(bound, 0)
+            for bound in now["wait_histogram"]
+        }
+        delta[pool] = {
+            "checkouts": checkouts,
+            "timeouts": now["timeouts"] - was["timeouts"],
+            "wait_ms_avg": waited / checkouts * 1000 if checkouts else 0.0,
+            "wait_ms_max_lifetime": now["wait_seconds_max"] * 1000,
+            "wait_histogram": histogram,
+            "size": now["size"],
+            "checked_out_at_end": now["checked_out"],
+        }
+    return delta
+
+
+def summarize(recorder: Recorder, seconds: float) -> Dict[str, Any]:
+    def stats(timings):
+        if len(timings) < 2:
+            value = timings[0] if timings else 0.0
+            return {"p50_ms": value, "p95_ms": value, "p99_ms": value}
+        cuts = statistics.quantiles(timings, n=100, method="inclusive")
+        return {"p50_ms": cuts[49], "p95_ms": cuts[94], "p99_ms": cuts[98]}
+
+    requests = sum(len(timings) for timings in recorder.timings.values())
+    errors = sum(sum(counts.values()) for counts in recorder.errors.values())
+    everything = [ms for timings in recorder.timings.values() for ms in timings]
+    return {
+        "seconds": seconds,
+        "requests": requests,
+        "sessions": recorder.sessions,
+        "throughput_rps": requests / seconds if seconds else 0.0,
+        "error_rate": errors / requests if requests else 0.0,
+        **stats(everything),
+        "routes": {
+            kind: {
+                "requests": len(timings),
+                "errors": recorder.errors.get(kind, {}),
+                **stats(timings),
+            }
+            for kind, timings in sorted(recorder.timings.items())
+        },
+    }
+
+
+async def load(client, args, window) -> Dict[str, Any]:
+    filters = await fetch_filters(client)
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    users = [
+        DashboardUser(
+            client,
+            recorder,
+            window,
+            filters,
+            random.Random(rng.random()),
+            args.think_ms,
+        )
+        for _ in range(args.concurrency)
+    ]
+    stop_at = time.monotonic() + args.warmup + args.duration
+    tasks = [asyncio.create_task(user.run(stop_at)) for user in users]
+
+    await asyncio.sleep(args.warmup)
+    pools_before = (await client.get("/admin/pool")).json()
+    recorder.recording = True
+    started = time.monotonic()
+    await asyncio.gather(*tasks)
+    # Sessions still running at stop_at finish and are counted
+    elapsed = time.monotonic() - started
+    recorder.recording = False
+    pools_after = (await client.get("/admin/pool")).json()
+
+    return {
+        **summarize(recorder, elapsed),
+        "pool": pool_delta(pools_before, pools_after),
+    }
+
+
+async def run_in_process(args, window):
+    url = args.database_url or BENCH_DATABASE_URL.format(size=args.size)
+    ensure_dataset(args.size, url, args.seed)
+    configure_app(url, args.cache)
+    main = importlib.import_module("main")
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=args.timeout
+        ) as client:
+            return await load(client, args, window)
+
+
+async def run_against(args, window):
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(
+        base_url=args.base_url, timeout=args.timeout, limits=limits
+    ) as client:
+        return await load(client, args, window)
+
+
+def run(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("size", choices=sorted(DATASETS), help="dataset to query")
+    parser.add_argument("--base-url", help="a running server; default in-process")
+    parser.add_argument("--database-url", help="in-process: default BENCH_DATABASE_URL")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=60, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds not measured")
+    parser.add_argument("--think-ms", type=float, default=0)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--cache", action="store_true", help="in-process: keep cache")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    window = dataset_window(args.size)
+    runner = run_against if args.base_url else run_in_process
+    report = asyncio.run(runner(args, window))
+
+    print(
+        f"{args.concurrency} users, {report['seconds']:.0f}s:"
+        f" {report['throughput_rps']:.1f} req/s, {report['sessions']} sessions,"
+        f" errors {report['error_rate']:.2%}"
+    )
+    print(f"{'request':32} {'count':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for kind, route in report["routes"].items():
+        print(
+            f"{kind:32} {route['requests']:7} {route['p50_ms']:8.1f}"
+            f" {route['p95_ms']:8.1f} {route['p99_ms']:8.1f}"
+            f" {sum(route['errors'].values()):7}"
+        )
+    for name, pool in report["pool"].items():
+        print(
+            f"pool {name}: {pool['checkouts']} checkouts,"
+            f" avg wait {pool['wait_ms_avg']:.2f} ms, {pool['timeouts']} timeouts"
+        )
+
+    if args.output:
+        report.update(
+            {
+                **git_revision(),
+                "size": args.size,
+                "target": args.base_url or "in-process",
+                "settings": {
+                    "concurrency": args.concurrency,
+                    "duration": args.duration,
+                    "think_ms": args.think_ms,
+                    "cache": args.cache,
+                    "seed": args.seed,
+                },
+            }
+        )
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,16 @@
+from sqlalchemy import text
+from utils.common import engine
+
+BUMP_DATA_VERSION_SQL = """
+INSERT INTO data_version (id, version, updated_at)
+VALUES (1, 1, NOW())
+ON CONFLICT (id) DO UPDATE
+SET version = data_version.version + 1, updated_at = NOW()
+RETURNING version
+"""
+
+
+def bump_data_version():
+    """Advance the watermark so API response caches drop stale entries."""
+    with engine.begin() as conn:
+        return conn.execute(text(BUMP_DATA_VERSION_SQL)).scalar()
@@ -0,0 +1,83 @@
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import text
+from utils.common import engine
+from generateTables.rollup import loaded_months
+
+# First purchase of every customer overall and per store, region, brand and
+# product among one month's orders. Upserting with LEAST keeps the earliest
+# date, so months can be applied incrementally and in any order.
+UPSERT_FIRST_PURCHASE_SQL = """
+INSERT INTO customer_first_purchase (scope, scope_key, customer_id, first_purchase_date)
+SELECT scope, scope_key, customer_id, MIN(order_date)
+FROM (
+    SELECT 'all' AS scope, '' AS scope_key, o.customer_id, o.order_date
+    FROM orders o
+    WHERE o.order_date >= :start_date AND o.order_date < :end_date
+
+    UNION ALL
+
+    SELECT 'store', o.store_id::text, o.customer_id, o.order_date
+    FROM orders o
+    WHERE o.order_date >= :start_date AND o.order_date < :end_date
+
+    UNION ALL
+
+    SELECT 'region', s.region::text, o.customer_id, o.order_date
+    FROM orders o
+    JOIN stores s ON s.store_id = o.store_id
+    WHERE o.order_date >= :start_date AND o.order_date < :end_date
+
+    UNION ALL
+
+    SELECT 'brand', p.brand::text, o.customer_id, o.order_date
+    FROM orders o
+    JOIN order_items oi ON oi.order_id = o.order_id
+    JOIN products p ON p.product_id = oi.product_id
+    WHERE o.order_date >= :start_date AND o.order_date < :end_date
+
+    UNION ALL
+
+    SELECT 'product', oi.product_id::text, o.customer_id, o.order_date
+    FROM orders o
+    JOIN order_items oi ON oi.order_id = o.order_id
+    WHERE o.order_date >= :start_date AND o.order_date < :end_date
+      AND oi.product_id IS NOT NULL
+) purchases
+WHERE customer_id IS NOT NULL AND scope_key IS NOT NULL
+GROUP BY scope, scope_key, customer_id
+ON CONFLICT (scope, scope_key, customer_id) DO UPDATE
+SET first_purchase_date = LEAST(
+    customer_first_purchase.first_purchase_date, EXCLUDED.first_purchase_date
+)
+"""
+
+
+def update_first_purchases(conn, month_start: date):
+    """Fold one month of orders into customer_first_purchase."""
+    month_start = month_start.replace(day=1)
+    month_end = month_start + relativedelta(months=1)
+    conn.execute(
+        text(UPSERT_FIRST_PURCHASE_SQL),
+        {"start_date": month_start, "end_date": month_end},
+    )
+
+
+def rebuild_first_purchases(months=None):
+    """
+    Apply months oldest first; defaults to a full rebuild over every loaded
+    month, which starts from an empty table. Everything runs in one
+    transaction, so the API keeps reading the previous rows until it commits
+    (DELETE rather than TRUNCATE, which would lock readers out meanwhile).
+    """
+    with engine.begin() as conn:
+        if months is None:
+            conn.execute(text("DELETE FROM customer_first_purchase"))
+            months = loaded_months(conn)
+        for month in sorted(months):
+            update_first_purchases(conn, month)
+            print(f"🧾 Updated first purchases for {month.strftime('%Y-%m')}.")
+
+
+if __name__ == "__main__":
+    rebuild_first_purchases()
@@ -37,6 +37,11 @@ def generate_order_items(timestamp, orders_df, products_df, today_str):
         products_df[["product_id", "price"]], on="product_id", how="left"
     )
 
+    # Carry the order's date and store so aggregations skip the orders join
+    order_items = order_items.merge(
+        orders_df[["order_id", "order_date", "store_id"]], on="order_id", how="left"
+    )
+
     # Generate nullable discount values
     discount_chance = np.random.rand(NUM_ORDER_ITEMS)
     order_items["discount_applied"] = np.where(
@@ -45,6 +45,10 @@ def generate_returns(timestamp, order_items_df, month_str, start_date, end_date)
             "price": sampled_items[
                 "price"
             ].values,  # Bring price directly into the DataFrame
+            # Keys of the returned item, so aggregations skip the joins
+            "store_id": sampled_items["store_id"].values,
+            "product_id": sampled_items["product_id"].values,
+            "order_date": sampled_items["order_date"].values,
         }
     )
 
@@ -66,6 +70,9 @@ def generate_returns(timestamp, order_items_df, month_str, start_date, end_date)
             "refund_amount",
             "return_status",
             "created_at",
+            "store_id",
+            "product_id",
+            "order_date",
         ]
     ]
 
@@ -0,0 +1,58 @@
+import sys
+from pathlib import Path
+from sqlalchemy import text
+from utils.common import engine
+
+# Versioned schema changes applied on top of sql/create_table.sql. Files are
+# named NNNN_description.sql and applied once each, in order, every one in its
+# own transaction; schema_migrations records which ones a database has.
+MIGRATIONS_DIR = Path(__file__).resolve().parents[1] / "sql" / "migrations"
+
+CREATE_MIGRATIONS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version VARCHAR(255) PRIMARY KEY,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+)
+"""
+
+
+def available_migrations(upto=None):
+    """Migration files oldest first, optionally only up to version `upto`."""
+    paths = sorted(MIGRATIONS_DIR.glob("*.sql"))
+    return [path for path in paths if upto is None or path.stem <= upto]
+
+
+def applied_versions(conn):
+    conn.execute(text(CREATE_MIGRATIONS_TABLE_SQL))
+    rows = conn.execute(text("SELECT version FROM schema_migrations"))
+    return {row.version for row in rows}
+
+
+def apply_migration(conn, path: Path):
+    """Run one migration file and record it, inside the caller's transaction."""
+    # Sent verbatim through the DBAPI cursor: no parameter parsing of the SQL
+    with conn.connection.cursor() as cursor:
+        cursor.execute(path.read_text())
+    conn.execute(
+        text("INSERT INTO schema_migrations (version) VALUES (:version)"),
+        {"version": path.stem},
+    )
+
+
+def apply_migrations(upto=None):
+    """Apply every pending migration; returns the versions applied."""
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    applied = []
+    for path in available_migrations(upto):
+        if path.stem in done:
+            continue
+        with engine.begin() as conn:
+            apply_migration(conn, path)
+        applied.append(path.stem)
+        print(f"🛠️ Applied migration {path.stem}.")
+    return applied
+
+
+if __name__ == "__main__":
+    apply_migrations(sys.argv[1] if len(sys.argv) > 1 else None)
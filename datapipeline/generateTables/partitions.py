@@ -0,0 +1,116 @@
+import io
+from datetime import date, datetime
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import text
+
+# Fact tables range-partitioned by month (sql/migrations/0002) and their keys.
+PARTITION_KEYS = {
+    "orders": "order_date",
+    "order_items": "order_date",
+    "returns": "return_date",
+}
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_{month.strftime('%Y_%m')}"
+
+
+def copy_frame(conn, table: str, df: pd.DataFrame):
+    """COPY a DataFrame into `table`, matching columns by name."""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    buffer.seek(0)
+    columns = ", ".join(df.columns)
+    with conn.connection.cursor() as cur:
+        cur.copy_expert(
+            f"COPY {table} ({columns}) FROM STDIN WITH CSV HEADER NULL ''", buffer
+        )
+
+
+def replace_month(conn, table: str, month: date, df: pd.DataFrame):
+    """
+    Swap the month's partition of `table` for one holding exactly `df`.
+
+    The rows are copied into a standalone table first, so readers keep seeing
+    the old partition until the swap, which only takes locks for the
+    detach/attach. A CHECK matching the bounds lets ATTACH skip its scan.
+    """
+    month = month.replace(day=1)
+    key = PARTITION_KEYS[table]
+    name = partition_name(table, month)
+    staging = f"{name}_load"
+    bounds = {"start": month, "end": month + relativedelta(months=1)}
+
+    conn.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+    conn.execute(text(f"CREATE TABLE {staging} (LIKE {table} INCLUDING DEFAULTS)"))
+    copy_frame(conn, staging, df)
+    conn.execute(
+        text(
+            f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_bounds"
+            f" CHECK ({key} >= :start AND {key} < :end)"
+        ),
+        bounds,
+    )
+
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+    conn.execute(text(f"ALTER TABLE {staging} RENAME TO {name}"))
+    # Rows of this month that landed in the default partition are replaced
+    # by the load, and would make the attach fail.
+    conn.execute(
+        text(f"DELETE FROM {table}_default WHERE {key} >= :start AND {key} < :end"),
+        bounds,
+    )
+    conn.execute(
+        text(
+            f"ALTER TABLE {table} ATTACH PARTITION {name}"
+            " FOR VALUES FROM (:start) TO (:end)"
+        ),
+        bounds,
+    )
+    conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {staging}_bounds"))
+
+
+def months_of(df: pd.DataFrame, key: str):
+    """First day of every month present in `df[key]`, oldest first."""
+    days = pd.to_datetime(df[key]).dropna()
+    return sorted({day.date().replace(day=1) for day in days})
+
+
+def attached_months(conn, table: str):
+    """First day of every month that has its own partition of `table`."""
+    rows = conn.execute(
+        text(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = :table
+            """
+        ),
+        {"table": table},
+    )
+    months = []
+    for (name,) in rows:
+        try:
+            months.append(datetime.strptime(name, f"{table}_%Y_%m").date())
+        except ValueError:
+            continue  # the default partition
+    return sorted(months)
+
+
+def drop_months_except(conn, table: str, keep):
+    """
+    Detach and drop every month partition of `table` not in `keep`, and empty
+    its default partition: what is left of a full load's stale months.
+    """
+    keep = {month.replace(day=1) for month in keep}
+    for month in attached_months(conn, table):
+        if month not in keep:
+            name = partition_name(table, month)
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+    conn.execute(text(f"DELETE FROM {table}_default"))
@@ -0,0 +1,130 @@
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import text
+from utils.common import engine
+
+# Sales measures are bucketed by order date, return measures by return date,
+# so both halves are aggregated separately and merged per (day, store, product).
+# Both read the store, product and date copied onto the fact rows (migration
+# 0003), without joining back to orders.
+# Every order is counted once in order_count (on the row of its first item) so
+# the column stays additive across days and stores.
+DELETE_ROLLUP_SQL = """
+DELETE FROM daily_sales_rollup WHERE day >= :start_date AND day < :end_date
+"""
+
+# A full rebuild also forgets the months no longer loaded.
+DELETE_STALE_ROLLUP_SQL = """
+DELETE FROM daily_sales_rollup
+WHERE date_trunc('month', day)::date <> ALL(CAST(:months AS DATE[]))
+"""
+
+INSERT_ROLLUP_SQL = """
+INSERT INTO daily_sales_rollup (
+    day, store_id, product_id, sales, profit, quantity, order_count,
+    product_order_count, item_count, return_count, refund_amount
+)
+SELECT
+    day,
+    store_id,
+    product_id,
+    COALESCE(SUM(sales), 0),
+    COALESCE(SUM(profit), 0),
+    SUM(quantity),
+    SUM(order_count),
+    SUM(product_order_count),
+    SUM(item_count),
+    SUM(return_count),
+    COALESCE(SUM(refund_amount), 0)
+FROM (
+    SELECT
+        items.order_date AS day,
+        items.store_id,
+        items.product_id,
+        SUM(items.price * items.quantity) AS sales,
+        SUM((items.price - items.cost) * items.quantity) AS profit,
+        SUM(items.quantity) AS quantity,
+        COUNT(*) FILTER (WHERE items.item_rank = 1) AS order_count,
+        COUNT(DISTINCT items.order_id) AS product_order_count,
+        COUNT(*) AS item_count,
+        0 AS return_count,
+        0 AS refund_amount
+    FROM (
+        SELECT
+            oi.order_date,
+            oi.store_id,
+            oi.order_id,
+            oi.product_id,
+            oi.price,
+            oi.quantity,
+            p.cost,
+            ROW_NUMBER() OVER (
+                PARTITION BY oi.order_id
+                ORDER BY oi.product_id NULLS LAST, oi.order_item_id
+            ) AS item_rank
+        FROM order_items oi
+        LEFT JOIN products p ON p.product_id = oi.product_id
+        WHERE oi.order_date >= :start_date AND oi.order_date < :end_date
+    ) items
+    GROUP BY items.order_date, items.store_id, items.product_id
+
+    UNION ALL
+
+    SELECT
+        r.return_date AS day,
+        r.store_id,
+        r.product_id,
+        0, 0, 0, 0, 0, 0,
+        COUNT(*) AS return_count,
+        SUM(r.refund_amount) AS refund_amount
+    FROM returns r
+    WHERE r.return_date >= :start_date AND r.return_date < :end_date
+    GROUP BY r.return_date, r.store_id, r.product_id
+) facts
+GROUP BY day, store_id, product_id
+"""
+
+
+def refresh_daily_rollup(conn, month_start: date):
+    """Rebuild the rollup rows of a single month inside the caller's transaction."""
+    month_start = month_start.replace(day=1)
+    month_end = month_start + relativedelta(months=1)
+    params = {"start_date": month_start, "end_date": month_end}
+    conn.execute(text(DELETE_ROLLUP_SQL), params)
+    conn.execute(text(INSERT_ROLLUP_SQL), params)
+
+
+def loaded_months(conn):
+    """Months that hold orders or returns, oldest first."""
+    rows = conn.execute(
+        text(
+            """
+            SELECT DISTINCT date_trunc('month', order_date)::date AS month
+            FROM orders WHERE order_date IS NOT NULL
+            UNION
+            SELECT DISTINCT date_trunc('month', return_date)::date AS month
+            FROM returns WHERE return_date IS NOT NULL
+            ORDER BY month
+            """
+        )
+    )
+    return [row.month for row in rows]
+
+
+def rebuild_daily_rollup(months=None):
+    """
+    Refresh the rollup month by month. Defaults to every loaded month, after
+    dropping the rows of months that are no longer loaded.
+    """
+    with engine.begin() as conn:
+        if months is None:
+            months = loaded_months(conn)
+            conn.execute(text(DELETE_STALE_ROLLUP_SQL), {"months": months})
+    for month in months:
+        with engine.begin() as conn:
+            refresh_daily_rollup(conn, month)
+        print(f"📊 Refreshed daily rollup for {month.strftime('%Y-%m')}.")
+
+
+if __name__ == "__main__":
+    rebuild_daily_rollup()
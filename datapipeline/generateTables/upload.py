@@ -1,48 +1,135 @@
+import sys
+from datetime import date
 import pandas as pd
-from pathlib import Path
 from utils.common import DATA_DIR, engine
 from sqlalchemy import text
+from generateTables.rollup import rebuild_daily_rollup
+from generateTables.first_purchase import rebuild_first_purchases
+from generateTables.data_version import bump_data_version
+from generateTables.migrate import apply_migrations
+from generateTables.partitions import (
+    PARTITION_KEYS,
+    copy_frame,
+    drop_months_except,
+    months_of,
+    replace_month,
+)
 
+# Dimension tables and their keys; upserted so the facts referencing them
+# stay in place.
+DIMENSION_TABLES = {
+    "stores": "store_id",
+    "customers": "customer_id",
+    "products": "product_id",
+}
 
-def upload_all_tables_to_sql():
-    TABLES = TABLES = [
-        "stores",
-        "customers",
-        "products",
-        "orders",
-        "order_items",
-        "returns",
-    ]
-
-    for table in TABLES:
-        files = sorted((DATA_DIR / table).glob("*.csv"))
-        if not files:
-            print(f"❌ No files found for table '{table}'.")
-            continue
-        else:
-            print(f"✅ Found file for table '{table}'.")
-            print(f"📥 Loading table '{table}' into SQL...")
 
-        df_all = pd.concat([pd.read_csv(f) for f in files], ignore_index=True)
-        file_path = f"/tmp/{table}.csv"
-        df_all.to_csv(file_path, index=False)
+def read_table(table):
+    files = sorted((DATA_DIR / table).glob("*.csv"))
+    if not files:
+        print(f"❌ No files found for table '{table}'.")
+        return None
+    print(f"✅ Found file for table '{table}'.")
+    return pd.concat([pd.read_csv(f) for f in files], ignore_index=True)
+
+
+def upsert_table(conn, table, key, df):
+    """Insert new rows of a dimension table and update the existing ones."""
+    staging = f"{table}_load"
+    conn.execute(
+        text(
+            f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS)"
+            " ON COMMIT DROP"
+        )
+    )
+    copy_frame(conn, staging, df)
+    columns = ", ".join(df.columns)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in df.columns if c != key)
+    conn.execute(
+        text(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging}"
+            f" ON CONFLICT ({key}) DO UPDATE SET {updates}"
+        )
+    )
 
-        with engine.begin() as conn:
-            # Truncate existing data but keep schema and constraints
-            print(f"🧹 Truncating table '{table}'...")
-            conn.execute(text(f"TRUNCATE TABLE {table} CASCADE;"))
-
-            # Load fresh data
-            raw_conn = conn.connection
-            with raw_conn.cursor() as cur, open(file_path, "r") as f:
-                copy_sql = (
-                    f"COPY {table} FROM STDIN WITH CSV HEADER DELIMITER ',' NULL '';"
-                )
-                cur.copy_expert(copy_sql, f)
-            raw_conn.commit()
 
+def with_keys(df, source, on, keys):
+    """
+    Fill `df`'s copies of the `keys` columns from `source` (matched on `on`);
+    the generators write them, older files lack them.
+    """
+    if all(key in df.columns for key in keys):
+        return df
+    lookup = source[[on, *keys]].drop_duplicates(on)
+    return df.drop(columns=keys, errors="ignore").merge(lookup, on=on, how="inner")
+
+
+def upload_all_tables_to_sql(months=None):
+    """
+    Load the CSVs under DATA_DIR. Dimension tables are upserted; each month
+    of the fact tables replaces its partition. With `months` (first days of
+    months) only those partitions are reloaded, otherwise every fact table
+    is rebuilt from the files.
+    """
+    # Bring the schema up to date before loading
+    apply_migrations()
+
+    for table, key in DIMENSION_TABLES.items():
+        df = read_table(table)
+        if df is None:
+            continue
+        print(f"📥 Upserting table '{table}' into SQL...")
+        with engine.begin() as conn:
+            upsert_table(conn, table, key, df)
         print(f"✅ Loaded table '{table}' to SQL.")
 
+    orders = read_table("orders")
+    order_items = read_table("order_items")
+    returns = read_table("returns")
+    if order_items is not None and orders is not None:
+        order_items = with_keys(
+            order_items, orders, "order_id", ["order_date", "store_id"]
+        )
+    if returns is not None and order_items is not None:
+        returns = with_keys(
+            returns,
+            order_items,
+            "order_item_id",
+            ["store_id", "product_id", "order_date"],
+        )
+    facts = {"orders": orders, "order_items": order_items, "returns": returns}
+    wanted = {month.replace(day=1) for month in months} if months else None
+
+    for table, df in facts.items():
+        if df is None:
+            continue
+        key = PARTITION_KEYS[table]
+        df = df.dropna(subset=[key])
+        month_keys = pd.to_datetime(df[key]).dt.to_period("M").dt.to_timestamp()
+        loaded = sorted(wanted) if wanted else months_of(df, key)
+        for month in loaded:
+            with engine.begin() as conn:
+                replace_month(conn, table, month, df[month_keys == pd.Timestamp(month)])
+            print(f"📦 Loaded '{table}' for {month.strftime('%Y-%m')}.")
+        if wanted is None:
+            # A full load starts over: months missing from the files vanish,
+            # only once every month of the files has been swapped in.
+            with engine.begin() as conn:
+                drop_months_except(conn, table, loaded)
+            print(f"🧹 Dropped '{table}' months missing from the files.")
+
+    print("📊 Rebuilding daily rollup...")
+    rebuild_daily_rollup(sorted(wanted) if wanted else None)
+
+    print("🧾 Rebuilding customer first purchases...")
+    rebuild_first_purchases(sorted(wanted) if wanted else None)
+
+    version = bump_data_version()
+    print(f"🔖 Data version bumped to {version}.")
+
 
 if __name__ == "__main__":
-    upload_all_tables_to_sql()
+    # python -m generateTables.upload [YYYY-MM ...] reloads only those months
+    upload_all_tables_to_sql(
+        [date.fromisoformat(f"{month}-01") for month in sys.argv[1:]] or None
+    )
@@ -24,7 +24,7 @@ CREATE TYPE region AS ENUM (
     'Region7',
     'Region8',
     'Region9',
-    'Region10',
+    'Region10'
 );
 
 -- Enum for product brand
@@ -179,4 +179,51 @@ CREATE TABLE
         created_at TIMESTAMP
         WITH
             TIME ZONE DEFAULT NOW ()
-    );
\ No newline at end of file
+    );
+-- Daily rollup (day x store x product) maintained by generateTables/rollup.py.
+-- Sales measures use order_date, return measures use return_date.
+CREATE TABLE
+    daily_sales_rollup (
+        day DATE NOT NULL,
+        store_id UUID NOT NULL,
+        product_id UUID,
+        sales NUMERIC(14, 2) NOT NULL DEFAULT 0,
+        profit NUMERIC(14, 2) NOT NULL DEFAULT 0,
+        quantity INTEGER NOT NULL DEFAULT 0,
+        order_count INTEGER NOT NULL DEFAULT 0,
+        product_order_count INTEGER NOT NULL DEFAULT 0,
+        item_count INTEGER NOT NULL DEFAULT 0,
+        return_count INTEGER NOT NULL DEFAULT 0,
+        refund_amount NUMERIC(14, 2) NOT NULL DEFAULT 0
+    );
+
+CREATE INDEX daily_sales_rollup_day_idx ON daily_sales_rollup (day);
+
+-- First purchase per customer, overall (scope 'all', scope_key '') and per
+-- store, region, brand and product. Maintained by generateTables/first_purchase.py.
+CREATE TABLE
+    customer_first_purchase (
+        scope VARCHAR(16) NOT NULL,
+        scope_key VARCHAR(64) NOT NULL,
+        customer_id UUID NOT NULL,
+        first_purchase_date DATE NOT NULL,
+        PRIMARY KEY (scope, scope_key, customer_id)
+    );
+
+CREATE INDEX customer_first_purchase_date_idx ON customer_first_purchase (scope, first_purchase_date);
+
+-- Single-row watermark bumped by generateTables/upload.py after every load.
+-- The API tags cached responses with it and drops them when it changes.
+CREATE TABLE
+    data_version (
+        id INTEGER PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP
+        WITH
+            TIME ZONE DEFAULT NOW ()
+    );
+
+INSERT INTO
+    data_version (id, version)
+VALUES
+    (1, 0);
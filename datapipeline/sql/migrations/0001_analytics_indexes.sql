@@ -0,0 +1,54 @@
+-- Indexes for the analytic query shapes of app/crud/v2 and app/crud/kpi.
+--
+-- Facts are loaded month by month, so their physical order follows the date
+-- columns: BRIN indexes prune wide date ranges (quarter, year) for a few
+-- pages of index, and the B-trees below serve short ranges and the joins.
+
+-- Every raw metric filters orders on order_date, then groups or filters by
+-- store; the covering columns let the date filter and the joins to stores
+-- and order_items run from the index alone.
+CREATE INDEX IF NOT EXISTS orders_order_date_brin
+    ON orders USING BRIN (order_date) WITH (autosummarize = on);
+
+CREATE INDEX IF NOT EXISTS orders_order_date_store_idx
+    ON orders (order_date, store_id) INCLUDE (order_id, customer_id);
+
+-- Store filters (selected_stores, store tables) with a date range.
+CREATE INDEX IF NOT EXISTS orders_store_date_idx
+    ON orders (store_id, order_date);
+
+-- Customer metrics and customer_first_purchase: per-customer first and
+-- repeat purchases.
+CREATE INDEX IF NOT EXISTS orders_customer_date_idx
+    ON orders (customer_id, order_date);
+
+-- order_items is always reached through orders; carrying the measure columns
+-- avoids a heap visit per item for sales, profit and quantity.
+CREATE INDEX IF NOT EXISTS order_items_order_id_idx
+    ON order_items (order_id) INCLUDE (product_id, price, quantity);
+
+-- Product and brand filters, product tables and top products.
+CREATE INDEX IF NOT EXISTS order_items_product_id_idx
+    ON order_items (product_id, order_id);
+
+-- Return metrics filter on return_date and join back to order_items.
+CREATE INDEX IF NOT EXISTS returns_return_date_brin
+    ON returns USING BRIN (return_date) WITH (autosummarize = on);
+
+CREATE INDEX IF NOT EXISTS returns_return_date_idx
+    ON returns (return_date) INCLUDE (order_item_id, refund_amount);
+
+CREATE INDEX IF NOT EXISTS returns_order_item_id_idx
+    ON returns (order_item_id);
+
+-- Rollup requests filtered by store or product over a date range.
+CREATE INDEX IF NOT EXISTS daily_sales_rollup_store_day_idx
+    ON daily_sales_rollup (store_id, day);
+
+CREATE INDEX IF NOT EXISTS daily_sales_rollup_product_day_idx
+    ON daily_sales_rollup (product_id, day);
+
+ANALYZE orders;
+ANALYZE order_items;
+ANALYZE returns;
+ANALYZE daily_sales_rollup;
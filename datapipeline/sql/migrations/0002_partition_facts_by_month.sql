@@ -0,0 +1,127 @@
+-- Range-partition orders, order_items and returns by month.
+--
+-- Facts arrive in monthly batches and nearly every query filters on a date,
+-- so date-bounded queries only touch the partitions of their months, and
+-- generateTables/partitions.py reloads a month by swapping one partition.
+--
+-- * order_items gains order_date (the date of its order) as partition key.
+-- * Primary keys include the partition key, which makes it NOT NULL; rows
+--   without a date were invisible to every date-filtered metric and are not
+--   carried over.
+-- * The foreign keys between the three fact tables are dropped: they would
+--   have to span partitions and block swapping them. The loader keeps them
+--   consistent; the keys to stores, customers and products stay.
+-- * Each table has a DEFAULT partition for rows outside the loaded months.
+
+ALTER TABLE returns RENAME TO returns_unpartitioned;
+ALTER TABLE order_items RENAME TO order_items_unpartitioned;
+ALTER TABLE orders RENAME TO orders_unpartitioned;
+ALTER INDEX returns_pkey RENAME TO returns_unpartitioned_pkey;
+ALTER INDEX order_items_pkey RENAME TO order_items_unpartitioned_pkey;
+ALTER INDEX orders_pkey RENAME TO orders_unpartitioned_pkey;
+
+CREATE TABLE
+    orders (
+        LIKE orders_unpartitioned INCLUDING DEFAULTS,
+        PRIMARY KEY (order_id, order_date),
+        FOREIGN KEY (store_id) REFERENCES stores (store_id) ON DELETE CASCADE,
+        FOREIGN KEY (customer_id) REFERENCES customers (customer_id)
+    )
+PARTITION BY RANGE (order_date);
+
+CREATE TABLE
+    order_items (
+        LIKE order_items_unpartitioned INCLUDING DEFAULTS,
+        order_date DATE NOT NULL,
+        PRIMARY KEY (order_item_id, order_date),
+        FOREIGN KEY (product_id) REFERENCES products (product_id) ON DELETE SET NULL
+    )
+PARTITION BY RANGE (order_date);
+
+CREATE TABLE
+    returns (
+        LIKE returns_unpartitioned INCLUDING DEFAULTS,
+        PRIMARY KEY (return_id, return_date)
+    )
+PARTITION BY RANGE (return_date);
+
+CREATE TABLE orders_default PARTITION OF orders DEFAULT;
+CREATE TABLE order_items_default PARTITION OF order_items DEFAULT;
+CREATE TABLE returns_default PARTITION OF returns DEFAULT;
+
+DO $$
+DECLARE
+    spec RECORD;
+    month DATE;
+BEGIN
+    FOR spec IN
+        SELECT * FROM (VALUES
+            ('orders', 'order_date', 'orders_unpartitioned'),
+            ('order_items', 'order_date', 'orders_unpartitioned'),
+            ('returns', 'return_date', 'returns_unpartitioned')
+        ) AS specs (parent, key, source)
+    LOOP
+        FOR month IN EXECUTE format(
+            'SELECT DISTINCT date_trunc(''month'', %I)::date FROM %I WHERE %I IS NOT NULL',
+            spec.key, spec.source, spec.key
+        )
+        LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                spec.parent || '_' || to_char(month, 'YYYY_MM'),
+                spec.parent,
+                month,
+                (month + INTERVAL '1 month')::date
+            );
+        END LOOP;
+    END LOOP;
+END $$;
+
+INSERT INTO orders
+SELECT * FROM orders_unpartitioned WHERE order_date IS NOT NULL;
+
+INSERT INTO order_items
+SELECT oi.*, o.order_date
+FROM order_items_unpartitioned oi
+JOIN orders_unpartitioned o ON o.order_id = oi.order_id
+WHERE o.order_date IS NOT NULL;
+
+INSERT INTO returns
+SELECT * FROM returns_unpartitioned WHERE return_date IS NOT NULL;
+
+DROP TABLE returns_unpartitioned;
+DROP TABLE order_items_unpartitioned;
+DROP TABLE orders_unpartitioned;
+
+-- The indexes of 0001_analytics_indexes, now partitioned: every partition,
+-- including the ones the loader attaches later, gets its own copy.
+CREATE INDEX orders_order_date_brin
+    ON orders USING BRIN (order_date) WITH (autosummarize = on);
+
+CREATE INDEX orders_order_date_store_idx
+    ON orders (order_date, store_id) INCLUDE (order_id, customer_id);
+
+CREATE INDEX orders_store_date_idx
+    ON orders (store_id, order_date);
+
+CREATE INDEX orders_customer_date_idx
+    ON orders (customer_id, order_date);
+
+CREATE INDEX order_items_order_id_idx
+    ON order_items (order_id) INCLUDE (product_id, price, quantity);
+
+CREATE INDEX order_items_product_id_idx
+    ON order_items (product_id, order_id);
+
+CREATE INDEX returns_return_date_brin
+    ON returns USING BRIN (return_date) WITH (autosummarize = on);
+
+CREATE INDEX returns_return_date_idx
+    ON returns (return_date) INCLUDE (order_item_id, refund_amount);
+
+CREATE INDEX returns_order_item_id_idx
+    ON returns (order_item_id);
+
+ANALYZE orders;
+ANALYZE order_items;
+ANALYZE returns;
@@ -0,0 +1,44 @@
+-- Copy the keys every aggregation groups or filters on onto the fact rows,
+-- so sales and return metrics read one table instead of joining back to
+-- orders (and order_items) for the date and the store.
+--
+-- * order_items.store_id: the store of its order (order_date is already
+--   there as the partition key, see 0002).
+-- * returns.store_id, returns.product_id, returns.order_date: the store,
+--   product and order date of the returned item.
+--
+-- The loader fills them from the files (generateTables/upload.py); rows
+-- already loaded are backfilled here.
+
+ALTER TABLE order_items ADD COLUMN IF NOT EXISTS store_id UUID;
+
+ALTER TABLE returns
+    ADD COLUMN IF NOT EXISTS store_id UUID,
+    ADD COLUMN IF NOT EXISTS product_id UUID,
+    ADD COLUMN IF NOT EXISTS order_date DATE;
+
+UPDATE order_items oi
+SET store_id = o.store_id
+FROM orders o
+WHERE o.order_id = oi.order_id
+  AND o.order_date = oi.order_date
+  AND oi.store_id IS NULL;
+
+UPDATE returns r
+SET store_id = oi.store_id,
+    product_id = oi.product_id,
+    order_date = oi.order_date
+FROM order_items oi
+WHERE oi.order_item_id = r.order_item_id
+  AND r.store_id IS NULL;
+
+-- Date-bounded aggregations grouped or filtered by store, straight from the
+-- fact tables.
+CREATE INDEX IF NOT EXISTS order_items_date_store_idx
+    ON order_items (order_date, store_id) INCLUDE (product_id, order_id, price, quantity);
+
+CREATE INDEX IF NOT EXISTS returns_store_date_idx
+    ON returns (store_id, return_date);
+
+ANALYZE order_items;
+ANALYZE returns;
@@ -13,7 +13,10 @@ DATABASE_HOST = os.getenv("DATABASE_HOST")
 DATABASE_PORT = os.getenv("DATABASE_PORT")
 DATABASE_NAME = os.getenv("DATABASE_NAME")
 
-DATA_DIR = Path(__file__).resolve().parents[1] / "data" / "raw"
+# Where generators write their CSVs and upload reads them from.
+DATA_DIR = Path(
+    os.getenv("DATA_DIR", Path(__file__).resolve().parents[1] / "data" / "raw")
+)
 TABLES = ["products", "customers", "orders", "order_items", "returns", "stores"]
 
 